@@ -3,22 +3,13 @@
 
 import argparse
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import simplejson as json
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def get_assay_type(assay_type_id):
@@ -29,7 +20,7 @@ def get_assay_type(assay_type_id):
     url = "{}/assay_types/{}".format(OMICIA_API_URL, assay_type_id)
 
     # Get request and return json object of an assay type
-    result = requests.get(url, auth=auth)
+    result = client.get(url, cache=True)
     return result.json()
 
 
@@ -41,7 +32,7 @@ def get_assay_types():
     url = "{}/assay_types".format(OMICIA_API_URL)
 
     # Get request and return json object of assay types
-    result = requests.get(url, auth=auth)
+    result = client.get(url, cache=True)
     return result.json()
 
 
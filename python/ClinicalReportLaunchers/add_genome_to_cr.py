@@ -38,22 +38,13 @@ version: 4
 
 import os
 import json
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import argparse
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def add_genome_to_clinical_report(clinical_report_id,
@@ -91,7 +82,7 @@ def add_genome_to_clinical_report(clinical_report_id,
     sys.stdout.write("Adding genome(s) to report...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.put(url, auth=auth, data=json.dumps(url_payload), verify=False)
+    result = client.put(url, data=json.dumps(url_payload), verify=False)
     return result.json()
 
 
@@ -4,22 +4,13 @@
 import csv
 import simplejson as json
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def add_genomes_to_clinical_report(clinical_report_id,
@@ -60,7 +51,7 @@ def add_genomes_to_clinical_report(clinical_report_id,
                     'hpo_terms': json.dumps(hpo_terms) if hpo_terms else None}
 
     sys.stdout.write("Attaching genomes to clinical report...\n")
-    result = requests.put(url, auth=auth, data=json.dumps(data_payload), verify=False)
+    result = client.put(url, data=json.dumps(data_payload), verify=False)
     return result.json()
 
 
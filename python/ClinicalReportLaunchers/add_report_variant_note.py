@@ -2,23 +2,14 @@
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 import argparse
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def add_variant_note(cr_id, report_variant_id, note):
@@ -31,7 +22,7 @@ def add_variant_note(cr_id, report_variant_id, note):
     # Build the patch payload
     url_payload = json.dumps({"note": note})
     sys.stdout.flush()
-    result = requests.post(url, auth=auth, json=url_payload)
+    result = client.post(url, json=url_payload)
     return result
 
 
@@ -3,23 +3,17 @@ Get a clinical report selected variants, this only works for non-panel reports
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import simplejson as json
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.downloads import DEFAULT_CHUNK_SIZE, DownloadError, download
 
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+SELECTABLE_VARIANTS_PARAMS = {'limit': 10000, 'format': 'vcf'}
 
 
 def get_report_selectable_variants(clinical_report_id):
@@ -30,31 +24,37 @@ def get_report_selectable_variants(clinical_report_id):
     url = url.format(OMICIA_API_URL, clinical_report_id)
 
     # If target variants JSON is specified, post with the target variants JSON
-    result = requests.get(url, params={'limit': 10000, 'format': 'vcf'}, auth=auth)
+    result = client.get(url, params=SELECTABLE_VARIANTS_PARAMS)
     return result
 
 
+def download_report_selectable_variants(clinical_report_id, dest_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Download a report's variants as a VCF into the folder dest_path, resuming an
+    interrupted download. Returns the path of the file written.
+    """
+    url = "{}/reports/{}/selectable_variants"
+    url = url.format(OMICIA_API_URL, clinical_report_id)
+    return download(url, directory=dest_path, chunk_size=chunk_size,
+                    params=SELECTABLE_VARIANTS_PARAMS)
+
+
 def main():
     """Main function. Get a clinical report by ID.
     """
     parser = argparse.ArgumentParser(description='Fetch a clinical report\'s variants')
     parser.add_argument('c', metavar='clinical_report_id', type=int)
     parser.add_argument('p', metavar='path', type=str)
+    parser.add_argument('--chunk_size', metavar='chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='bytes to read at a time')
     args = parser.parse_args()
 
     cr_id = args.c
     dest_path = args.p
 
-    response = get_report_selectable_variants(cr_id)
-
-    if response.status_code == 200:
-        contents = response.content
-        filename = response.headers.get('content-disposition').split('filename=')[-1]
-
-        with open (os.path.join(dest_path, filename), 'w') as target_file:
-            target_file.write(contents)
-    else:
-        print(response.text)
+    try:
+        download_report_selectable_variants(cr_id, dest_path, chunk_size=args.chunk_size)
+    except DownloadError as e:
+        print(e.response.text if e.response is not None else e)
 
 if __name__ == "__main__":
     main()
@@ -7,40 +7,44 @@ Example usages:
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import simplejson as json
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.downloads import DEFAULT_CHUNK_SIZE, DownloadError, download
 
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
 
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+def clinical_report_pdf_url(cr_id, preview=False):
+    if not preview:
+        url = "{}/reports/{}/pdf_report"
+    else:
+        url = "{}/reports/{}/pdf_preview"
+    return url.format(OMICIA_API_URL, cr_id)
 
 
 def get_clinical_report_pdf(cr_id, preview=False):
     """Use the Omicia API to get a clinical report PDF, whether preview or complete
     """
     # Construct request
-    if not preview:
-        url = "{}/reports/{}/pdf_report"
-    else:
-        url = "{}/reports/{}/pdf_preview"
-    url = url.format(OMICIA_API_URL, cr_id)
+    url = clinical_report_pdf_url(cr_id, preview=preview)
 
     sys.stdout.flush()
-    result = requests.get(url, auth=auth, verify=False)
+    result = client.get(url, verify=False)
     return result
 
 
+def download_clinical_report_pdf(cr_id, dest_path, preview=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Download a clinical report PDF into the folder dest_path, resuming an
+    interrupted download. Returns the path of the file written.
+    """
+    url = clinical_report_pdf_url(cr_id, preview=preview)
+    return download(url, directory=dest_path, chunk_size=chunk_size, verify=False)
+
+
 def main():
     """Main function. Get a clinical report by ID.
     """
@@ -48,22 +52,18 @@ def main():
     parser.add_argument('c', metavar='clinical_report_id', type=int)
     parser.add_argument('p', metavar='path', type=str)
     parser.add_argument('--preview', metavar='preview', type=bool)
+    parser.add_argument('--chunk_size', metavar='chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='bytes to read at a time')
     args = parser.parse_args()
 
     cr_id = args.c
     dest_path = args.p
     preview = args.preview is not None
 
-    response = get_clinical_report_pdf(cr_id, preview=preview)
-
-    if response.status_code == 200:
-        contents = response.content
-        filename = response.headers.get('content-disposition').split('filename=')[-1]
-
-        with open (os.path.join(dest_path, filename), 'w') as target_file:
-            target_file.write(contents)
-    else:
-        print response.text
+    try:
+        download_clinical_report_pdf(cr_id, dest_path, preview=preview, chunk_size=args.chunk_size)
+    except DownloadError as e:
+        print e.response.text if e.response is not None else e
 
 if __name__ == "__main__":
     main()
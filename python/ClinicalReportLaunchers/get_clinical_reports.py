@@ -52,23 +52,14 @@ Sample output:
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import simplejson as json
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def get_clinical_reports(accession_id, genome_id, external_id, genome_name):
@@ -93,7 +84,7 @@ def get_clinical_reports(accession_id, genome_id, external_id, genome_name):
     print url
 
     sys.stdout.flush()
-    result = requests.get(url, auth=auth)
+    result = client.get(url)
     return result.json()
 
 
@@ -5,23 +5,14 @@ python get_report_selectable_variants.py 12345 --target_variants '[{"chromosome"
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 def get_report_selectable_variants(clinical_report_id, target_variants=None):
     """Get report variants by location, id or simply all.
@@ -37,7 +28,7 @@ def get_report_selectable_variants(clinical_report_id, target_variants=None):
     # If target variants JSON is specified, post with the target variants JSON
     if target_variants:
         headers = {'content-type': 'application/json'}
-        result = requests.post(url, auth=auth, data=json.dumps(target_variants), headers=headers)
+        result = client.post(url, data=json.dumps(target_variants), headers=headers)
         return result
 
 
@@ -2,21 +2,12 @@
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def get_report(report_id):
@@ -27,7 +18,7 @@ def get_report(report_id):
     url = url.format(OMICIA_API_URL,
                      report_id)
 
-    result = requests.get(url, auth=auth, verify=False)
+    result = client.get(url, verify=False)
     return result.json()
 
 
@@ -0,0 +1,57 @@
+"""Query for many reports by id concurrently to see their statuses.
+Example usages:
+ python get_report_statuses.py 1801 1802 1803
+ python get_report_statuses.py 1801 1802 1803 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+import aiohttp
+
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from client import aio
+
+
+async def get_report_or_error(report_id):
+    """Fetch a report, or return an error object if the API answered with
+    an error status or could not be reached.
+    """
+    try:
+        return await aio.get_report(report_id)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return {'description': str(e) or type(e).__name__}
+
+
+async def get_reports(report_ids, concurrency):
+    """Fetch every report with at most concurrency requests in flight.
+    """
+    try:
+        return await aio.gather((get_report_or_error(report_id) for report_id in report_ids),
+                                limit=concurrency)
+    finally:
+        await aio.close_session()
+
+
+def main():
+    """Main function. Retrieve the statuses of several reports by id.
+    """
+    parser = argparse.ArgumentParser(description='Fetch the statuses of several reports.')
+    parser.add_argument('report_ids', metavar='report_id', nargs='+')
+    parser.add_argument('--concurrency', metavar='concurrency', type=int,
+                        default=aio.DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    json_responses = asyncio.run(get_reports(args.report_ids, args.concurrency))
+
+    for report_id, json_response in zip(args.report_ids, json_responses):
+        try:
+            sys.stdout.write("{}: {}\n".format(report_id, json_response['status']))
+        except KeyError:
+            sys.stderr.write('{}: Error: {}\n'.format(report_id, json_response.get('description')))
+
+if __name__ == "__main__":
+    main()
@@ -6,28 +6,22 @@ Usages: python get_report_variants.py 1542
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 import argparse
 import urllib
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.jsonstream import CHUNK_SIZE, iter_objects, write_ndjson
 
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
 
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
-
-
-def get_cr_variants(cr_id, statuses, _format, chrom, start_on_chrom, end_on_chrom, extended=False):
+def get_cr_variants(cr_id, statuses, _format, chrom, start_on_chrom, end_on_chrom, extended=False,
+                    stream=False):
     """Use the Omicia API to get report variants that meet the filtering criteria.
+    If stream is True the response body is not read until it is iterated over.
     """
     params = []
     # Generate the url to be able to query for multiple statuses
@@ -60,7 +54,7 @@ def get_cr_variants(cr_id, statuses, _format, chrom, start_on_chrom, end_on_chro
     url = url.format(OMICIA_API_URL, cr_id, data)
 
     sys.stdout.flush()
-    result = requests.get(url, auth=auth)
+    result = client.get(url, stream=stream)
     return result
 
 
@@ -78,6 +72,8 @@ def main():
                                                                    'X', 'Y', 'M'])
     parser.add_argument('--start_on_chrom', metavar='start_on_chrom', type=int)
     parser.add_argument('--end_on_chrom', metavar='end_on_chrom', type=int)
+    parser.add_argument('--ndjson', action='store_true',
+                        help='write JSON variants one per line as they are received')
 
     args = parser.parse_args()
 
@@ -87,13 +83,18 @@ def main():
     chrom = args.chrom
     start_on_chrom = args.start_on_chrom
     end_on_chrom = args.end_on_chrom
+    ndjson = args.ndjson
 
     statuses = status.split(",") if status else None
 
-    response = get_cr_variants(cr_id, statuses, _format, chrom, start_on_chrom, end_on_chrom)
+    response = get_cr_variants(cr_id, statuses, _format, chrom, start_on_chrom, end_on_chrom,
+                               stream=_format == 'VCF' or ndjson)
     if _format == 'VCF':
         for block in response.iter_content(1024):
             sys.stdout.write(block)
+    elif ndjson:
+        variants = iter_objects(response.iter_content(CHUNK_SIZE))
+        write_ndjson(variants, sys.stdout)
     else:
         try:
             response_json = response.json()
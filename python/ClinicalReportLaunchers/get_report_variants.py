@@ -3,32 +3,38 @@ Usages: python get_report_variants.py 1542
         python get_report_variants.py 1542 --status "FAILED_CONFIRMATION,REVIEWED"
         python get_report_variants.py 1542 --status "CONFIRMED" --format "VCF"
         python get_report_variants.py 1542 --chr "Y" --start_on_chrom 1339 --status "REVIEWED"
+        python get_report_variants.py 1542 --extended true --ndjson > variants.ndjson
+        python get_report_variants.py 1542 --shards --format "VCF" > variants.vcf
+        python get_report_variants.py 1542 --window 20000000 --workers 16 --ndjson
+        python get_report_variants.py 1542 --cache --ndjson
+        python get_report_variants.py 1542 --format "VCF" --output variants.vcf
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
+import csv
 import json
 import argparse
-import urllib
+import tempfile
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.downloads import DEFAULT_CHUNK_SIZE, DownloadError, download
+from client.jsonstream import CHUNK_SIZE, iter_objects, write_json_objects, write_ndjson
+from client.shards import DEFAULT_WORKERS, fetch_shards, genome_shards, merge_shards, sort_key
+from client.variantstore import VariantStore
+from get_clinical_report import get_clinical_report
 
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
+# Fields, and CSV columns, that may hold the position a variant starts at
+POSITION_FIELDS = ('start_on_chrom', 'position', 'pos', 'start')
 
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
 
-
-def get_cr_variants(cr_id, statuses, to_reports, _format, chrom, start_on_chrom, end_on_chrom, alt,
-                    extended=False):
-    """Use the Omicia API to get report variants that meet the filtering criteria.
+def cr_variants_params(statuses, to_reports, _format, chrom, start_on_chrom, end_on_chrom, alt,
+                       extended=False):
+    """Return the query parameters that select report variants meeting the
+    filtering criteria, as a list of pairs.
     """
     params = []
     # Generate the url to be able to query for multiple statuses
@@ -60,18 +66,161 @@ def get_cr_variants(cr_id, statuses, to_reports, _format, chrom, start_on_chrom,
     if _format in ["VCF", "CSV"]:
         params.append(('format', _format))
 
-    # Do seq allows for the multiple values for one parameter name, as could be the case for the
-    # status or to_report parameters.
-    data = urllib.urlencode(params, doseq=True)
+    # A list of pairs allows for the multiple values for one parameter name, as
+    # could be the case for the status or to_report parameters.
+    return params
+
+
+def get_cr_variants(cr_id, statuses, to_reports, _format, chrom, start_on_chrom, end_on_chrom, alt,
+                    extended=False, stream=False, headers=None):
+    """Use the Omicia API to get report variants that meet the filtering criteria.
+    If stream is True the response body is not read until it is iterated over.
+    headers are sent with the request, if given.
+    """
+    params = cr_variants_params(statuses, to_reports, _format, chrom, start_on_chrom,
+                                end_on_chrom, alt, extended=extended)
 
     # Construct request
-    url = "{}/reports/{}/variants?{}"
-    url = url.format(OMICIA_API_URL, cr_id, data)
+    url = "{}/reports/{}/variants"
+    url = url.format(OMICIA_API_URL, cr_id)
 
-    result = requests.get(url, auth=auth, verify=False)
+    result = client.get(url, params=params, headers=headers, verify=False, stream=stream)
     return result
 
 
+def download_cr_variants(cr_id, statuses, to_reports, _format, chrom, start_on_chrom,
+                         end_on_chrom, alt, path, extended=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Download report variants that meet the filtering criteria to the file
+    path, resuming an earlier download of the same query if it was
+    interrupted. Raises client.downloads.DownloadError if it fails.
+    """
+    params = cr_variants_params(statuses, to_reports, _format, chrom, start_on_chrom,
+                                end_on_chrom, alt, extended=extended)
+    url = "{}/reports/{}/variants".format(OMICIA_API_URL, cr_id)
+    return download(url, path=path, chunk_size=chunk_size, params=params, verify=False)
+
+
+def _position(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def variant_position(variant):
+    """Return the position a JSON variant starts at, or 0 if not known.
+    """
+    for name in POSITION_FIELDS:
+        if variant.get(name) is not None:
+            return _position(variant[name])
+    return 0
+
+
+def _text_lines(response):
+    for line in response.iter_lines():
+        if not isinstance(line, str):
+            line = line.decode('utf-8')
+        yield line
+
+
+def iter_shard_lines(shard, header, cr_id, statuses, to_reports, _format, alt, extended=False):
+    """Get one shard of a report's variants, yielding each variant as a line
+    prefixed with its shards.sort_key(): a JSON object, or a VCF or CSV
+    record. VCF header lines and the CSV header are appended to header.
+    A variant is only yielded by the shard its start position is in.
+    """
+    response = get_cr_variants(cr_id, statuses, to_reports, _format, shard.chrom,
+                               shard.start, shard.end, alt, extended=extended, stream=True)
+    if response.status_code != 200:
+        raise IOError('HTTP {}: {}'.format(response.status_code, response.text[:200]))
+
+    if _format == 'VCF':
+        for sequence, line in enumerate(_text_lines(response)):
+            if line.startswith('#'):
+                header.append(line + '\n')
+                continue
+            fields = line.split('\t')
+            position = _position(fields[1]) if len(fields) > 1 else 0
+            if line and shard.contains(position):
+                yield sort_key(shard.chrom, position, shard, sequence) + line + '\n'
+    elif _format == 'CSV':
+        lines = _text_lines(response)
+        first = next(lines, None)
+        if first is None:
+            return
+        header.append(first + '\n')
+        names = [name.strip().lower() for name in next(csv.reader([first]))]
+        column = next((names.index(name) for name in POSITION_FIELDS if name in names), None)
+        for sequence, line in enumerate(lines):
+            if not line:
+                continue
+            position = 0
+            if column is not None:
+                row = next(csv.reader([line]))
+                position = _position(row[column]) if column < len(row) else 0
+            if shard.contains(position):
+                yield sort_key(shard.chrom, position, shard, sequence) + line + '\n'
+    else:
+        variants = iter_objects(response.iter_content(CHUNK_SIZE))
+        for sequence, variant in enumerate(variants):
+            position = variant_position(variant)
+            if shard.contains(position):
+                yield sort_key(shard.chrom, position, shard, sequence) + json.dumps(variant) + '\n'
+
+
+def get_cr_variants_sharded(cr_id, statuses, to_reports, _format, chrom, start_on_chrom,
+                            end_on_chrom, alt, extended=False, window=None,
+                            workers=DEFAULT_WORKERS):
+    """Get report variants with one range query per chromosome (or per
+    window bases of each), workers at a time, and return the header lines
+    and an iterator over the variant lines in coordinate order: VCF or CSV
+    records, or for JSON, one JSON object per line.
+    """
+    shards = genome_shards(window, [chrom] if chrom else None, start_on_chrom, end_on_chrom)
+
+    def fetch(shard, header):
+        return iter_shard_lines(shard, header, cr_id, statuses, to_reports, _format, alt,
+                                extended=extended)
+
+    header, spools = fetch_shards(shards, fetch, workers)
+    return header, merge_shards(spools)
+
+
+def get_stored_cr_variants(cr_id, statuses, to_reports, chrom, start_on_chrom, end_on_chrom, alt,
+                           extended=False, sharded=False, window=None, workers=DEFAULT_WORKERS,
+                           store=None):
+    """Return a client.variantstore.VariantTable of the report variants that
+    meet the filtering criteria, from the local store. They are only fetched
+    (in shards, if sharded or window is given) when the store has none for
+    the report's current version.
+    """
+    report = get_clinical_report(cr_id)
+    version = report.get('version')
+    if version is None:
+        raise ValueError('report {} has no version: {}'.format(
+            cr_id, report.get('description', report)))
+    store = store or VariantStore()
+    query = store.query_key([('status', statuses), ('to_report', to_reports),
+                             ('chrom', chrom), ('start_on_chrom', start_on_chrom),
+                             ('end_on_chrom', end_on_chrom), ('alt', alt),
+                             ('extended', bool(extended))])
+
+    def fetch():
+        if sharded or window:
+            _, lines = get_cr_variants_sharded(cr_id, statuses, to_reports, 'JSON', chrom,
+                                               start_on_chrom, end_on_chrom, alt,
+                                               extended=extended, window=window,
+                                               workers=workers)
+            return (json.loads(line) for line in lines)
+        response = get_cr_variants(cr_id, statuses, to_reports, 'JSON', chrom, start_on_chrom,
+                                   end_on_chrom, alt, extended=extended, stream=True)
+        if response.status_code != 200:
+            raise IOError('HTTP {}: {}'.format(response.status_code, response.text[:200]))
+        return iter_objects(response.iter_content(CHUNK_SIZE))
+
+    return store.get(cr_id, version, fetch, query)
+
+
 def main():
     """Main function. Get report variants, all or filtering by status.
     """
@@ -89,6 +238,22 @@ def main():
     parser.add_argument('--start_on_chrom', metavar='start_on_chrom', type=int)
     parser.add_argument('--end_on_chrom', metavar='end_on_chrom', type=int)
     parser.add_argument('--alt', metavar='alt', type=str, choices=['A', 'T', 'C', 'G'])
+    parser.add_argument('--ndjson', action='store_true',
+                        help='write JSON variants one per line as they are received')
+    parser.add_argument('--shards', action='store_true',
+                        help='fetch each chromosome with a separate request, in parallel')
+    parser.add_argument('--window', metavar='window', type=int,
+                        help='fetch windows of this many bases in parallel (implies --shards)')
+    parser.add_argument('--workers', metavar='workers', type=int, default=DEFAULT_WORKERS,
+                        help='number of shards to fetch at once')
+    parser.add_argument('--output', metavar='output', type=str,
+                        help='write CSV or VCF (or sharded) variants to this file; a download '
+                             'resumes where it stopped if interrupted')
+    parser.add_argument('--chunk_size', metavar='chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='bytes to read at a time when writing CSV or VCF variants')
+    parser.add_argument('--cache', action='store_true',
+                        help='read JSON variants from a local store, fetching them only when '
+                             'the report version has changed')
 
     args = parser.parse_args()
 
@@ -101,10 +266,76 @@ def main():
     start_on_chrom = args.start_on_chrom
     end_on_chrom = args.end_on_chrom
     alt = args.alt
+    ndjson = args.ndjson
 
     statuses = status.split(",") if status else None
     to_reports = to_report.split(",") if to_report else None
 
+    if (args.shards or args.window) and (start_on_chrom or end_on_chrom) and not chrom:
+        sys.exit('--start_on_chrom and --end_on_chrom need --chrom when fetching shards')
+
+    if args.output and _format == 'JSON' and not (args.shards or args.window):
+        sys.exit('--output needs --format CSV or VCF, or --shards')
+
+    if args.output and not (args.shards or args.window):
+        try:
+            download_cr_variants(cr_id, statuses, to_reports, _format, chrom, start_on_chrom,
+                                 end_on_chrom, alt, args.output, extended=extended=='true',
+                                 chunk_size=args.chunk_size)
+        except DownloadError as e:
+            sys.exit('Downloading variants failed: {}'.format(e))
+        return
+
+    if args.cache:
+        if _format != 'JSON':
+            sys.exit('--cache stores JSON variants only')
+        try:
+            table = get_stored_cr_variants(cr_id, statuses, to_reports, chrom, start_on_chrom,
+                                           end_on_chrom, alt, extended=extended=='true',
+                                           sharded=args.shards, window=args.window,
+                                           workers=args.workers)
+        except (IOError, ValueError) as e:
+            sys.exit('Getting variants failed for {}'.format(e))
+        if ndjson:
+            write_ndjson(table.iter_rows(), sys.stdout)
+        else:
+            write_json_objects(table.iter_rows(), sys.stdout)
+        return
+
+    if args.shards or args.window:
+        try:
+            header, lines = get_cr_variants_sharded(cr_id, statuses, to_reports, _format, chrom,
+                                                    start_on_chrom, end_on_chrom, alt,
+                                                    extended=extended=='true',
+                                                    window=args.window, workers=args.workers)
+        except IOError as e:
+            sys.exit('Getting variants failed for {}'.format(e))
+        out = sys.stdout
+        temp_path = None
+        if args.output:
+            # Merge into a temporary file and rename it into place when complete
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(args.output)),
+                                             prefix='.tmp-')
+            out = os.fdopen(fd, 'w')
+        try:
+            out.writelines(header)
+            if _format in ['CSV', 'VCF'] or ndjson:
+                out.writelines(lines)
+            else:
+                out.write('{"objects": [\n')
+                for i, line in enumerate(lines):
+                    out.write((',\n' if i else '') + line.rstrip('\n'))
+                out.write('\n]}\n')
+            if args.output:
+                out.close()
+                os.rename(temp_path, args.output)
+                temp_path = None
+        finally:
+            if temp_path is not None:
+                out.close()
+                os.remove(temp_path)
+        return
+
     response = get_cr_variants(cr_id,
                                statuses,
                                to_reports,
@@ -113,13 +344,15 @@ def main():
                                start_on_chrom,
                                end_on_chrom,
                                alt,
-                               extended=extended=='true')
-    if _format == 'CSV':
-        for block in response.iter_content(1024):
-            sys.stdout.write(block)
-    elif _format == 'VCF':
-        for block in response.iter_content(1024):
-            sys.stdout.write(block)
+                               extended=extended=='true',
+                               stream=_format in ['CSV', 'VCF'] or ndjson)
+    if _format in ['CSV', 'VCF']:
+        out = getattr(sys.stdout, 'buffer', sys.stdout)
+        for block in response.iter_content(args.chunk_size):
+            out.write(block)
+    elif ndjson:
+        variants = iter_objects(response.iter_content(CHUNK_SIZE))
+        write_ndjson(variants, sys.stdout)
     else:
         try:
             response_json = response.json()
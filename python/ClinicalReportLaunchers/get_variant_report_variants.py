@@ -5,26 +5,21 @@ python get_variant_report_variants.py 12345 --target_variants '[{"chromosome": "
 python get_variant_report_variants.py 12345 --bed_file variants.bed
 python get_variant_report_variants.py 12345 --variant_location "chr1:1635004-1635004"
 python get_variant_report_variants.py 12345 --variant_id 54321
+python get_variant_report_variants.py 12345 --offset 0 --limit 100000 --ndjson
+python get_variant_report_variants.py 12345 --all --ndjson
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.jsonstream import CHUNK_SIZE, iter_objects, write_json_objects, write_ndjson
+from client.pages import DEFAULT_PAGE_SIZE, DEFAULT_PREFETCH, iter_pages
 
 
 def get_variant_report_variant(variant_report_id,
@@ -33,8 +28,10 @@ def get_variant_report_variant(variant_report_id,
                                offset=None,
                                limit=None,
                                bed_file_path=None,
-                               target_variants=None):
-    """Get report variants by location, id or simply all.
+                               target_variants=None,
+                               stream=False):
+    """Get report variants by location, id or simply all. If stream is True
+    the response body is not read until it is iterated over.
     """
     # Construct request
     url = "{}/variant_reports/{}/variants"
@@ -43,23 +40,23 @@ def get_variant_report_variant(variant_report_id,
     # If target variants JSON is specified, post with the target variants JSON
     if target_variants:
         headers= {'content-type': 'application/json'}
-        result = requests.post(url, auth=auth, data=target_variants, headers=headers)
+        result = client.post(url, data=target_variants, headers=headers, stream=stream)
         return result
     else:
         if not bed_file_path:
-            if (variant_id or variant_location):
-                if variant_id:
-                    url = "{}/{}".format(url, variant_id)
-                elif variant_location:
-                    url = "{}?location={}".format(url, variant_location)
-            elif (offset or limit):
-                url += "?"
+            # Query parameters are encoded by requests
+            params = {}
+            if variant_id:
+                url = "{}/{}".format(url, variant_id)
+            elif variant_location:
+                params['location'] = variant_location
+            else:
                 if offset:
-                    url = "{}&offset={}".format(url, offset)
+                    params['offset'] = offset
                 if limit:
-                    url = "{}&limit={}".format(url, limit)
+                    params['limit'] = limit
             sys.stdout.flush()
-            result = requests.get(url, auth=auth)
+            result = client.get(url, params=params, stream=stream)
             return result
         elif bed_file_path:
             # If BED file is specified, post using the target variants bed file as the payload
@@ -67,10 +64,21 @@ def get_variant_report_variant(variant_report_id,
                 sys.exit("BED file path does not point to a real file.")
             with open(bed_file_path,'rb') as payload:
                 headers = {'content-type': 'application/x-www-form-urlencoded'}
-                result = requests.post(url, auth=auth, data=payload, headers=headers)
+                result = client.post(url, data=payload, headers=headers, stream=stream)
                 return result
 
 
+def iter_variant_report_variants(variant_report_id, offset=0,
+                                 page_size=DEFAULT_PAGE_SIZE,
+                                 prefetch=DEFAULT_PREFETCH):
+    """Yield every variant of a variant report, starting at offset. The
+    next prefetch pages are fetched while the current one is consumed, and
+    the page size adapts to how quickly pages arrive.
+    """
+    url = "{}/variant_reports/{}/variants".format(OMICIA_API_URL, variant_report_id)
+    return iter_pages(url, offset=offset, page_size=page_size, prefetch=prefetch)
+
+
 def main():
     """Main function. Patch a report variant.
     """
@@ -82,6 +90,14 @@ def main():
     parser.add_argument('--variant_location', metavar='variant_location', type=str)
     parser.add_argument('--offset', metavar='offset', type=int)
     parser.add_argument('--limit', metavar='limit', type=int)
+    parser.add_argument('--all', action='store_true',
+                        help='fetch every variant from offset on, a page at a time')
+    parser.add_argument('--page_size', metavar='page_size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help='variants in the first page requested with --all')
+    parser.add_argument('--prefetch', metavar='prefetch', type=int, default=DEFAULT_PREFETCH,
+                        help='pages to fetch ahead with --all')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='write variants one per line as they are received')
     args = parser.parse_args()
 
     variant_report_id = args.variant_report_id
@@ -91,6 +107,17 @@ def main():
     variant_id = args.variant_id
     offset = args.offset
     limit = args.limit
+    ndjson = args.ndjson
+
+    if args.all:
+        variants = iter_variant_report_variants(variant_report_id, offset=offset or 0,
+                                                page_size=args.page_size,
+                                                prefetch=args.prefetch)
+        if ndjson:
+            write_ndjson(variants, sys.stdout)
+        else:
+            write_json_objects(variants, sys.stdout)
+        return
 
     if not (variant_id or variant_location) and not (offset or limit) and not (bed_file_path or target_variants):
         sys.exit("Variant ID or location must be specified to retrieve a variant, "
@@ -105,7 +132,12 @@ def main():
                                           offset=offset,
                                           limit=limit,
                                           bed_file_path=bed_file_path,
-                                          target_variants=target_variants)
+                                          target_variants=target_variants,
+                                          stream=ndjson)
+    if ndjson:
+        variants = iter_objects(response.iter_content(CHUNK_SIZE))
+        write_ndjson(variants, sys.stdout)
+        return
     try:
         sys.stdout.write(json.dumps(response.json(), indent=4))
     except KeyError:
@@ -30,23 +30,16 @@ line endings are newlines (\n) and not the deprecated carriage returns (\r)
 import csv
 import json
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 
 _MANIFEST_FILENAME = 'duo_manifest.csv'
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.uploads import put_genome
+from client.vcf import VcfError
 
 
 # A map between the row numbers and fields from the patient information csv
@@ -91,7 +84,7 @@ def add_fields_to_cr(cr_id, patient_fields):
     sys.stdout.write("Adding custom patient fields to report...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.post(url, auth=auth, data=url_payload)
+    result = client.post(url, data=url_payload)
     return result.json()
 
 
@@ -147,12 +140,13 @@ def launch_duo_report(related_genome_id, duo_relation, duo_affected,
                    'accession_id': accession_id}
 
     sys.stdout.write("Launching family report...\n")
-    result = requests.post(url, auth=auth, data=json.dumps(url_payload))
+    result = client.post(url, data=json.dumps(url_payload),
+                         recover=client.report_guard(accession_id))
 
     return result.json()
 
 
-def upload_genome(project_id, genome_info, family_folder):
+def upload_genome(project_id, genome_info, family_folder, validate=True):
     """Upload a genome from a given folder to a specified project
     """
     # Construct url and request
@@ -164,15 +158,22 @@ def upload_genome(project_id, genome_info, family_folder):
                'format': genome_info['format']}
 
     # Upload genome
-    with open(family_folder + "/" + genome_info['genome_filename'], 'rb') as file_handle:
+    # Unless validate is False, check the genome as it is sent, stopping the
+    # upload if it is invalid
+    try:
         # Post request and store newly uploaded genome's information
-        result = requests.put(url, data=file_handle, params=payload, auth=auth)
-        sys.stdout.write(".")
-        sys.stdout.flush()
-        return result.json()["genome_id"]
+        result = put_genome(url, family_folder + "/" + genome_info['genome_filename'],
+                            validate=validate, params=payload,
+                            recover=client.upload_guard(project_id, genome_info['genome_label'],
+                                                        genome_info['external_id']))
+    except VcfError as e:
+        sys.exit(str(e))
+    sys.stdout.write(".")
+    sys.stdout.flush()
+    return result.json()["genome_id"]
 
 
-def upload_genomes_to_project(project_id, family_folder):
+def upload_genomes_to_project(project_id, family_folder, validate=True):
     """Upload each of the three genomes in the folder containing the
     family trio to the specified project
     """
@@ -184,10 +185,12 @@ def upload_genomes_to_project(project_id, family_folder):
     sys.stdout.flush()
 
     related_genome_id = \
-        upload_genome(project_id, family_manifest_info['related'], family_folder)
+        upload_genome(project_id, family_manifest_info['related'], family_folder,
+                      validate=validate)
 
     proband_genome_id = \
-        upload_genome(project_id, family_manifest_info['proband'], family_folder)
+        upload_genome(project_id, family_manifest_info['proband'], family_folder,
+                      validate=validate)
 
     sys.stdout.write("\n")
 
@@ -207,17 +210,19 @@ def upload_genomes_to_project(project_id, family_folder):
 def main(argv):
     """Main function, creates a panel report.
     """
+    validate = '--skip_validation' not in argv
+    argv = [arg for arg in argv if arg != '--skip_validation']
     if len(argv) < 5:
         sys.exit("Usage: python launch_family_report.py <project_id> \
         <family_folder> <score_indels> <reporting_cutoff> <accession_id> \
-        optional: <patient_info_file>")
+        optional: <patient_info_file> --skip_validation")
     project_id = argv[0]
     family_folder = argv[1]
     score_indels = argv[2]
     reporting_cutoff = argv[3]
     accession_id = argv[4]
 
-    family_genome_ids = upload_genomes_to_project(project_id, family_folder)
+    family_genome_ids = upload_genomes_to_project(project_id, family_folder, validate)
 
     # Confirm uploaded genomes' data
     sys.stdout.write("Uploaded 2 genomes:\n")
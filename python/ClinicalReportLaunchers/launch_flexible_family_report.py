@@ -4,22 +4,13 @@
 import csv
 import simplejson as json
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def launch_family_report(report_type,
@@ -48,7 +39,8 @@ def launch_family_report(report_type,
                     'hpo_terms': json.dumps(hpo_terms) if hpo_terms else None}
 
     sys.stdout.write("Launching flexible family report...\n")
-    result = requests.post(url, auth=auth, data=json.dumps(data_payload), verify=False)
+    result = client.post(url, data=json.dumps(data_payload), verify=False,
+                         recover=client.report_guard(accession_id))
     return result.json()
 
 
@@ -23,21 +23,14 @@ import argparse
 import csv
 import json
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.uploads import put_genome
+from client.vcf import VcfError
 
 # A map between the row numbers and fields from the patient information csv
 patient_info_row_map = {
@@ -81,7 +74,7 @@ def add_fields_to_cr(cr_id, patient_fields):
     sys.stdout.write("Adding custom patient fields to report...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.post(url, auth=auth, data=url_payload)
+    result = client.post(url, data=url_payload)
     return result.json()
 
 
@@ -100,12 +93,13 @@ def launch_panel_report(genome_id, filter_id, panel_id, accession_id):
     sys.stdout.write("Launching report...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.post(url, auth=auth, data=json.dumps(url_payload), verify=False)
+    result = client.post(url, data=json.dumps(url_payload), verify=False,
+                         recover=client.report_guard(accession_id))
 
     return result.json()
 
 
-def upload_genome_to_project(project_id, label, sex, file_format, file_name):
+def upload_genome_to_project(project_id, label, sex, file_format, file_name, validate=True):
     """Use the Omicia API to add a genome, in vcf format, to a project.
     Returns the newly uploaded genome's id.
     """
@@ -115,10 +109,15 @@ def upload_genome_to_project(project_id, label, sex, file_format, file_name):
     url = url.format(OMICIA_API_URL, project_id, label, sex, file_format)
 
     sys.stdout.write("Uploading genome...\n")
-    with open(file_name, 'rb') as file_handle:
+    # Unless validate is False, check the genome as it is sent, stopping the
+    # upload if it is invalid
+    try:
         #Post request and return id of newly uploaded genome
-        result = requests.put(url, auth=auth, data=file_handle, verify=False)
-        return result.json()["genome_id"]
+        result = put_genome(url, file_name, validate=validate, verify=False,
+                            recover=client.upload_guard(project_id, label))
+    except VcfError as e:
+        sys.exit(str(e))
+    return result.json()["genome_id"]
 
 
 def main(argv):
@@ -134,6 +133,8 @@ def main(argv):
     parser.add_argument('accession_id', metavar='accession_id', type=str)
     parser.add_argument('--filter_id', metavar='filter_id', type=int)
     parser.add_argument('--patient_info_file', metavar='patient_info_file', type=str)
+    parser.add_argument('--skip_validation', action='store_true',
+                        help='do not check the vcf while uploading it')
     args = parser.parse_args()
 
     project_id = args.project_id
@@ -148,7 +149,8 @@ def main(argv):
 
     # Upload genome
     genome_id = upload_genome_to_project(project_id, label, sex,
-                                         file_format, genome_filename)
+                                         file_format, genome_filename,
+                                         validate=not args.skip_validation)
     sys.stdout.write("genome_id: {}\n".format(genome_id))
 
     # Launch panel report with uploaded genome
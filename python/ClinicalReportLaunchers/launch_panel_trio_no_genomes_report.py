@@ -32,23 +32,14 @@ import argparse
 import csv
 import json
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 
 _MANIFEST_FILENAME = 'panel_trio_manifest.csv'
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 # A map between the row numbers and fields from the patient information csv
@@ -93,7 +84,7 @@ def add_fields_to_cr(cr_id, patient_fields):
     sys.stdout.write("Adding custom patient fields to report...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.post(url, auth=auth, data=url_payload)
+    result = client.post(url, data=url_payload)
     return result.json()
 
 
@@ -115,7 +106,8 @@ def launch_panel_trio_report(panel_id, filter_id, reporting_cutoff, accession_id
                    }
 
     sys.stdout.write("Launching panel trio report...\n")
-    result = requests.post(url, auth=auth, data=json.dumps(url_payload))
+    result = client.post(url, data=json.dumps(url_payload),
+                         recover=client.report_guard(accession_id))
 
     return result.json()
 
@@ -0,0 +1,353 @@
+"""Upload a plate of genomes and launch a clinical report for each sample or
+family on it, in one run. This requires putting all of the genomes in a
+folder along with a descriptor file titled 'report_manifest.csv,' which
+should have the following format:
+
+filename,label,external_id,sex,format,accession_id,report_type,role,affected,panel_id,patient_info_file
+S1.vcf.gz,Sample 1,1,female,vcf.gz,ACC1,panel,proband,affected,12,ACC1_patient.csv
+S2.vcf.gz,Sample 2,2,male,vcf.gz,ACC2,solo,proband,affected,,
+S3.vcf.gz,Sample 3,3,female,vcf.gz,ACC3,trio,mother,unaffected,,
+S4.vcf.gz,Sample 4,4,male,vcf.gz,ACC3,trio,father,unaffected,,
+S5.vcf.gz,Sample 5,5,female,vcf.gz,ACC3,trio,proband,affected,,ACC3_patient.csv
+S6.vcf.gz,Sample 6,6,male,vcf.gz,ACC4,duo,proband,affected,,
+S7.vcf.gz,Sample 7,7,female,vcf.gz,ACC4,duo,mother,affected,,
+
+Rows with the same accession_id make up one report. report_type is one of
+solo, duo, trio, quad or panel, and role is one of proband, mother, father
+or sibling: a duo has a proband and one relative, a trio a proband, mother
+and father, and a quad a sibling as well. The report_type, panel_id and
+patient_info_file of a report are taken from its proband's row;
+patient_info_file names a csv in the folder, formatted as for
+launch_family_report.py, whose fields are added to the launched report.
+
+All of the genomes are uploaded in parallel, and each report is launched as
+soon as its own genomes have finished uploading, while the rest of the
+plate is still being sent. Adding the patient fields is the last step for
+each report.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.ledger import UploadLedger
+from client.uploads import genome_id, put_genome, upload_all
+
+MANIFEST_FILENAME = 'report_manifest.csv'
+
+# The family members each type of report is launched with
+REPORT_ROLES = {'solo': set(['proband']),
+                'panel': set(['proband']),
+                'trio': set(['proband', 'mother', 'father']),
+                'quad': set(['proband', 'mother', 'father', 'sibling'])}
+DUO_RELATIONS = ('mother', 'father', 'sibling')
+
+
+# A map between the row numbers and fields from the patient information csv
+patient_info_row_map = {
+    0: 'Last Name',
+    1: 'First Name',
+    2: 'Patient DOB',
+    3: 'Accession ID',
+    4: 'Patient Sex',
+    5: 'Patient Ethnicity',
+    6: 'Indication for Testing',
+    7: 'Specimen Type',
+    8: 'Date Specimen Collected',
+    9: 'Date Specimen Received',
+    10: 'Ordering Physician'
+}
+
+
+def generate_patient_info_json(patient_info_file_name):
+    """Given a properly formatted csv file containing the patient information,
+    generate and return a JSON object representing its contents.
+    """
+    patient_info = {}
+    with open(patient_info_file_name) as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip the header
+        for i, row in enumerate(reader):
+            if i < 11:
+                patient_info[patient_info_row_map[i]] = row[1]
+    return patient_info
+
+
+def add_fields_to_cr(cr_id, patient_fields):
+    """Use the Omicia API to fill in custom patient fields for a clinical report
+    e.g. patient_fields: '{"Patient Name": "Eric", "Gender": "Male", "Accession Number": "1234"}'
+    """
+    # Construct request
+    url = "{}/reports/{}/patient_fields"
+    url = url.format(OMICIA_API_URL, cr_id)
+    url_payload = json.dumps(patient_fields)
+
+    result = client.post(url, data=url_payload, verify=False)
+    return result.json()
+
+
+def get_manifest_info(folder):
+    """Read the report manifest in the folder. Return the list of genomes to
+    upload, grouped by report, and an ordered dict of the reports by
+    accession id.
+    """
+    if MANIFEST_FILENAME not in os.listdir(folder):
+        sys.exit("No {} file in folder provided.".format(MANIFEST_FILENAME))
+
+    reports = OrderedDict()
+    with open(os.path.join(folder, MANIFEST_FILENAME)) as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip the header
+        for row in reader:
+            if not row:
+                continue
+            row = row + [''] * (11 - len(row))
+            genome_info = {"genome_filename": row[0],
+                           "genome_label": row[1],
+                           "external_id": row[2],
+                           "genome_sex": row[3],
+                           "format": row[4],
+                           "accession_id": row[5],
+                           "role": row[7].lower(),
+                           "affected": row[8].lower() == 'affected'}
+            report = reports.setdefault(row[5], {"accession_id": row[5],
+                                                 "members": OrderedDict()})
+            if genome_info["role"] in report["members"]:
+                sys.exit("Accession {} has more than one {}.".format(row[5], genome_info["role"]))
+            report["members"][genome_info["role"]] = genome_info
+            if genome_info["role"] == 'proband':
+                report["report_type"] = row[6].lower()
+                report["panel_id"] = row[9]
+                report["patient_info_file"] = row[10]
+
+    for accession_id, report in reports.items():
+        roles = set(report["members"])
+        report_type = report.get("report_type")
+        if report_type == 'duo':
+            valid = (len(roles) == 2 and 'proband' in roles and
+                     (roles - set(['proband'])).pop() in DUO_RELATIONS)
+        else:
+            valid = REPORT_ROLES.get(report_type) == roles
+        if not valid:
+            sys.exit("Accession {} does not have the genomes for a {} report.".format(
+                accession_id, report_type or 'known'))
+        if report_type == 'panel' and not report["panel_id"]:
+            sys.exit("Accession {} is a panel report without a panel_id.".format(accession_id))
+
+    genomes = [genome_info for report in reports.values()
+               for genome_info in report["members"].values()]
+    return genomes, reports
+
+
+def upload_genome(project_id, folder, genome_info, progress=None, validate=True):
+    """Upload a genome from the folder to a specified project, checking it
+    as it is sent unless validate is False. Returns the newly uploaded
+    genome's information.
+    """
+    # Construct url and request
+    url = "{}/projects/{}/genomes?".format(OMICIA_API_URL, project_id)
+    payload = {'genome_label': genome_info['genome_label'],
+               'genome_sex': genome_info['genome_sex'],
+               'external_id': genome_info['external_id'],
+               'assembly_version': 'hg19',
+               'format': genome_info['format']}
+
+    file_name = os.path.join(folder, genome_info['genome_filename'])
+    result = put_genome(url, file_name, progress=progress, validate=validate,
+                        params=payload, verify=False,
+                        recover=client.upload_guard(project_id, genome_info['genome_label'],
+                                                    genome_info['external_id']))
+    return result.json()
+
+
+def report_payload(report, genome_ids, score_indels, reporting_cutoff, filter_id):
+    """Build the POST /reports/ payload for a report from the ids of its
+    uploaded genomes.
+    """
+    members = report["members"]
+    proband = members['proband']
+    proband_sex = 'f' if proband['genome_sex'] == 'female' else 'm'
+    accession_id = report["accession_id"]
+    report_type = report["report_type"]
+
+    if report_type == 'panel':
+        payload = {'report_type': "panel",
+                   'genome_id': int(genome_ids['proband']),
+                   'panel_id': int(report["panel_id"]),
+                   'accession_id': accession_id}
+        if filter_id is not None:
+            payload['filter_id'] = filter_id
+        return payload
+
+    payload = {'proband_genome_id': int(genome_ids['proband']),
+               'proband_sex': proband_sex,
+               'background': 'FULL',
+               'score_indels': bool(score_indels),
+               'reporting_cutoff': int(reporting_cutoff),
+               'accession_id': accession_id}
+    if report_type == 'solo':
+        payload['report_type'] = "exome"
+    elif report_type == 'duo':
+        relation = [role for role in members if role != 'proband'][0]
+        payload.update({'report_type': "Duo",
+                        'duo_relation_genome_id': int(genome_ids[relation]),
+                        'duo_relation': relation,
+                        'duo_affected': members[relation]['affected']})
+    else:
+        payload.update({'report_type': "Trio" if report_type == 'trio' else "Quad",
+                        'mother_genome_id': int(genome_ids['mother']),
+                        'father_genome_id': int(genome_ids['father'])})
+        if report_type == 'quad':
+            sibling = members['sibling']
+            payload.update({'sibling_genome_id': int(genome_ids['sibling']),
+                            'sibling_sex': 'f' if sibling['genome_sex'] == 'female' else 'm',
+                            'sibling_affected': 'true' if sibling['affected'] else 'false'})
+    return payload
+
+
+def launch_report(folder, report, genome_ids, score_indels, reporting_cutoff, filter_id):
+    """Launch a report once all of its genomes are uploaded, then add its
+    patient fields. Return a summary of the outcome.
+    """
+    accession_id = report["accession_id"]
+    failed = [role for role in report["members"] if genome_ids.get(role) is None]
+    if failed:
+        return {'accession_id': accession_id,
+                'error': 'Upload failed for {}'.format(', '.join(failed))}
+
+    url = "{}/reports/".format(OMICIA_API_URL)
+    url_payload = report_payload(report, genome_ids, score_indels, reporting_cutoff, filter_id)
+    result = client.post(url, data=json.dumps(url_payload), verify=False,
+                         recover=client.report_guard(accession_id))
+    report_json = result.json()
+    if "clinical_report" not in report_json:
+        return {'accession_id': accession_id,
+                'error': report_json.get('description', 'Failed to launch')}
+    clinical_report = report_json['clinical_report']
+
+    # Add the patient fields last, once the report exists
+    if report.get("patient_info_file"):
+        patient_info = generate_patient_info_json(
+            os.path.join(folder, report["patient_info_file"]))
+        add_fields_to_cr(clinical_report.get('id'), patient_info)
+
+    return {'accession_id': accession_id,
+            'id': clinical_report.get('id'),
+            'test_type': clinical_report.get('test_type'),
+            'status': clinical_report.get('status'),
+            'genome_ids': genome_ids}
+
+
+def launch_reports(project_id, folder, workers=4, launchers=2, score_indels=False,
+                   reporting_cutoff=30, filter_id=None, skip_uploaded=True, validate=True):
+    """Upload every genome in the manifest with up to workers uploads at
+    once, and launch each report, using up to launchers threads, as soon as
+    its genomes are uploaded. Unless validate is False, each genome is
+    checked as it is sent. Return a summary of each report, in manifest
+    order.
+    """
+    genomes, reports = get_manifest_info(folder)
+    jobs = [(os.path.join(folder, genome_info['genome_filename']), genome_info)
+            for genome_info in genomes]
+    genome_ids = dict((accession_id, {}) for accession_id in reports)
+    waiting = dict((accession_id, len(report["members"]))
+                   for accession_id, report in reports.items())
+    results = OrderedDict((accession_id, None) for accession_id in reports)
+    ready = queue.Queue()
+    lock = threading.Lock()
+
+    def uploaded(index, result):
+        genome_info = jobs[index][1]
+        accession_id = genome_info['accession_id']
+        with lock:
+            genome_ids[accession_id][genome_info['role']] = genome_id(result)
+            waiting[accession_id] -= 1
+            complete = not waiting[accession_id]
+        if complete:
+            ready.put(reports[accession_id])
+
+    def launcher():
+        while True:
+            report = ready.get()
+            if report is None:
+                return
+            accession_id = report["accession_id"]
+            try:
+                summary = launch_report(folder, report, genome_ids[accession_id],
+                                        score_indels, reporting_cutoff, filter_id)
+            except Exception as e:
+                summary = {'accession_id': accession_id, 'error': str(e)}
+            results[accession_id] = summary
+            if 'error' in summary:
+                sys.stderr.write("Did not launch {}: {}\n".format(accession_id, summary['error']))
+            else:
+                sys.stderr.write("Launched {} report {} for {}\n".format(
+                    report["report_type"], summary['id'], accession_id))
+
+    threads = [threading.Thread(target=launcher) for _ in range(max(1, launchers))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    def upload(genome_info, progress):
+        return upload_genome(project_id, folder, genome_info, progress, validate=validate)
+
+    ledger = UploadLedger() if skip_uploaded else None
+    upload_all(jobs, upload, workers=workers, ledger=ledger,
+               project_id=project_id, on_done=uploaded)
+
+    for _ in threads:
+        ready.put(None)
+    for thread in threads:
+        thread.join()
+    return list(results.values())
+
+
+def main():
+    """Main function. Upload a folder of genomes and launch their reports.
+    """
+    parser = argparse.ArgumentParser(description='Upload genomes and launch their reports from a manifest.')
+    parser.add_argument('project_id', metavar='project_id', type=int)
+    parser.add_argument('folder', metavar='folder')
+    parser.add_argument('--score_indels', action='store_true')
+    parser.add_argument('--reporting_cutoff', metavar='reporting_cutoff', type=int, default=30)
+    parser.add_argument('--filter_id', metavar='filter_id', type=int,
+                        help='filter for panel reports')
+    parser.add_argument('--workers', metavar='workers', type=int, default=4,
+                        help='number of genomes to upload at once')
+    parser.add_argument('--launchers', metavar='launchers', type=int, default=2,
+                        help='number of reports to launch at once')
+    parser.add_argument('--force', action='store_true',
+                        help='upload genomes even if they were uploaded before')
+    parser.add_argument('--skip_validation', action='store_true',
+                        help='do not check the vcfs while uploading them')
+    args = parser.parse_args()
+
+    report_summaries = launch_reports(args.project_id, args.folder,
+                                      workers=args.workers,
+                                      launchers=args.launchers,
+                                      score_indels=args.score_indels,
+                                      reporting_cutoff=args.reporting_cutoff,
+                                      filter_id=args.filter_id,
+                                      skip_uploaded=not args.force,
+                                      validate=not args.skip_validation)
+
+    sys.stdout.write(json.dumps(report_summaries, indent=4))
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
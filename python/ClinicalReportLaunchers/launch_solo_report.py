@@ -21,23 +21,16 @@ import argparse
 import csv
 import json
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 
 MANIFEST_FILENAME = 'manifest.csv'
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.uploads import put_genome
+from client.vcf import VcfError
 
 
 # A map between the row numbers and fields from the patient information csv
@@ -82,7 +75,7 @@ def add_fields_to_cr(cr_id, patient_fields):
     sys.stdout.write("Adding custom patient fields to report...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.post(url, auth=auth, data=url_payload)
+    result = client.post(url, data=url_payload)
     return result.json()
 
 
@@ -101,12 +94,14 @@ def launch_solo_report(proband_genome_id, proband_sex,
                    'accession_id': accession_id}
 
     sys.stdout.write("Launching solo report...\n")
-    result = requests.post(url, auth=auth, data=json.dumps(url_payload))
+    result = client.post(url, data=json.dumps(url_payload),
+                         recover=client.report_guard(accession_id))
 
     return result.json()
 
 
-def upload_genome(project_id, genome_filename, genome_label, genome_sex, genome_external_id, genome_format):
+def upload_genome(project_id, genome_filename, genome_label, genome_sex, genome_external_id, genome_format,
+                  validate=True):
     """Upload a genome from a given folder to a specified project
     """
     # Construct url and request
@@ -118,12 +113,16 @@ def upload_genome(project_id, genome_filename, genome_label, genome_sex, genome_
                'format': genome_format}
 
     # Upload genome
-    with open(genome_filename, 'rb') as file_handle:
+    # Unless validate is False, check the genome as it is sent, stopping the
+    # upload if it is invalid
+    try:
         # Post request and store newly uploaded genome's information
-        result = requests.put(url, data=file_handle, params=payload, auth=auth)
-        print result
-        genome_id = result.json()["genome_id"]
-        return genome_id
+        result = put_genome(url, genome_filename, validate=validate, params=payload,
+                            recover=client.upload_guard(project_id, genome_label, genome_external_id))
+    except VcfError as e:
+        sys.exit(str(e))
+    genome_id = result.json()["genome_id"]
+    return genome_id
 
 
 def main():
@@ -140,6 +139,8 @@ def main():
     parser.add_argument('--score_indels', metavar='score_indels', type=bool, default=False)
     parser.add_argument('--reporting_cutoff', metavar='reporting_cutoff', type=int)
     parser.add_argument('--patient_info', metavar='patient_info', type=str)
+    parser.add_argument('--skip_validation', action='store_true',
+                        help='do not check the vcf while uploading it')
 
     args = parser.parse_args()
 
@@ -159,7 +160,8 @@ def main():
                                         genome_label,
                                         genome_sex,
                                         genome_external_id,
-                                        genome_format)
+                                        genome_format,
+                                        validate=not args.skip_validation)
     # Confirm uploaded genomes' data
     sys.stdout.write("Uploaded 1 genome:\n")
     sys.stdout.write("proband_genome_id: {}\n"
@@ -3,23 +3,14 @@ Usage: python patch_report_variant.py 1542 --status "FAILED_CONFIRMATION"
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def patch_cr_variant(cr_id, report_variant_id, patch_values):
@@ -38,7 +29,7 @@ def patch_cr_variant(cr_id, report_variant_id, patch_values):
                               for attribute in patch_attributes])
     headers = {"content-type": "application/json-patch+json"}
     sys.stdout.flush()
-    result = requests.patch(url, auth=auth, json=url_payload, headers=headers)
+    result = client.patch(url, json=url_payload, headers=headers)
     return result
 
 
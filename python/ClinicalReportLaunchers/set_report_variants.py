@@ -1,5 +1,6 @@
 """Set a report's variants.
 Usage: python set_report_variants.py 1542 --format vcf vcf_variant.vcf
+       python set_report_variants.py 1542 --format vcf --compress vcf_variant.vcf
 Example vcf_variant.vcf file:
 ##fileformat=VCFv4.2
 ##fileDate=2015-08-27
@@ -15,36 +16,34 @@ chr7	87160618	rs2032582	A	C	1484.13	CONFIRMED	.	GT:GQ:AD	1/1:5000.00:.,.
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 import argparse
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.compression import GzipReader
 
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
 
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
-
-
-def set_cr_variants(cr_id, file_name, _format):
+def set_cr_variants(cr_id, file_name, _format, compress=False):
     """Use the Omicia API to set report variants' statuses to 'FAIL' or 'CONFIRMED'
+    If compress is True, a plain vcf is gzipped while it is sent.
     """
+    compress = compress and _format == 'vcf'
+    if compress:
+        _format = 'vcf.gz'
+
     #Construct request
     url = "{}/reports/{}/variants?format={}"
     url = url.format(OMICIA_API_URL, cr_id, _format)
 
     sys.stdout.write("Uploading vcf file...\n")
     with open(file_name, 'rb') as file_handle:
+        body = GzipReader(file_handle) if compress else file_handle
         #Post request
-        result = requests.put(url, auth=auth, data=file_handle)
+        result = client.put(url, data=body)
         return result.json()
 
 def main():
@@ -54,14 +53,17 @@ def main():
     parser.add_argument('cr_id', metavar='clinical_report_id', type=int)
     parser.add_argument('file_name', metavar='file_name', type=str)
     parser.add_argument('--format', metavar='_format', type=str, choices=['vcf', 'vcf.gz', 'vcf.bz2'], default='vcf')
+    parser.add_argument('--compress', action='store_true',
+                        help='gzip a plain vcf while uploading it')
 
     args = parser.parse_args()
 
     cr_id = args.cr_id
     file_name = args.file_name
     _format = args.format
+    compress = args.compress
 
-    result_json = set_cr_variants(cr_id, file_name, _format)
+    result_json = set_cr_variants(cr_id, file_name, _format, compress=compress)
     sys.stdout.write(json.dumps(result_json))
 
 if __name__ == "__main__":
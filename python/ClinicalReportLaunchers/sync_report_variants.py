@@ -0,0 +1,153 @@
+"""Keep a local snapshot of a clinical report's variants, printing what changed.
+Usages: python sync_report_variants.py 1542
+        python sync_report_variants.py 1542 --interval 60 >> changes.ndjson
+        python sync_report_variants.py 1542 --status "REVIEWED,CONFIRMED" --window 20000000
+
+The report's variants are requested one chromosome (or --window bases) at a
+time. A shard that the server reports as unchanged, by answering the ETag or
+Last-Modified of its last response with 304 Not Modified, is not downloaded
+again. That is the only way a sync saves transfer: the variants API has no
+filter for variants modified since a given time, so from a server that does
+not answer conditional requests every shard is downloaded in full on every
+sync. A shard whose body is the same as last time is then only spared the
+comparison. The variants of the other shards are compared with the
+snapshot, and each variant that was added, changed or removed is printed as
+a line of JSON:
+
+    {"change": "changed", "id": 12, "fields": {"status": ["REVIEWED", "CONFIRMED"]}, ...}
+
+The first sync prints every variant as added. A summary on stderr says how
+many shards were downloaded, and warns when none could be revalidated. The
+snapshot is kept in ~/.cache/omicia_api_sync unless --snapshot is given.
+"""
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from client.jsonstream import write_ndjson
+from client.shards import DEFAULT_WORKERS, genome_shards, map_shards
+from client.snapshots import DEFAULT_SNAPSHOT_DIR, VariantSnapshot, combine_changes
+from client.variantstore import VariantStore
+from get_report_variants import get_cr_variants, variant_position
+
+
+def fetch_shard(shard, snapshot, cr_id, statuses, to_reports, alt, extended=False):
+    """Get a shard of a report's variants. Returns None if the server
+    answered 304 Not Modified, so nothing was downloaded; otherwise its
+    variants, response headers and body digest, with None for the variants
+    if the body is the same as in the snapshot.
+    """
+    response = get_cr_variants(cr_id, statuses, to_reports, 'JSON', shard.chrom, shard.start,
+                               shard.end, alt, extended=extended,
+                               headers=snapshot.validators(shard))
+    if response.status_code == 304:
+        return None
+    if response.status_code != 200:
+        raise IOError('HTTP {}: {}'.format(response.status_code, response.text[:200]))
+    digest = hashlib.sha1(response.content).hexdigest()
+    if digest == snapshot.digest(shard):
+        return None, response.headers, digest
+    result = response.json()
+    if not isinstance(result, dict) or not isinstance(result.get('objects'), list):
+        raise ValueError('unexpected response: {}'.format(result))
+    variants = [variant for variant in result['objects']
+                if shard.contains(variant_position(variant))]
+    return variants, response.headers, digest
+
+
+def sync_cr_variants(cr_id, statuses, to_reports, alt, snapshot, shards, extended=False,
+                     workers=DEFAULT_WORKERS):
+    """Bring the snapshot up to date with the report, fetching up to workers
+    shards at a time, and return the changes, the number of shards that had
+    changed and the number of shards that were downloaded.
+    """
+    def fetch(shard):
+        return fetch_shard(shard, snapshot, cr_id, statuses, to_reports, alt, extended=extended)
+
+    results = map_shards(shards, fetch, workers)
+    changes = snapshot.retain(shards)
+    changed_shards = 0
+    downloaded = 0
+    for shard, result in zip(shards, results):
+        if result is None:
+            continue
+        downloaded += 1
+        if result[0] is not None:
+            changed_shards += 1
+            changes.extend(snapshot.apply(shard, *result))
+    if changed_shards or changes:
+        snapshot.save()
+    return combine_changes(changes), changed_shards, downloaded
+
+
+def main():
+    """Main function. Sync a report's variants once, or every --interval seconds.
+    """
+    parser = argparse.ArgumentParser(description='Print the changes to a clinical report\'s variants.')
+    parser.add_argument('cr_id', metavar='clinical_report_id', type=int)
+    parser.add_argument('--extended', metavar='extended', type=str, choices=['true'])
+    parser.add_argument('--status', metavar='status', type=str)
+    parser.add_argument('--to_report', metavar='to_report', type=str)
+    parser.add_argument('--chrom', metavar='chr', type=str, choices=['1', '2', '3', '4', '5', '6',
+                                                                     '7', '8', '9', '10', '11', '12',
+                                                                     '13', '14', '15', '16', '17',
+                                                                     '18', '19', '20', '21', '22',
+                                                                     'X', 'Y', 'M'])
+    parser.add_argument('--alt', metavar='alt', type=str, choices=['A', 'T', 'C', 'G'])
+    parser.add_argument('--window', metavar='window', type=int,
+                        help='request windows of this many bases instead of whole chromosomes')
+    parser.add_argument('--workers', metavar='workers', type=int, default=DEFAULT_WORKERS,
+                        help='number of shards to request at once')
+    parser.add_argument('--snapshot', metavar='snapshot',
+                        help='file keeping the variants as last synced')
+    parser.add_argument('--interval', metavar='interval', type=float,
+                        help='sync again every this many seconds, until interrupted')
+    args = parser.parse_args()
+
+    statuses = args.status.split(",") if args.status else None
+    to_reports = args.to_report.split(",") if args.to_report else None
+    extended = args.extended == 'true'
+
+    path = args.snapshot
+    if path is None:
+        query = VariantStore.query_key([('status', statuses), ('to_report', to_reports),
+                                        ('chrom', args.chrom), ('alt', args.alt),
+                                        ('extended', extended)])
+        path = os.path.join(DEFAULT_SNAPSHOT_DIR, '{}-{}.json'.format(args.cr_id, query))
+    snapshot = VariantSnapshot(path)
+    shards = genome_shards(args.window, [args.chrom] if args.chrom else None)
+
+    try:
+        while True:
+            try:
+                changes, changed_shards, downloaded = sync_cr_variants(args.cr_id, statuses, to_reports,
+                                                           args.alt, snapshot, shards,
+                                                           extended=extended,
+                                                           workers=args.workers)
+            except (IOError, ValueError) as e:
+                if not args.interval:
+                    sys.exit('Syncing variants failed for {}'.format(e))
+                sys.stderr.write('Syncing variants failed for {}\n'.format(e))
+            else:
+                write_ndjson(changes, sys.stdout)
+                sys.stdout.flush()
+                sys.stderr.write('{} of {} shards changed, {} variant changes, '
+                                 '{} shards downloaded\n'.format(
+                                     changed_shards, len(shards), len(changes), downloaded))
+                if downloaded and not any(snapshot.validators(shard) for shard in shards):
+                    sys.stderr.write('The server sent no ETag or Last-Modified, so every '
+                                     'shard is downloaded in full on each sync\n')
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,22 +3,15 @@
 
 import os
 import json
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import argparse
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.uploads import put_genome
+from client.vcf import VcfError
 
 
 def add_genome_to_clinical_report(clinical_report_id,
@@ -36,11 +29,12 @@ def add_genome_to_clinical_report(clinical_report_id,
     sys.stdout.write("Adding genome(s) to report...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.put(url, auth=auth, data=json.dumps(url_payload))
+    result = client.put(url, data=json.dumps(url_payload))
     return result.json()
 
 
-def upload_genome_to_project(project_id, label, sex, file_format, file_name, external_id=""):
+def upload_genome_to_project(project_id, label, sex, file_format, file_name, external_id="",
+                             validate=True):
     """Use the Omicia API to add a genome, in vcf format, to a project.
     Returns the newly uploaded genome's id.
     """
@@ -51,10 +45,15 @@ def upload_genome_to_project(project_id, label, sex, file_format, file_name, ext
     url = url.format(OMICIA_API_URL, project_id, label, sex, external_id, file_format)
 
     sys.stdout.write("Uploading genome...\n")
-    with open(file_name, 'rb') as file_handle:
+    # Unless validate is False, check the genome as it is sent, stopping the
+    # upload if it is invalid
+    try:
         #Post request and return id of newly uploaded genome
-        result = requests.put(url, auth=auth, data=file_handle, verify=False)
-        return result.json()
+        result = put_genome(url, file_name, validate=validate, verify=False,
+                            recover=client.upload_guard(project_id, label, external_id))
+    except VcfError as e:
+        sys.exit(str(e))
+    return result.json()
 
 
 def main():
@@ -68,6 +67,8 @@ def main():
     parser.add_argument('file_format', metavar='file_format', type=str, choices=['vcf', 'vcf.gz', 'vcf.bz2'])
     parser.add_argument('file_name', metavar='file_name', type=str)
     parser.add_argument('--genome_external_id', metavar='genome_external_id', type=str)
+    parser.add_argument('--skip_validation', action='store_true',
+                        help='do not check the vcf while uploading it')
     args = parser.parse_args()
 
     cr_id = args.clinical_report_id
@@ -83,7 +84,8 @@ def main():
                                            sex,
                                            file_format,
                                            file_name,
-                                           genome_external_id)
+                                           genome_external_id,
+                                           validate=not args.skip_validation)
 
     try:
         genome_id = genome_json["genome_id"]
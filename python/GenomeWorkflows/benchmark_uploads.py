@@ -0,0 +1,201 @@
+"""Measure how fast genomes upload with each upload strategy, against a
+local stand-in for the API that can be given the bandwidth, latency and
+error rate of a real uplink.
+
+Each strategy uploads the same folder of VCFs (or synthetic VCFs, if no
+folder is given) in a child process of its own, and is reported with its
+throughput in MB/s of VCF uploaded, the MB that actually crossed the wire,
+the CPU seconds it used per GB of VCF and its peak resident memory. A
+strategy is only ok if its child exited cleanly and the server created one
+genome per file, since the folder uploader reports a failed file in its
+output and carries on:
+
+    serial      upload_genomes_folder.py, one file at a time
+    parallel    upload_genomes_folder.py with --workers
+    compressed  upload_genomes_folder.py with --workers and --compress
+    chunked     upload_genome.py --resumable, one file at a time
+
+Example, for a 20 MB/s uplink with 50 ms of latency and 1% errors:
+
+    python benchmark_uploads.py --files 8 --size 64 --bandwidth 20 \
+        --latency 0.05 --error_rate 0.01
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import simplejson as json
+
+STRATEGIES = ('serial', 'parallel', 'compressed', 'chunked')
+
+PROJECT_ID = 1
+
+# One synthetic VCF record, repeated with increasing positions
+RECORD = 'chr1\t{}\t.\tA\tG\t50\tPASS\tDP=32;AF=0.5\tGT:AD:DP\t0/1:16,16:32\n'
+
+HEADER = ('##fileformat=VCFv4.2\n'
+          '##contig=<ID=chr1>\n'
+          '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE\n')
+
+
+def make_genomes(folder, files, size_mb):
+    """Write files synthetic VCFs of about size_mb MB each to folder.
+    """
+    for i in range(files):
+        with open(os.path.join(folder, 'sample{}.vcf'.format(i)), 'w') as f:
+            f.write(HEADER)
+            position = 1
+            written = 0
+            while written < size_mb * 1024 * 1024:
+                lines = ''.join(RECORD.format(position + n) for n in range(1000))
+                f.write(lines)
+                written += len(lines)
+                position += 1000
+
+
+def run_strategy(strategy, folder, workers):
+    """Upload the folder with one strategy. Runs in the child process.
+    """
+    import upload_genome
+    import upload_genomes_folder
+
+    if strategy == 'chunked':
+        for file_name in sorted(os.listdir(folder)):
+            upload_genome.upload_genome_to_project(
+                PROJECT_ID, file_name, 'unspecified', os.path.join(folder, file_name),
+                None, resumable_upload=True, validate=False)
+    else:
+        upload_genomes_folder.upload_genomes_to_project(
+            PROJECT_ID, folder,
+            workers=1 if strategy == 'serial' else workers,
+            skip_uploaded=False,
+            compress=strategy == 'compressed')
+
+
+def measure(strategy, folder, workers, env, server):
+    """Run one strategy in a child process and return its measurements.
+    """
+    names = os.listdir(folder)
+    total_bytes = sum(os.path.getsize(os.path.join(folder, name)) for name in names)
+    before = dict(server.stats)
+    command = [sys.executable, os.path.abspath(__file__), '--run', strategy,
+               '--folder', folder, '--workers', str(workers)]
+    started = time.time()
+    with open(os.devnull, 'w') as devnull:
+        child = subprocess.Popen(command, env=env, stdout=devnull, stderr=devnull)
+        _, status, usage = os.wait4(child.pid, 0)
+    elapsed = time.time() - started
+    gigabytes = total_bytes / (1024.0 ** 3)
+    genomes = server.stats['genomes'] - before['genomes']
+    return {'strategy': strategy,
+            'ok': status == 0 and genomes == len(names),
+            'genomes': genomes,
+            'seconds': round(elapsed, 2),
+            'mb': round(total_bytes / (1024.0 ** 2), 1),
+            'mb_per_second': round(total_bytes / (1024.0 ** 2) / elapsed, 2),
+            'wire_mb': round((server.stats['bytes_received'] - before['bytes_received'])
+                             / (1024.0 ** 2), 1),
+            'cpu_seconds_per_gb': round((usage.ru_utime + usage.ru_stime) / gigabytes, 1),
+            # ru_maxrss is in KB on Linux
+            'peak_rss_mb': round(usage.ru_maxrss / 1024.0, 1),
+            'server_errors': server.stats['errors'] - before['errors'],
+            'dropped': server.stats['dropped'] - before['dropped']}
+
+
+def benchmark(folder, strategies, workers, bandwidth=None, latency=0.0,
+              error_rate=0.0, drop_rate=0.0):
+    """Start a local upload server and measure each strategy against it.
+    """
+    # Imported on its own, since the client package wants API credentials
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 os.pardir, 'client'))
+    from localserver import UploadServer
+
+    server = UploadServer(('127.0.0.1', 0), None, drop_rate=drop_rate,
+                          error_rate=error_rate,
+                          bandwidth=bandwidth * 1024 * 1024 if bandwidth else None,
+                          latency=latency, quiet=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    state_dir = tempfile.mkdtemp(prefix='omicia_benchmark-')
+    env = dict(os.environ,
+               OMICIA_API_URL='http://127.0.0.1:{}'.format(server.server_address[1]),
+               OMICIA_API_LOGIN=os.environ.get('OMICIA_API_LOGIN', 'benchmark'),
+               OMICIA_API_PASSWORD=os.environ.get('OMICIA_API_PASSWORD', 'benchmark'),
+               OMICIA_API_LEDGER=os.path.join(state_dir, 'ledger.sqlite'),
+               OMICIA_API_CACHE_DIR=os.path.join(state_dir, 'cache'),
+               HOME=state_dir)
+    try:
+        return [measure(strategy, folder, workers, env, server)
+                for strategy in strategies]
+    finally:
+        server.shutdown()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+def main():
+    """Main function. Benchmark the upload strategies and print a table of
+    the results, or JSON with --json.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark genome upload strategies.')
+    parser.add_argument('--folder', metavar='folder',
+                        help='folder of VCFs to upload (synthetic VCFs by default)')
+    parser.add_argument('--files', metavar='files', type=int, default=4,
+                        help='number of synthetic VCFs')
+    parser.add_argument('--size', metavar='size', type=float, default=32,
+                        help='size of each synthetic VCF in MB')
+    parser.add_argument('--strategies', metavar='strategies', default=','.join(STRATEGIES),
+                        help='comma separated strategies to run')
+    parser.add_argument('--workers', metavar='workers', type=int, default=4,
+                        help='simultaneous uploads for the parallel strategies')
+    parser.add_argument('--bandwidth', metavar='bandwidth', type=float,
+                        help='total upload bandwidth in MB/s (unlimited by default)')
+    parser.add_argument('--latency', metavar='latency', type=float, default=0.0,
+                        help='seconds the server waits before each response')
+    parser.add_argument('--error_rate', metavar='error_rate', type=float, default=0.0,
+                        help='fraction of uploads answered with 502 Bad Gateway')
+    parser.add_argument('--drop_rate', metavar='drop_rate', type=float, default=0.0,
+                        help='fraction of requests whose connection is dropped')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--run', metavar='strategy', choices=STRATEGIES,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_strategy(args.run, args.folder, args.workers)
+        return
+
+    folder = args.folder
+    if folder is None:
+        folder = tempfile.mkdtemp(prefix='omicia_genomes-')
+        make_genomes(folder, args.files, args.size)
+    try:
+        results = benchmark(folder, args.strategies.split(','), args.workers,
+                            bandwidth=args.bandwidth, latency=args.latency,
+                            error_rate=args.error_rate, drop_rate=args.drop_rate)
+    finally:
+        if args.folder is None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=4))
+        sys.stdout.write("\n")
+        return
+    columns = ('strategy', 'ok', 'genomes', 'seconds', 'mb', 'mb_per_second', 'wire_mb',
+               'cpu_seconds_per_gb', 'peak_rss_mb', 'server_errors', 'dropped')
+    widths = [max(len(column), 7) + 2 for column in columns]
+    sys.stdout.write(''.join(column.rjust(width) for column, width in zip(columns, widths)) + "\n")
+    for result in results:
+        sys.stdout.write(''.join(str(result[column]).rjust(width)
+                                 for column, width in zip(columns, widths)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
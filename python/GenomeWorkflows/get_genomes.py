@@ -3,22 +3,13 @@
 
 import argparse
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import simplejson as json
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def get_genomes(project_id):
@@ -29,7 +20,7 @@ def get_genomes(project_id):
     url = "{}/projects/{}/genomes".format(OMICIA_API_URL, project_id)
 
     # Get request and return json object of genomes
-    result = requests.get(url, auth=auth, verify=False)
+    result = client.get(url, verify=False)
     return result.json()
 
 
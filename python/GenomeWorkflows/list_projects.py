@@ -2,22 +2,13 @@
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def list_projects():
@@ -28,7 +19,7 @@ def list_projects():
     url = "{}/projects/"
     url = url.format(OMICIA_API_URL)
 
-    result = requests.get(url, auth=auth)
+    result = client.get(url, cache=True)
     return result.json()
 
 
@@ -2,27 +2,27 @@
 """
 import argparse
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import simplejson as json
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL, resumable
+from client.compression import is_compressed
+from client.uploads import put_genome
+from client.vcf import VcfError, validate_file
 
 
 def upload_genome_to_project(project_id, label, sex, file_name, bam_file,
-                             external_id=None):
+                             external_id=None, compress=False, resumable_upload=False,
+                             validate=True):
     """Use the Omicia API to add a genome, in vcf format, to a project.
+    If compress is True, an uncompressed vcf is bgzipped while it is sent.
+    If resumable_upload is True, the file is sent in chunks and an
+    interrupted upload picks up where it left off when run again.
+    Unless validate is False, the vcf is checked as it is sent and the
+    upload stops with a VcfError as soon as it is found to be invalid.
     Returns the newly uploaded genome's id.
     """
     # Construct request
@@ -33,12 +33,19 @@ def upload_genome_to_project(project_id, label, sex, file_name, bam_file,
     url = url.format(OMICIA_API_URL, project_id, label, sex, external_id)
     if bam_file is not None:
         url = "{}&bam_file={}".format(url, bam_file)
-
-    with open(file_name, 'rb') as file_handle:
-        # Post request and return id of newly uploaded genome
-        result = requests.put(url, auth=auth, data=file_handle, verify=False)
+    if resumable_upload:
+        if compress and not is_compressed(file_name):
+            raise ValueError('A resumable upload cannot be compressed while it is sent')
+        if validate:
+            # Chunks may be resent out of order, so check the whole file first
+            validate_file(file_name)
+        result = resumable.upload(url, file_name, verify=False)
         return result.json()
 
+    # Post request and return id of newly uploaded genome
+    result = put_genome(url, file_name, compress=compress, validate=validate, verify=False,
+                        recover=client.upload_guard(project_id, label, external_id))
+    return result.json()
 
 def main():
     """Main function. Upload a specified VCF file to a specified project.
@@ -50,7 +57,15 @@ def main():
     parser.add_argument('file_name', metavar='file_name')
     parser.add_argument('--external_id', metavar='external_id')
     parser.add_argument('--bam_file', metavar='bam_file')
+    parser.add_argument('--compress', action='store_true',
+                        help='bgzip an uncompressed vcf while uploading it')
+    parser.add_argument('--resumable', action='store_true',
+                        help='upload in chunks, resuming an interrupted upload')
+    parser.add_argument('--skip_validation', action='store_true',
+                        help='do not check the vcf while uploading it')
     args = parser.parse_args()
+    if args.resumable and args.compress and not is_compressed(args.file_name):
+        parser.error('--resumable cannot be combined with --compress')
 
     project_id = args.project_id
     label = args.label
@@ -58,9 +73,15 @@ def main():
     file_name = args.file_name
     external_id = args.external_id
     bam_file = args.bam_file
+    compress = args.compress
 
-    json_response = upload_genome_to_project(project_id, label, sex, file_name, bam_file,
-                                             external_id=external_id)
+    try:
+        json_response = upload_genome_to_project(project_id, label, sex, file_name, bam_file,
+                                                 external_id=external_id, compress=compress,
+                                                 resumable_upload=args.resumable,
+                                                 validate=not args.skip_validation)
+    except VcfError as e:
+        sys.exit(str(e))
     try:
         sys.stdout.write(json.dumps(json_response, indent=4))
     except KeyError:
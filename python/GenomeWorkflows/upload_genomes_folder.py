@@ -2,22 +2,24 @@
 """
 import argparse
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import simplejson as json
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.ledger import UploadLedger
+from client.uploads import put_genome, upload_all
 
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
 
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+def genome_file_info(file_name):
+    """Return the genome information to upload a file in the folder with.
+    """
+    return {"name": file_name,
+            "assembly_version": "hg19",
+            "genome_sex": "unspecified",
+            "genome_label": file_name[0:100]}
 
 
 def get_genome_files(folder):
@@ -25,34 +27,56 @@ def get_genome_files(folder):
     """
     genome_files = []
     for file_name in os.listdir(folder):
-        genome_info = {"name": file_name,
-                       "assembly_version": "hg19",
-                       "genome_sex": "unspecified",
-                       "genome_label": file_name[0:100]}
         if 'vcf' in file_name:
-            genome_files.append(genome_info)
+            genome_files.append(genome_file_info(file_name))
     return genome_files
 
 
-def upload_genomes_to_project(project_id, folder):
+def upload_genome_file(project_id, folder, genome_file, progress=None,
+                       compress=False):
+    """Upload one genome file from the folder and return the new genome's
+    JSON information. If compress is True, an uncompressed vcf is bgzipped
+    while it is sent.
+    """
+    url = "{}/projects/{}/genomes?genome_label={}&genome_sex={}&external_id=&assembly_version=hg19"
+    url = url.format(OMICIA_API_URL,
+                     project_id,
+                     genome_file["genome_label"],
+                     genome_file["genome_sex"])
+    file_name = os.path.join(folder, genome_file["name"])
+    # Post request and store id of newly uploaded genome
+    result = put_genome(url, file_name, progress=progress, compress=compress, verify=False,
+                        recover=client.upload_guard(project_id, genome_file["genome_label"]))
+    return result.json()
+
+
+def upload_genomes_to_project(project_id, folder, workers=1, skip_uploaded=True,
+                              compress=False, file_names=None, bandwidth=None):
     """upload all of the genomes in the given folder to the project with
-    the given project id
+    the given project id, with up to workers uploads running at once.
+    Unless skip_uploaded is False, genomes whose contents were already
+    uploaded to the project are not sent again. If compress is True,
+    uncompressed vcfs are bgzipped while they are sent. If file_names is
+    given, only those files are uploaded, in that order. The largest
+    files are started first, and if bandwidth is given the uploads together
+    send no more than that many bytes per second.
     """
-    # List where returned genome JSON information will be stored
-    genome_json_objects = []
+    if file_names is None:
+        genome_files = get_genome_files(folder)
+    else:
+        genome_files = [genome_file_info(file_name) for file_name in file_names]
+    jobs = [(os.path.join(folder, genome_file["name"]), genome_file)
+            for genome_file in genome_files]
 
-    for genome_file in get_genome_files(folder):
-        url = "{}/projects/{}/genomes?genome_label={}&genome_sex={}&external_id=&assembly_version=hg19"
-        url = url.format(OMICIA_API_URL,
-                         project_id,
-                         genome_file["genome_label"],
-                         genome_file["genome_sex"])
+    def upload(genome_file, progress):
+        return upload_genome_file(project_id, folder, genome_file, progress,
+                                  compress=compress)
 
-        with open(folder + "/" + genome_file["name"], 'rb') as file_handle:
-            # Post request and store id of newly uploaded genome
-            result = requests.put(url, auth=auth, data=file_handle, verify=False)
-            genome_json_objects.append(result.json())
-    return genome_json_objects
+    # Returned genome JSON information, in the same order as the files
+    ledger = UploadLedger() if skip_uploaded else None
+    return upload_all(jobs, upload, workers=workers,
+                      ledger=ledger, project_id=project_id,
+                      largest_first=True, bandwidth=bandwidth)
 
 
 def main():
@@ -61,12 +85,24 @@ def main():
     parser = argparse.ArgumentParser(description='Upload a folder of genomes.')
     parser.add_argument('project_id', metavar='project_id')
     parser.add_argument('folder', metavar='folder')
+    parser.add_argument('--workers', metavar='workers', type=int, default=1,
+                        help='number of genomes to upload at once')
+    parser.add_argument('--force', action='store_true',
+                        help='upload genomes even if they were uploaded before')
+    parser.add_argument('--compress', action='store_true',
+                        help='bgzip uncompressed vcfs while uploading them')
+    parser.add_argument('--bandwidth', metavar='bandwidth', type=float,
+                        help='total upload bandwidth to use, in MB/s (unlimited by default)')
     args = parser.parse_args()
 
     project_id = args.project_id
     folder = args.folder
+    bandwidth = args.bandwidth * 1024 * 1024 if args.bandwidth else None
 
-    genome_objects = upload_genomes_to_project(project_id, folder)
+    genome_objects = upload_genomes_to_project(project_id, folder, args.workers,
+                                               skip_uploaded=not args.force,
+                                               compress=args.compress,
+                                               bandwidth=bandwidth)
 
     sys.stdout.write(json.dumps(genome_objects, indent=4))
 
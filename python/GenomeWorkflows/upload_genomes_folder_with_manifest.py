@@ -18,22 +18,16 @@ TR4094_exome.vcf,abc5,59,male
 import argparse
 import csv
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
+from collections import OrderedDict
 import simplejson as json
 
-# Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
+from client.ledger import UploadLedger
+from client.uploads import put_genome, upload_all
 
 
 def get_manifest_info(folder):
@@ -46,7 +40,7 @@ def get_manifest_info(folder):
     if 'manifest.csv' not in os.listdir(folder):
         sys.exit("No manifest.csv file in folder provided.")
 
-    manifest_info = {}
+    manifest_info = OrderedDict()
     with open(folder + '/manifest.csv') as f:
         reader = csv.reader(f)
         next(reader, None)  # Skip the header
@@ -58,30 +52,52 @@ def get_manifest_info(folder):
     return manifest_info
 
 
-def upload_genomes_to_project(project_id, folder):
+def upload_genome_file(project_id, folder, genome_file_name, genome_attrs,
+                       progress=None, compress=False):
+    """Upload one genome file described by the manifest and return the new
+    genome's information. If compress is True, an uncompressed vcf is
+    bgzipped while it is sent.
+    """
+    url = "{}/projects/{}/genomes?genome_label={}&genome_sex={}&external_id={}&assembly_version=hg19"
+    url = url.format(OMICIA_API_URL,
+                     project_id,
+                     genome_attrs["genome_label"],
+                     genome_attrs["genome_sex"],
+                     genome_attrs["external_id"])
+    file_name = os.path.join(folder, genome_file_name)
+    # Post request and store newly uploaded genome's information
+    result = put_genome(url, file_name, progress=progress, compress=compress, verify=False,
+                        recover=client.upload_guard(project_id, genome_attrs["genome_label"],
+                                                    genome_attrs["external_id"]))
+    return result.json()
+
+
+def upload_genomes_to_project(project_id, folder, workers=1, skip_uploaded=True,
+                              compress=False, bandwidth=None):
     """upload all of the genomes in the given folder to the project with
-    the given project id
+    the given project id, with up to workers uploads running at once.
+    Unless skip_uploaded is False, genomes whose contents were already
+    uploaded to the project are not sent again. If compress is True,
+    uncompressed vcfs are bgzipped while they are sent. The largest files
+    are started first, and if bandwidth is given the uploads together send
+    no more than that many bytes per second.
     """
     # Assuming there is a manifest file, generate an object containing its info
     manifest_info = get_manifest_info(folder)
 
-    # List where returned genome JSON information will be stored
-    genome_json_objects = []
-
-    # Upload each genome to the desired project
-    for genome_file_name in manifest_info.keys():
-        genome_attrs = manifest_info[genome_file_name]
-        url = "{}/projects/{}/genomes?genome_label={}&genome_sex={}&external_id={}&assembly_version=hg19"
-        url = url.format(OMICIA_API_URL,
-                         project_id,
-                         genome_attrs["genome_label"],
-                         genome_attrs["genome_sex"],
-                         genome_attrs["external_id"])
-
-        with open(folder + "/" + genome_file_name, 'rb') as file_handle:
-            # Post request and store newly uploaded genome's information
-            result = requests.put(url, auth=auth, data=file_handle, verify=False)
-            genome_json_objects.append(result.json())
+    jobs = [(os.path.join(folder, genome_file_name), genome_file_name)
+            for genome_file_name in manifest_info]
+
+    def upload(genome_file_name, progress):
+        return upload_genome_file(project_id, folder, genome_file_name,
+                                  manifest_info[genome_file_name], progress,
+                                  compress=compress)
+
+    # Returned genome JSON information, in manifest order
+    ledger = UploadLedger() if skip_uploaded else None
+    genome_json_objects = upload_all(jobs, upload, workers=workers,
+                                     ledger=ledger, project_id=project_id,
+                                     largest_first=True, bandwidth=bandwidth)
     sys.stdout.write("\n")
     return genome_json_objects
 
@@ -93,12 +109,24 @@ def main():
     parser = argparse.ArgumentParser(description='Upload a folder of genomes.')
     parser.add_argument('project_id', metavar='project_id')
     parser.add_argument('folder', metavar='folder')
+    parser.add_argument('--workers', metavar='workers', type=int, default=1,
+                        help='number of genomes to upload at once')
+    parser.add_argument('--force', action='store_true',
+                        help='upload genomes even if they were uploaded before')
+    parser.add_argument('--compress', action='store_true',
+                        help='bgzip uncompressed vcfs while uploading them')
+    parser.add_argument('--bandwidth', metavar='bandwidth', type=float,
+                        help='total upload bandwidth to use, in MB/s (unlimited by default)')
     args = parser.parse_args()
 
     project_id = args.project_id
     folder = args.folder
+    bandwidth = args.bandwidth * 1024 * 1024 if args.bandwidth else None
 
-    genome_objects = upload_genomes_to_project(project_id, folder)
+    genome_objects = upload_genomes_to_project(project_id, folder, args.workers,
+                                               skip_uploaded=not args.force,
+                                               compress=args.compress,
+                                               bandwidth=bandwidth)
 
     # Output genome labels, ids, external ids, and sizes
     sys.stdout.write(json.dumps(genome_objects, indent=4))
@@ -0,0 +1,171 @@
+"""Watch a folder and upload each genome dropped into it to a project.
+
+Runs until interrupted. A .vcf, .vcf.gz or .vcf.bz2 file is uploaded once
+it has stopped changing for --settle seconds. Files that become ready close
+together are uploaded as one batch, --workers at a time, by
+upload_genomes_folder.upload_genomes_to_project. A batch starts when
+--batch_size files are ready or the first of them has waited --batch_wait
+seconds.
+
+The files that have been uploaded are recorded (in ~/.cache/omicia_api_watch
+unless --state is given), so that restarting the watcher does not upload
+them again. A failed upload is tried again after --retry_after seconds.
+One line is printed for each file as its upload finishes:
+
+    sample1.vcf.gz  genome 1234
+    sample2.vcf     failed: ...
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from client.uploads import genome_id
+from client.watch import FolderWatcher, ProcessedFiles
+import upload_genomes_folder
+
+GENOME_SUFFIXES = ('.vcf', '.vcf.gz', '.vcf.bz2')
+
+# Longest time to wait for changes before looking at the folder again
+POLL_INTERVAL = 5
+
+
+def is_genome(file_name):
+    return file_name.endswith(GENOME_SUFFIXES)
+
+
+class FolderUploader(object):
+    """Upload the stable genomes of a folder in batches.
+    """
+
+    def __init__(self, project_id, folder, workers=4, settle=60, batch_size=16,
+                 batch_wait=30, retry_after=300, rescan=300, skip_uploaded=True,
+                 compress=False, bandwidth=None, state=None, out=sys.stdout):
+        self.project_id = project_id
+        self.folder = folder
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.retry_after = retry_after
+        self.skip_uploaded = skip_uploaded
+        self.compress = compress
+        self.bandwidth = bandwidth
+        self.out = out
+        self.watcher = FolderWatcher(folder, accept=is_genome, settle=settle,
+                                     rescan=rescan)
+        self.processed = ProcessedFiles(folder, project_id, state)
+        self.stopping = False
+        # File name -> time its last upload failed
+        self._failed = {}
+        # When the oldest file waiting for a batch became ready
+        self._waiting_since = None
+
+    def ready(self):
+        """Return the files that are stable and still to be uploaded.
+        """
+        now = time.time()
+        ready = []
+        for name in self.watcher.stable():
+            if self.processed.done(name, self.watcher.fingerprint(name)):
+                self.watcher.forget(name)
+            elif now - self._failed.get(name, 0) >= self.retry_after:
+                ready.append(name)
+        return ready
+
+    def upload(self, batch):
+        fingerprints = dict((name, self.watcher.fingerprint(name)) for name in batch)
+        results = upload_genomes_folder.upload_genomes_to_project(
+            self.project_id, self.folder, self.workers,
+            skip_uploaded=self.skip_uploaded, compress=self.compress,
+            file_names=batch, bandwidth=self.bandwidth)
+        for name, result in zip(batch, results):
+            uploaded_id = genome_id(result)
+            if uploaded_id is None:
+                # Left out of the processed files, so it is tried again
+                # after retry_after
+                self._failed[name] = time.time()
+                error = result
+                if isinstance(result, dict):
+                    error = result.get('error') or result.get('description') or result
+                self.out.write('{}\tfailed: {}\n'.format(name, error))
+            else:
+                self._failed.pop(name, None)
+                self.processed.record(name, fingerprints[name], uploaded_id)
+                self.watcher.forget(name)
+                self.out.write('{}\tgenome {}\n'.format(name, uploaded_id))
+        self.out.flush()
+
+    def step(self, timeout=POLL_INTERVAL, flush=False):
+        """Watch for up to timeout seconds, then upload a batch if one is
+        due. If flush is True, whatever is ready is uploaded at once.
+        """
+        self.watcher.wait(timeout)
+        ready = self.ready()
+        if not ready:
+            self._waiting_since = None
+            return
+        if self._waiting_since is None:
+            self._waiting_since = time.time()
+        if (flush or len(ready) >= self.batch_size or
+                time.time() - self._waiting_since >= self.batch_wait):
+            self._waiting_since = None
+            self.upload(ready[:self.batch_size])
+
+    def run(self):
+        while not self.stopping:
+            self.step(min(POLL_INTERVAL, max(1, self.watcher.settle)))
+        self.watcher.close()
+
+    def stop(self, *args):
+        self.stopping = True
+
+
+def main():
+    """Main function. Upload genomes to a project as they appear in a folder.
+    """
+    parser = argparse.ArgumentParser(description='Upload genomes as they are written to a folder.')
+    parser.add_argument('project_id', metavar='project_id')
+    parser.add_argument('folder', metavar='folder')
+    parser.add_argument('--workers', metavar='workers', type=int, default=4,
+                        help='number of genomes to upload at once')
+    parser.add_argument('--settle', metavar='settle', type=float, default=60,
+                        help='seconds a file must be unchanged before it is uploaded')
+    parser.add_argument('--batch_size', metavar='batch_size', type=int, default=16,
+                        help='most genomes to upload in one batch')
+    parser.add_argument('--batch_wait', metavar='batch_wait', type=float, default=30,
+                        help='seconds to wait for more genomes before starting a batch')
+    parser.add_argument('--retry_after', metavar='retry_after', type=float, default=300,
+                        help='seconds to wait before retrying a failed upload')
+    parser.add_argument('--rescan', metavar='rescan', type=float, default=300,
+                        help='seconds between full listings of the folder')
+    parser.add_argument('--state', metavar='state',
+                        help='file recording the genomes already uploaded')
+    parser.add_argument('--force', action='store_true',
+                        help='upload genomes even if their contents were uploaded before')
+    parser.add_argument('--compress', action='store_true',
+                        help='bgzip uncompressed vcfs while uploading them')
+    parser.add_argument('--bandwidth', metavar='bandwidth', type=float,
+                        help='total upload bandwidth to use, in MB/s (unlimited by default)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        sys.exit('{} is not a folder'.format(args.folder))
+
+    uploader = FolderUploader(args.project_id, args.folder, workers=args.workers,
+                              settle=args.settle, batch_size=args.batch_size,
+                              batch_wait=args.batch_wait, retry_after=args.retry_after,
+                              rescan=args.rescan, skip_uploaded=not args.force,
+                              compress=args.compress,
+                              bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+                              state=args.state)
+    # Finish the batch being uploaded, then stop
+    signal.signal(signal.SIGTERM, uploader.stop)
+    signal.signal(signal.SIGINT, uploader.stop)
+    uploader.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,14 @@
 """
 
 import os
-import requests
-from requests.auth import HTTPBasicAuth
 import sys
 import json
 import argparse
 
-#Load environment variables for request authentication parameters
-if "OMICIA_API_PASSWORD" not in os.environ:
-    sys.exit("OMICIA_API_PASSWORD environment variable missing")
-
-if "OMICIA_API_LOGIN" not in os.environ:
-    sys.exit("OMICIA_API_LOGIN environment variable missing")
-
-OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
-OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
-OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
-auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+# Make the shared client package importable when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import client
+from client import OMICIA_API_URL
 
 
 def post_panel(name, description, methodology=None,
@@ -40,7 +31,7 @@ def post_panel(name, description, methodology=None,
     sys.stdout.flush()
     # If patient information was not provided, make a post request to reports
     # without a patient information parameter in the url
-    result = requests.post(url, auth=auth, data=url_payload, verify=False)
+    result = client.post(url, data=url_payload, verify=False)
     return result.json()
 
 
@@ -63,7 +54,7 @@ def put_panel(panel_id, name, description, methodology=None,
     sys.stdout.flush()
     # If patient information was not provided, make a post request to reports
     # without a patient information parameter in the url
-    result = requests.put(url, auth=auth, data=url_payload, verify=False)
+    result = client.put(url, data=url_payload, verify=False)
     return result.json()
 
 
@@ -78,7 +69,7 @@ def add_gene_symbols_to_panel(panel_id, gene_symbols):
     sys.stdout.write("Adding regions to panel...")
     sys.stdout.write("\n\n")
     sys.stdout.flush()
-    result = requests.post(url, auth=auth, data=url_payload, verify=False)
+    result = client.post(url, data=url_payload, verify=False)
     return result.json()
 
 
@@ -0,0 +1,15 @@
+"""Shared HTTP client for the Omicia API example scripts.
+
+Every workflow script sends its requests through the module-level helpers
+below, which reuse one pooled, authenticated requests.Session so that
+multi-step scripts keep their connections to the API alive between calls.
+"""
+
+from .session import (OMICIA_API_URL, OMICIA_API_LOGIN, OMICIA_API_PASSWORD,
+                      auth, configure, get_session, get_limiter, set_limiter,
+                      get_cache, get_metrics,
+                      request, get, post, put, patch, delete)
+from .cache import ResponseCache
+from .limiter import AdaptiveLimiter, TokenBucket
+from .retry import RetryBudget, RetryPolicy
+from .guards import report_guard, upload_guard
@@ -0,0 +1,216 @@
+"""Asyncio variants of the read-only workflow functions.
+
+Requires the aiohttp package. All coroutines share a single aiohttp session
+whose connector is sized like the synchronous pool, and gather() runs any
+number of them with a bounded number of requests in flight, e.g.
+
+    async def statuses(report_ids):
+        try:
+            return await aio.gather(
+                (aio.get_report(report_id) for report_id in report_ids),
+                limit=20)
+        finally:
+            await aio.close_session()
+
+    asyncio.run(statuses(range(1, 501)))
+
+Requests pass through the same AdaptiveLimiter, retry policy and metrics
+as the synchronous client: a coroutine waits with asyncio.sleep() for a
+place in the limiter's window, and for any Retry-After the server asked
+for, so that throttling holds back both kinds of request alike. Throttled
+(429 or 503) and failed requests are retried as described in retry, and
+an error status that is not retried raises aiohttp.ClientResponseError.
+"""
+
+import asyncio
+import datetime
+import json
+import time
+
+import aiohttp
+
+from .retry import (DEFAULT_POLICY, NO_RETRY, RETRYABLE_STATUSES, retry_delay,
+                    should_retry)
+from .session import (OMICIA_API_URL, OMICIA_API_LOGIN, OMICIA_API_PASSWORD,
+                      MAX_THROTTLE_RETRIES, _pool_options, get_limiter, get_metrics)
+
+DEFAULT_CONCURRENCY = 10
+
+# Seconds between looks at a full limiter window
+POLL_INTERVAL = 0.01
+
+RETRYABLE_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                        asyncio.TimeoutError)
+
+_session = None
+
+
+async def get_session():
+    """Return the shared aiohttp session, creating it on first use. Must be
+    called from within a running event loop.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=_pool_options['pool_connections'] * _pool_options['pool_maxsize'],
+            limit_per_host=_pool_options['pool_maxsize'])
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            auth=aiohttp.BasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD))
+    return _session
+
+
+async def close_session():
+    """Close the shared session and its pooled connections.
+    """
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+class _Response(object):
+    """The parts of an aiohttp response that the limiter and metrics read,
+    under the names a requests.Response gives them.
+    """
+
+    def __init__(self, response, content, elapsed):
+        self.raw = response
+        self.status_code = response.status
+        self.headers = response.headers
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+        self.content = self._content = content
+        self._content_consumed = True
+
+
+async def _acquire(limiter):
+    """Wait without blocking the event loop until the limiter admits a
+    request, and return the time it was admitted.
+    """
+    while True:
+        started, delay = limiter.try_acquire()
+        if started is not None:
+            if delay:
+                await asyncio.sleep(delay)
+            return started
+        await asyncio.sleep(POLL_INTERVAL if delay is None else delay)
+
+
+async def _send(session, limiter, method, url, kwargs):
+    """Send one attempt of a request. Returns the response, or None and the
+    error it failed with, and whether the server throttled it.
+    """
+    started = await _acquire(limiter)
+    response = error = None
+    try:
+        async with session.request(method, url, **kwargs) as raw:
+            headers_at = time.time()
+            content = await raw.read()
+            response = _Response(raw, content, headers_at - started)
+    except RETRYABLE_EXCEPTIONS as e:
+        error = e
+    finally:
+        throttled = limiter.release(started, response)
+        get_metrics().observe(method, url, time.time() - started, response)
+    return response, error, throttled
+
+
+async def request_json(method, url, verify=True, retry=None, **kwargs):
+    """Send a request through the shared session and return the decoded
+    JSON body. Takes the same keyword arguments as aiohttp's request().
+
+    Transient failures are retried according to retry, a RetryPolicy that
+    defaults to retry.DEFAULT_POLICY, as for client.request(); so are up to
+    MAX_THROTTLE_RETRIES throttled responses, each one taken from the same
+    retry budget. Raises aiohttp.ClientResponseError if the final response
+    has an error status.
+    """
+    session = await get_session()
+    limiter = get_limiter()
+    metrics = get_metrics()
+    if not verify:
+        kwargs['ssl'] = False
+    policy = retry or DEFAULT_POLICY
+    if not should_retry(method, url=url):
+        policy = NO_RETRY
+
+    started = time.time()
+    user_timeout = kwargs.get('timeout')
+    attempt = 0
+    throttles = 0
+    while True:
+        if policy.budget is not None:
+            policy.budget.deposit()
+        if policy.deadline is not None and user_timeout is None:
+            remaining = max(0.001, started + policy.deadline - time.time())
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=remaining)
+        response, error, throttled = await _send(session, limiter, method, url, kwargs)
+
+        if throttled:
+            # The limiter now holds every request back until Retry-After
+            # has passed, so the next _acquire() does the waiting
+            if (throttles < MAX_THROTTLE_RETRIES and policy is not NO_RETRY and
+                    (policy.budget is None or policy.budget.withdraw())):
+                throttles += 1
+                metrics.observe_retry(method, url, 'throttled')
+                continue
+        elif error is not None or response.status_code in RETRYABLE_STATUSES:
+            attempt += 1
+            delay = retry_delay(policy, attempt, started)
+            if delay is not None:
+                metrics.observe_retry(method, url, str(response.status_code)
+                                      if response is not None else type(error).__name__)
+                await asyncio.sleep(delay)
+                continue
+
+        if error is not None:
+            raise error
+        response.raw.raise_for_status()
+        if not response.content.strip():
+            return None
+        return json.loads(response.content.decode('utf-8'))
+
+
+async def gather(aws, limit=DEFAULT_CONCURRENCY):
+    """Await every awaitable in aws with at most limit of them running at
+    once. Results are returned in the same order as aws.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*[bounded(aw) for aw in aws])
+
+
+async def get_clinical_report(cr_id, extended=False):
+    """Get a clinical report, either with or without extended variant and
+    fields information.
+    """
+    url = "{}/reports/{}/"
+    if extended:
+        url += "?extended=True"
+    url = url.format(OMICIA_API_URL, cr_id)
+    return await request_json('GET', url, verify=False)
+
+
+async def get_report(report_id):
+    """Query for a report by its id.
+    """
+    url = "{}/reports/{}".format(OMICIA_API_URL, report_id)
+    return await request_json('GET', url, verify=False)
+
+
+async def get_genomes(project_id):
+    """Fetch all the genomes associated with a particular project.
+    """
+    url = "{}/projects/{}/genomes".format(OMICIA_API_URL, project_id)
+    return await request_json('GET', url, verify=False)
+
+
+async def get_panel_regions(panel_id):
+    """Get the regions for a panel.
+    """
+    url = "{}/panels/{}/regions".format(OMICIA_API_URL, panel_id)
+    return await request_json('GET', url)
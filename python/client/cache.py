@@ -0,0 +1,130 @@
+"""On-disk cache of GET responses, revalidated with conditional requests.
+
+Responses that carry an ETag or Last-Modified header are stored under a key
+derived from the API login and the full request URL. When the same URL is
+requested again the stored validators are sent as If-None-Match and
+If-Modified-Since, and a 304 Not Modified answer is served from the stored
+body. The cache is kept under max_bytes by evicting the least recently used
+entries.
+
+Each entry is a single file: one line of JSON metadata followed by the raw
+response body.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import requests
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'omicia_api')
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+# Response headers kept with each entry and replayed on a cache hit
+STORED_HEADERS = ('ETag', 'Last-Modified', 'Content-Type')
+
+
+class CacheEntry(object):
+
+    def __init__(self, url, headers, body):
+        self.url = url
+        self.headers = headers
+        self.body = body
+
+    def validators(self):
+        """Return the conditional request headers that revalidate this entry.
+        """
+        validators = {}
+        if self.headers.get('ETag'):
+            validators['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = self.headers['Last-Modified']
+        return validators
+
+    def to_response(self):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.headers.update(self.headers)
+        response._content = self.body
+        return response
+
+
+class ResponseCache(object):
+    """A size-bounded LRU cache of response bodies in a directory.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(identity, url):
+        return hashlib.sha256('{}\n{}'.format(identity, url).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        """Return the entry stored under key, or None. A hit marks the entry
+        as recently used.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return CacheEntry(meta['url'], meta['headers'], body)
+
+    def save(self, key, response):
+        """Store a successful response if it can be revalidated later.
+        """
+        if response.status_code != 200:
+            return
+        headers = dict((name, response.headers[name])
+                       for name in STORED_HEADERS if name in response.headers)
+        if 'ETag' not in headers and 'Last-Modified' not in headers:
+            return
+        meta = json.dumps({'url': response.url, 'headers': headers})
+        # Write to a temporary file and rename it into place so that readers
+        # never see a partially written entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(meta.encode('utf-8') + b'\n')
+            f.write(response.content)
+        os.rename(temp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in
+        max_bytes.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if name.startswith('.tmp-'):
+                    continue
+                try:
+                    stat = os.stat(self._path(name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+            entries.sort()
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+                total -= size
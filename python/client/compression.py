@@ -0,0 +1,251 @@
+"""Gzip compression of request bodies while they are being sent.
+
+GzipReader compresses a body as a single gzip stream. BgzipReader writes
+BGZF instead, the blocked gzip that bgzip and tabix use for .vcf.gz files:
+a series of independent gzip members of at most 64 KB of input each, which
+lets the blocks be compressed in parallel by background threads while the
+compressed ones are being sent.
+
+Responses need nothing extra: the shared session asks for gzip or deflate
+encoded responses and requests decompresses them as they are read, both
+for response.content and for streamed response.iter_content().
+"""
+
+import struct
+import threading
+import zlib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+CHUNK_SIZE = 1024 * 1024
+
+# Input bytes per BGZF block; bgzip uses the same, so that even data that
+# does not compress fits in a block's 64 KB
+BGZF_BLOCK_SIZE = 0xff00
+
+BGZF_HEADER = struct.Struct('<4BI2BH2BHH')
+
+# The empty block that marks the end of a BGZF file
+BGZF_EOF = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43'
+            b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+DEFAULT_THREADS = 2
+
+# Compressed blocks to hold ready ahead of the upload, about 16 MB of input
+QUEUED_BLOCKS = 256
+
+# Extensions of files that are already compressed and are sent as they are
+COMPRESSED_EXTENSIONS = ('.gz', '.bgz', '.bz2')
+
+
+def is_compressed(file_name):
+    return file_name.lower().endswith(COMPRESSED_EXTENSIONS)
+
+
+class GzipReader(object):
+    """Wrap a binary file object so that reading it yields the gzip
+    compressed contents of the file, without writing anything to disk.
+
+    Passed as a request body it is sent with chunked transfer encoding,
+    since the compressed length is not known in advance. It can be rewound
+    to the start with seek(0), so requests using it can still be retried.
+    """
+
+    def __init__(self, fileobj, level=6, chunk_size=CHUNK_SIZE):
+        self._file = fileobj
+        self._start = fileobj.tell()
+        self.level = level
+        self.chunk_size = chunk_size
+        self._reset()
+
+    def _reset(self):
+        self._file.seek(self._start)
+        # wbits of 16 + MAX_WBITS selects the gzip container
+        self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self._buffer = b''
+        self._finished = False
+        self._position = 0
+
+    def read(self, size=-1):
+        while not self._finished and (size < 0 or len(self._buffer) < size):
+            block = self._file.read(self.chunk_size)
+            if block:
+                self._buffer += self._compressor.compress(block)
+            else:
+                self._buffer += self._compressor.flush()
+                self._finished = True
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._position += len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise IOError("GzipReader can only be rewound to the start")
+        self._reset()
+        return 0
+
+
+def bgzf_block(data, level=6):
+    """Return data compressed as one BGZF block.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(data) + compressor.flush()
+    if len(deflated) > BGZF_BLOCK_SIZE:
+        # Incompressible data is stored, which still fits in a block
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(data) + compressor.flush()
+    header = BGZF_HEADER.pack(0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, ord('B'), ord('C'), 2,
+                              BGZF_HEADER.size + len(deflated) + 8 - 1)
+    trailer = struct.pack('<2I', zlib.crc32(data) & 0xffffffff, len(data))
+    return header + deflated + trailer
+
+
+class _Block(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.error = None
+        self.ready = threading.Event()
+
+
+class BgzipReader(object):
+    """Wrap a binary file object so that reading it yields the file BGZF
+    compressed, without writing anything to disk.
+
+    A background thread reads the file a block at a time and hands the
+    blocks to threads compressor threads, keeping up to queued_blocks
+    compressed blocks ready ahead of the reader. Like GzipReader it is sent
+    with chunked transfer encoding and can be rewound with seek(0).
+    """
+
+    def __init__(self, fileobj, level=6, threads=DEFAULT_THREADS,
+                 queued_blocks=QUEUED_BLOCKS, chunk_size=CHUNK_SIZE):
+        self._file = fileobj
+        self._start = fileobj.tell()
+        self.level = level
+        self.threads = max(1, threads)
+        self.queued_blocks = queued_blocks
+        self.chunk_size = chunk_size
+        self._reader = None
+        self._reset()
+
+    def _reset(self):
+        self.close()
+        self._file.seek(self._start)
+        self._stop = threading.Event()
+        self._output = queue.Queue(self.queued_blocks)
+        self._buffer = b''
+        self._offset = 0
+        self._finished = False
+        self._position = 0
+        work = queue.Queue()
+        self._reader = threading.Thread(target=self._read_blocks,
+                                        args=(self._stop, work, self._output))
+        workers = [threading.Thread(target=self._compress_blocks, args=(work,))
+                   for _ in range(self.threads)]
+        for thread in [self._reader] + workers:
+            thread.daemon = True
+            thread.start()
+
+    def _put(self, stop, output, block):
+        while not stop.is_set():
+            try:
+                output.put(block, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read_blocks(self, stop, work, output):
+        last = _Block(BGZF_EOF)
+        try:
+            while not stop.is_set():
+                data = self._file.read(BGZF_BLOCK_SIZE)
+                if not data:
+                    break
+                block = _Block(data)
+                work.put(block)
+                if not self._put(stop, output, block):
+                    break
+        except Exception as e:
+            last.error = e
+        finally:
+            for _ in range(self.threads):
+                work.put(None)
+            last.ready.set()
+            self._put(stop, output, last)
+
+    def _compress_blocks(self, work):
+        while True:
+            block = work.get()
+            if block is None:
+                return
+            try:
+                block.data = bgzf_block(block.data, self.level)
+            except Exception as e:
+                block.error = e
+            block.ready.set()
+
+    def read(self, size=-1):
+        parts = []
+        wanted = size
+        while wanted != 0:
+            if self._offset >= len(self._buffer):
+                if self._finished:
+                    break
+                block = self._output.get()
+                block.ready.wait()
+                if block.error is not None:
+                    raise block.error
+                self._finished = block.data is BGZF_EOF
+                self._buffer, self._offset = block.data, 0
+            end = len(self._buffer) if wanted < 0 else self._offset + wanted
+            part = self._buffer[self._offset:end]
+            self._offset += len(part)
+            if wanted > 0:
+                wanted -= len(part)
+            parts.append(part)
+        data = b''.join(parts)
+        self._position += len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise IOError("BgzipReader can only be rewound to the start")
+        self._reset()
+        return 0
+
+    def close(self):
+        """Stop the background threads, leaving the file open.
+        """
+        if self._reader is not None:
+            self._stop.set()
+            self._reader.join()
+            self._reader = None
@@ -0,0 +1,237 @@
+"""Faster first requests: cached DNS, TLS session resumption and pre-warmed
+connections.
+
+WarmHTTPAdapter is a requests adapter whose connections
+- look their host up in a DnsCache, which keeps resolved addresses on disk
+  for ttl seconds so that short-lived script runs skip the DNS lookup, and
+  forgets an address as soon as connecting to it fails;
+- resume TLS sessions through a TlsSessionCache, so that every connection
+  after the first to a host does an abbreviated handshake;
+- send a zerocopy.FileBody over plain HTTP with sendfile().
+
+TLS sessions are kept in memory only: the ssl module cannot serialize a
+session, so resumption helps scripts that open several connections (such
+as parallel uploads) rather than separate runs of a script.
+
+prewarm() opens pooled connections ahead of the first request, so that the
+DNS lookup and handshakes overlap with whatever the script does first.
+"""
+
+import json
+import os
+import socket
+import ssl
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .zerocopy import SendfileMixin
+
+DEFAULT_DNS_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache',
+                                      'omicia_api_dns.json')
+
+
+class DnsCache(object):
+    """Resolved addresses of hosts, persisted to a JSON file.
+    """
+
+    def __init__(self, path=DEFAULT_DNS_CACHE_PATH, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            self._entries = {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._entries, f)
+        os.rename(temp_path, self.path)
+
+    def resolve(self, host, port):
+        """Return an address to connect to for host, from the cache if it
+        has not expired.
+        """
+        key = '{}:{}'.format(host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['expires'] > time.time():
+                return entry['address']
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        with self._lock:
+            self._entries[key] = {'address': address, 'expires': time.time() + self.ttl}
+            self._save()
+        return address
+
+    def invalidate(self, host, port):
+        with self._lock:
+            if self._entries.pop('{}:{}'.format(host, port), None) is not None:
+                self._save()
+
+
+class TlsSessionCache(object):
+    """The most recent TLS session for each host, and one SSL context per
+    certificate verification mode. A session can only be resumed from the
+    context that created it, and urllib3 sets the verification mode on the
+    context it is given, so verified and unverified connections must not
+    share a context.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._contexts = {}
+
+    def context(self, cert_reqs):
+        with self._lock:
+            context = self._contexts.get(cert_reqs)
+            if context is None:
+                context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                # urllib3 matches the hostname itself after the handshake
+                context.check_hostname = False
+                context.load_default_certs()
+                context.sessions = self
+                self._contexts[cert_reqs] = context
+            return context
+
+    def get(self, context, host):
+        with self._lock:
+            return self._sessions.get((id(context), host))
+
+    def put(self, context, host, session):
+        if session is None:
+            return
+        with self._lock:
+            previous = self._sessions.get((id(context), host))
+            # Under TLS 1.3 the ticket arrives after the handshake, so prefer
+            # a session that has one over a newer one that does not yet
+            if previous is None or session.has_ticket or not previous.has_ticket:
+                self._sessions[(id(context), host)] = session
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """An SSLContext whose sockets resume the cached session for their host.
+    """
+    sessions = None
+
+    def wrap_socket(self, sock, server_hostname=None, **kwargs):
+        if self.sessions is not None:
+            session = self.sessions.get(self, server_hostname)
+            if session is not None:
+                kwargs['session'] = session
+        ssl_sock = super(ResumingSSLContext, self).wrap_socket(
+            sock, server_hostname=server_hostname, **kwargs)
+        self.remember(server_hostname, ssl_sock)
+        return ssl_sock
+
+    def remember(self, host, ssl_sock):
+        if self.sessions is not None:
+            self.sessions.put(self, host, getattr(ssl_sock, 'session', None))
+
+
+class _CachedDnsMixin(object):
+    dns_cache = None
+
+    def _connect_with_cached_address(self, connect):
+        if self.dns_cache is not None:
+            self._dns_host = self.dns_cache.resolve(self.host, self.port)
+        try:
+            connect()
+        except Exception:
+            if self.dns_cache is not None:
+                self.dns_cache.invalidate(self.host, self.port)
+            raise
+
+
+class WarmHTTPConnection(_CachedDnsMixin, SendfileMixin, HTTPConnection):
+
+    def connect(self):
+        self._connect_with_cached_address(super(WarmHTTPConnection, self).connect)
+
+
+class WarmHTTPSConnection(_CachedDnsMixin, HTTPSConnection):
+    tls_sessions = None
+
+    def connect(self):
+        if self.tls_sessions is not None and self.ssl_context is None:
+            self.ssl_context = self.tls_sessions.context(self.cert_reqs)
+        self._connect_with_cached_address(super(WarmHTTPSConnection, self).connect)
+
+    def getresponse(self, *args, **kwargs):
+        response = super(WarmHTTPSConnection, self).getresponse(*args, **kwargs)
+        # Any TLS 1.3 session ticket has arrived by the time a response has
+        if isinstance(self.ssl_context, ResumingSSLContext):
+            self.ssl_context.remember(self.host, self.sock)
+        return response
+
+
+class WarmHTTPAdapter(HTTPAdapter):
+    """An HTTPAdapter whose connections use a DnsCache and a TlsSessionCache.
+    Either may be None to leave that behaviour unchanged.
+    """
+
+    def __init__(self, dns_cache=None, tls_sessions=None, **kwargs):
+        self.dns_cache = dns_cache
+        self.tls_sessions = tls_sessions
+        super(WarmHTTPAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(WarmHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        http_connection = type('HTTPConnection', (WarmHTTPConnection,),
+                               {'dns_cache': self.dns_cache})
+        https_connection = type('HTTPSConnection', (WarmHTTPSConnection,),
+                                {'dns_cache': self.dns_cache,
+                                 'tls_sessions': self.tls_sessions})
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool', (HTTPConnectionPool,),
+                         {'ConnectionCls': http_connection}),
+            'https': type('HTTPSConnectionPool', (HTTPSConnectionPool,),
+                          {'ConnectionCls': https_connection})}
+
+
+def _connection_pool(session, url, verify):
+    adapter = session.get_adapter(url)
+    if hasattr(adapter, 'get_connection_with_tls_context'):
+        prepared = requests.Request('GET', url).prepare()
+        return adapter.get_connection_with_tls_context(prepared, verify)
+    return adapter.get_connection(url)
+
+
+def prewarm(session, url, connections=1, verify=False, wait=False):
+    """Open connections to the host of url and leave them in the session's
+    pool. verify must match the verify argument of the requests that are to
+    use them, since verified and unverified connections are pooled apart.
+    The work is done in a background thread unless wait is True.
+    """
+    def warm():
+        try:
+            pool = _connection_pool(session, url, verify)
+            opened = [pool._get_conn() for _ in range(connections)]
+            for conn in opened:
+                conn.connect()
+            for conn in opened:
+                pool._put_conn(conn)
+        except Exception:
+            # Warming up is only an optimization; the first request will
+            # connect and report any error itself
+            pass
+
+    if wait:
+        warm()
+        return None
+    thread = threading.Thread(target=warm, name='omicia-api-prewarm')
+    thread.daemon = True
+    thread.start()
+    return thread
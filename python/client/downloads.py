@@ -0,0 +1,218 @@
+"""Downloading large responses to disk, resuming them if interrupted.
+
+download() streams a GET response to a partial file next to its
+destination, chunk_size bytes at a time, so a multi-GB export never has to
+fit in memory. Once the whole body has arrived, and its length matches the
+Content-Length or Content-Range the server announced, the partial file is
+renamed into place. A reader of the destination therefore never sees half
+a file.
+
+If the connection drops, the download carries on from the end of the
+partial file with a Range request. The same happens when the download is
+run again after a crash. The ETag or Last-Modified of the first response
+is sent as If-Range, so a resource that changed in the meantime comes back
+whole and the download starts over. The partial file and a small JSON file
+describing it are named after the URL:
+
+    .<sha1 of the URL>.part
+    .<sha1 of the URL>.part.json
+
+The first request keeps the session's Accept-Encoding, so an export the
+server gzips comes over the wire compressed and is decoded as it is
+written. Its Content-Length is then that of the compressed body, so the
+length is only checked once a 206 response gives the decoded total. Range
+requests ask for Accept-Encoding: identity, so that the byte ranges refer
+to the bytes written to disk.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+import requests
+
+from . import session
+from .retry import RETRYABLE_EXCEPTIONS, RetryPolicy, sleep_until_retry
+
+DEFAULT_CHUNK_SIZE = int(os.environ.get('OMICIA_API_DOWNLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# Retries of a download that stopped without receiving anything new
+DEFAULT_POLICY = RetryPolicy(max_attempts=5)
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-\d+/(\d+|\*)')
+_FILENAME = re.compile(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', re.IGNORECASE)
+
+
+class DownloadError(IOError):
+    """A download the server refused, or that kept failing.
+    """
+
+    def __init__(self, message, response=None):
+        super(DownloadError, self).__init__(message)
+        self.response = response
+
+
+def response_filename(response, default=None):
+    """Return the file name given by a response's Content-Disposition
+    header, without any directory, or default.
+    """
+    match = _FILENAME.search(response.headers.get('content-disposition') or '')
+    if not match:
+        return default
+    return os.path.basename(match.group(1).strip()) or default
+
+
+def _content_length(response):
+    """Return the length of the body as written to disk, or None if it is
+    not known, as when the body is sent compressed.
+    """
+    if response.headers.get('content-encoding', 'identity').lower() != 'identity':
+        return None
+    length = response.headers.get('content-length')
+    return int(length) if length and length.isdigit() else None
+
+
+class _Partial(object):
+    """The partial file of a download and what is known about it.
+    """
+
+    def __init__(self, directory, identity):
+        key = hashlib.sha1(identity.encode('utf-8')).hexdigest()
+        self.path = os.path.join(directory, '.{}.part'.format(key))
+        self.meta_path = self.path + '.json'
+        try:
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.meta = {}
+
+    def size(self):
+        if not self.meta:
+            return 0
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def validator(self):
+        return self.meta.get('etag') or self.meta.get('last_modified')
+
+    def start(self, response, length):
+        self.meta = {'etag': response.headers.get('ETag'),
+                     'last_modified': response.headers.get('Last-Modified'),
+                     'length': length,
+                     'filename': response_filename(response)}
+        self._save()
+
+    def set_length(self, length):
+        self.meta['length'] = length
+        self._save()
+
+    def _save(self):
+        with open(self.meta_path, 'w') as f:
+            json.dump(self.meta, f)
+
+    def remove(self):
+        for path in (self.path, self.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def download(url, path=None, directory=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None,
+             retry=None, **kwargs):
+    """GET url into the file path, or into directory under the name given
+    by the response's Content-Disposition, and return the path written.
+
+    progress, if given, is called with the bytes downloaded so far and the
+    total, if known. Other keyword arguments (params, for one) are passed
+    to client.get(). Raises DownloadError if the server answers with an
+    error, or the download keeps failing.
+    """
+    if path is None and directory is None:
+        raise ValueError('download needs a path or a directory')
+    if path is not None:
+        directory = os.path.dirname(os.path.abspath(path))
+    full_url = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+    partial = _Partial(directory, full_url)
+    policy = retry or DEFAULT_POLICY
+    headers = dict(kwargs.pop('headers', None) or {})
+    started = time.time()
+    attempt = 0
+
+    while True:
+        offset = partial.size()
+        request_headers = dict(headers)
+        if offset and partial.validator():
+            request_headers['Range'] = 'bytes={}-'.format(offset)
+            request_headers['If-Range'] = partial.validator()
+            request_headers['Accept-Encoding'] = 'identity'
+        elif offset:
+            # Without a validator the partial file cannot be trusted
+            offset = 0
+
+        received = 0
+        error = None
+        try:
+            response = session.get(url, headers=request_headers, stream=True, **kwargs)
+            if response.status_code == 416 and offset and offset == partial.meta.get('length'):
+                # The partial file was complete already
+                response.close()
+            elif response.status_code in (200, 206):
+                if response.status_code == 200:
+                    offset = 0
+                    partial.start(response, _content_length(response))
+                if response.status_code == 206:
+                    match = _CONTENT_RANGE.match(response.headers.get('content-range', ''))
+                    if not match or int(match.group(1)) != offset:
+                        response.close()
+                        partial.remove()
+                        raise DownloadError('unexpected Content-Range {!r}'.format(
+                            response.headers.get('content-range')), response)
+                    if partial.meta.get('length') is None and match.group(2).isdigit():
+                        partial.set_length(int(match.group(2)))
+                length = partial.meta.get('length')
+                with open(partial.path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        received += len(chunk)
+                        if progress is not None:
+                            progress(offset + received, length)
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                if response.status_code == 416:
+                    partial.remove()
+                    attempt += 1
+                    if attempt < policy.max_attempts:
+                        continue
+                raise DownloadError('HTTP {}: {}'.format(response.status_code,
+                                                         response.text[:200]), response)
+        except RETRYABLE_EXCEPTIONS as e:
+            error = e
+
+        size = partial.size()
+        length = partial.meta.get('length')
+        if error is None and (length is None or size == length):
+            break
+        if length is not None and size > length:
+            partial.remove()
+        if received:
+            # Progress was made, so the retries start again
+            attempt = 0
+            started = time.time()
+        attempt += 1
+        if not sleep_until_retry(policy, attempt, started):
+            raise DownloadError('download of {} stopped at {} of {} bytes: {}'.format(
+                url, size, length if length is not None else 'unknown',
+                error or 'response ended early'))
+
+    if path is None:
+        path = os.path.join(directory, partial.meta.get('filename') or
+                            os.path.basename(url.rstrip('/')))
+    os.rename(partial.path, path)
+    partial.remove()
+    return path
@@ -0,0 +1,88 @@
+"""Recover callables that make non-idempotent requests safe to retry.
+
+Each guard records what already exists before the first attempt is sent.
+Before a retry it looks again, and if the earlier attempt created something
+after all, it returns that instead so the request is not repeated.
+"""
+
+from .pages import iter_pages
+from .session import OMICIA_API_URL
+
+
+def _find(url, params, match):
+    """Return the items on every page of the list at url for which match()
+    is true. An answer that is not a list, such as an HTML error page from a
+    proxy, is taken as no matches, so that a guard cannot stop the request
+    it protects from being sent.
+    """
+    try:
+        return [item for item in iter_pages(url, params, prefetch=1, verify=False)
+                if isinstance(item, dict) and match(item)]
+    except ValueError:
+        return []
+
+
+class ReportGuard(object):
+    """Guard a POST /reports/ by looking for a new report with the same
+    accession id. Returns a JSON object shaped like the launch response.
+    """
+
+    def __init__(self, accession_id):
+        self.accession_id = accession_id
+        self._known_ids = set(report.get('id') for report in self._find_reports())
+
+    def _find_reports(self):
+        url = "{}/reports/".format(OMICIA_API_URL)
+        return _find(url, {'accession_id': self.accession_id},
+                     lambda report: report.get('accession_id') == self.accession_id)
+
+    def __call__(self):
+        for report in self._find_reports():
+            if report.get('id') not in self._known_ids:
+                return {'clinical_report': report}
+        return None
+
+
+class UploadGuard(object):
+    """Guard a genome upload (PUT /projects/{id}/genomes) by looking for a
+    new genome in the project with the same label and external id. Returns
+    the genome, with its id also under genome_id as in the upload response.
+    """
+
+    def __init__(self, project_id, label, external_id=None):
+        self.project_id = project_id
+        self.label = label
+        self.external_id = external_id or None
+        self._known_ids = set(genome.get('id') for genome in self._find_genomes())
+
+    def _match(self, genome):
+        return (genome.get('genome_label', genome.get('label')) == self.label and
+                (self.external_id is None or genome.get('external_id') == self.external_id))
+
+    def _find_genomes(self):
+        url = "{}/projects/{}/genomes".format(OMICIA_API_URL, self.project_id)
+        return _find(url, None, self._match)
+
+    def __call__(self):
+        for genome in self._find_genomes():
+            if genome.get('id') not in self._known_ids:
+                return dict(genome, genome_id=genome.get('genome_id', genome.get('id')))
+        return None
+
+
+def report_guard(accession_id):
+    """Return a ReportGuard for accession_id, or None if there is no
+    accession id to look the report up by.
+    """
+    if not accession_id:
+        return None
+    return ReportGuard(accession_id)
+
+
+def upload_guard(project_id, label, external_id=None):
+    """Return an UploadGuard for a genome upload, or None if there is no
+    label to look the genome up by.
+    """
+    if not label:
+        return None
+    return UploadGuard(project_id, label, external_id)
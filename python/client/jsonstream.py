@@ -0,0 +1,156 @@
+"""Incremental decoding of large JSON responses.
+
+iter_objects() decodes the items of a response's "objects" array one at a
+time as the body arrives, so memory use depends on the size of one item
+rather than the size of the response. Each item is decoded by the standard
+library's C decoder; only the structure around the array is scanned here.
+"""
+
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+# Drop consumed text from the buffer once this much has accumulated
+_COMPACT_AT = 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader(object):
+    """A text buffer over an iterable of byte chunks.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self.buf = u''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk into the buffer. Returns False at the end of
+        the input.
+        """
+        if self.eof:
+            return False
+        if self.pos > _COMPACT_AT:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.buf += self._decoder.decode(chunk)
+                return True
+        self.buf += self._decoder.decode(b'', final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Skip whitespace and return the next character, or None at the end
+        of the input.
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected '{}' at offset {} of JSON stream".format(char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+            # A number that ends at the end of the buffer may continue in
+            # the next chunk
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        char = reader.peek()
+        reader.pos += 1
+        if char == ']':
+            return
+        if char != ',':
+            raise ValueError("Expected ',' or ']' in JSON array")
+
+
+def iter_objects(chunks, key='objects'):
+    """Yield the items of the array stored under key in a JSON object read
+    from chunks, an iterable of bytes such as response.iter_content().
+
+    If the document is itself an array its items are yielded. If it is an
+    object without key (such as an error description), or key does not hold
+    an array, the whole value is yielded once instead.
+    """
+    reader = _Reader(chunks)
+    first = reader.peek()
+    if first == '[':
+        for item in _iter_array(reader):
+            yield item
+        return
+    if first != '{':
+        yield reader.value()
+        return
+
+    reader.expect('{')
+    skipped = {}
+    while reader.peek() != '}':
+        name = reader.value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            for item in _iter_array(reader):
+                yield item
+            return
+        skipped[name] = reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+    yield skipped.get(key, skipped)
+
+
+def write_ndjson(items, out):
+    """Write each item as one line of JSON to out. Returns the item count.
+    """
+    count = 0
+    for item in items:
+        out.write(json.dumps(item))
+        out.write('\n')
+        count += 1
+    return count
+
+
+def write_json_objects(items, out, key='objects'):
+    """Write items to out as a JSON object holding them in an array under
+    key, one item at a time. Returns the item count.
+    """
+    out.write('{{{}: [\n'.format(json.dumps(key)))
+    count = 0
+    for item in items:
+        if count:
+            out.write(',\n')
+        out.write(json.dumps(item))
+        count += 1
+    out.write('\n]}\n')
+    return count
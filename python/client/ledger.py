@@ -0,0 +1,134 @@
+"""A local record of the genomes already uploaded, so that uploading the
+same content to the same project again can be skipped.
+
+Uploads are keyed by the SHA-256 of the file's contents and the project id,
+and the genome JSON the API returned is kept with them, in an SQLite
+database at ~/.cache/omicia_api_ledger.sqlite (or OMICIA_API_LEDGER).
+Files are hashed with several threads at once, reading in large blocks;
+hashlib releases the GIL while it works, so the threads hash in parallel.
+The digest of each path is remembered along with its size and mtime, so a
+file that has not changed since the last run is not read again.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_LEDGER_PATH = os.environ.get(
+    'OMICIA_API_LEDGER',
+    os.path.join(os.path.expanduser('~'), '.cache', 'omicia_api_ledger.sqlite'))
+
+BUFFER_SIZE = 4 * 1024 * 1024
+
+DEFAULT_HASH_WORKERS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    sha256 TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    genome_id INTEGER,
+    genome TEXT NOT NULL,
+    uploaded REAL NOT NULL,
+    PRIMARY KEY (sha256, project_id)
+);
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+def file_sha256(file_name, buffer_size=BUFFER_SIZE):
+    """Return the hex SHA-256 of a file, read buffer_size bytes at a time.
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        while True:
+            block = f.read(buffer_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadLedger(object):
+    """The uploads already made, shared safely between threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_LEDGER_PATH
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript(SCHEMA)
+
+    def lookup(self, sha256, project_id):
+        """Return the genome JSON recorded for this content in this project,
+        or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT genome FROM uploads WHERE sha256 = ? AND project_id = ?',
+                (sha256, str(project_id))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record(self, sha256, project_id, genome):
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)',
+                (sha256, str(project_id), genome.get('genome_id', genome.get('id')),
+                 json.dumps(genome),
+                 time.time()))
+
+    def digest(self, file_name):
+        """Return the SHA-256 of a file, hashing it only if it has changed
+        since it was last hashed.
+        """
+        path = os.path.abspath(file_name)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT sha256 FROM digests WHERE path = ? AND size = ? AND mtime = ?',
+                (path, stat.st_size, stat.st_mtime)).fetchone()
+        if row:
+            return row[0]
+        sha256 = file_sha256(path)
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)',
+                             (path, stat.st_size, stat.st_mtime, sha256))
+        return sha256
+
+    def digests(self, file_names, workers=DEFAULT_HASH_WORKERS):
+        """Return a dict of file name to SHA-256, hashing up to workers
+        files at once. A file that cannot be read maps to None.
+        """
+        results = {}
+        pending = iter(list(file_names))
+        pending_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with pending_lock:
+                    file_name = next(pending, None)
+                if file_name is None:
+                    return
+                try:
+                    results[file_name] = self.digest(file_name)
+                except (IOError, OSError):
+                    results[file_name] = None
+
+        threads = [threading.Thread(target=worker) for _ in range(max(1, workers))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
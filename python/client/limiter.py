@@ -0,0 +1,153 @@
+"""Client-side rate limiting for the Omicia API.
+
+AdaptiveLimiter combines an optional token bucket, which caps the request
+rate, with an AIMD (additive increase, multiplicative decrease) window that
+caps the number of requests in flight. Every successful response grows the
+window by roughly one request per window's worth of responses; a throttled
+response (429 or 503) halves it and, when the server sends Retry-After,
+holds back all new requests until that time has passed.
+"""
+
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+THROTTLE_STATUSES = (429, 503)
+
+# How long to hold back requests after a throttled response without Retry-After
+DEFAULT_THROTTLE_DELAY = 1.0
+
+
+def parse_retry_after(value):
+    """Return the number of seconds a Retry-After header asks us to wait, or
+    None if the header is missing or malformed. Both the delta-seconds and
+    HTTP-date forms are accepted.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+    """Allow rate requests per second on average, with bursts of up to burst
+    requests. take() blocks until the caller's token is available. Tokens
+    can stand for anything else, such as bytes sent, by taking more than
+    one at a time.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1, rate))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def take(self, amount=1):
+        wait = self.reserve(amount)
+        if wait:
+            time.sleep(wait)
+
+    def reserve(self, amount=1):
+        """Take amount tokens without blocking and return the number of
+        seconds the caller must wait before using them.
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve a token now, even if that leaves the bucket in debt,
+            # and sleep off the debt outside the lock
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+
+class AdaptiveLimiter(object):
+    """Bound the rate and concurrency of requests, adapting the concurrency
+    window to how the server responds.
+    """
+
+    def __init__(self, rate=None, burst=None, max_window=10, min_window=1,
+                 initial_window=None, decrease_factor=0.5):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_window = float(max_window)
+        self.min_window = float(min_window)
+        self.decrease_factor = decrease_factor
+        self._window = float(initial_window or max_window)
+        self._in_flight = 0
+        self._blocked_until = 0
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+
+    @property
+    def window(self):
+        return self._window
+
+    def acquire(self):
+        """Block until a request may be sent. Returns the time the request
+        was admitted, which must be passed back to release().
+        """
+        with self._condition:
+            while True:
+                now = time.time()
+                if now < self._blocked_until:
+                    self._condition.wait(self._blocked_until - now)
+                elif self._in_flight >= int(self._window):
+                    self._condition.wait()
+                else:
+                    break
+            self._in_flight += 1
+        if self.bucket is not None:
+            self.bucket.take()
+        return time.time()
+
+    def try_acquire(self):
+        """Admit a request without blocking, for callers such as coroutines
+        that must do their waiting elsewhere. Returns (started, delay): if
+        the request was admitted, the time it was admitted, to be passed
+        back to release(), and the seconds to wait before sending it; if
+        not, None and the seconds to wait before trying again, or None for
+        a delay if the window is full until another request is released.
+        """
+        with self._condition:
+            now = time.time()
+            if now < self._blocked_until:
+                return None, self._blocked_until - now
+            if self._in_flight >= int(self._window):
+                return None, None
+            self._in_flight += 1
+        delay = self.bucket.reserve() if self.bucket is not None else 0
+        return now + delay, delay
+
+    def release(self, started, response=None):
+        """Record the outcome of a request admitted at started. Pass the
+        response, or None if the request failed without one. Returns True if
+        the server throttled the request.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            throttled = (response is not None and
+                         response.status_code in THROTTLE_STATUSES)
+            if throttled:
+                now = time.time()
+                delay = parse_retry_after(response.headers.get('Retry-After'))
+                if delay is None:
+                    delay = DEFAULT_THROTTLE_DELAY
+                self._blocked_until = max(self._blocked_until, now + delay)
+                # Only shrink once per round of requests that were already in
+                # flight when the previous throttle was seen
+                if started >= self._last_decrease:
+                    self._window = max(self.min_window,
+                                       self._window * self.decrease_factor)
+                    self._last_decrease = now
+            elif response is not None:
+                self._window = min(self.max_window,
+                                   self._window + 1.0 / self._window)
+            self._condition.notify_all()
+        return throttled
@@ -0,0 +1,348 @@
+"""A local stand-in for the genome upload endpoint of the Omicia API, for
+trying out uploads without touching a real project.
+
+    python client/localserver.py --port 8000 --drop_rate 0.1
+    OMICIA_API_URL=http://127.0.0.1:8000 python GenomeWorkflows/upload_genome.py ...
+
+It accepts PUT /projects/<id>/genomes, sent whole (with a Content-Length or
+chunked transfer encoding) or in chunks with the resumable protocol of
+client.resumable, and answers with a genome object like the API's. GET
+/projects/<id>/genomes lists the genomes uploaded so far. Uploaded files
+are kept under --directory, or only counted with --discard.
+
+To stand in for a real link it can limit the total upload bandwidth
+(--bandwidth, in MB/s), add latency before every response (--latency, in
+seconds), answer a fraction of uploads with 502 Bad Gateway (--error_rate)
+and close the connection partway through the body of a fraction of them
+(--drop_rate), as a flaky network would.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+GENOMES_PATH = re.compile(r'^/projects/(\d+)/genomes/?$')
+CONTENT_RANGE = re.compile(r'^bytes (?:(\d+)-(\d+)|\*)/(\d+)$')
+BLOCK_SIZE = 64 * 1024
+
+
+class DroppedConnection(Exception):
+    pass
+
+
+class Throttle(object):
+    """Limit the bytes read by all connections together to rate per second.
+    """
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self._next = time.time()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + size / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+class NullFile(object):
+    """Somewhere to write an upload that is only counted.
+    """
+
+    def write(self, data):
+        pass
+
+    def read(self):
+        return b''
+
+    def seek(self, offset):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _send_json(self, status, obj, headers=None):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_blocks(self):
+        """Yield the request body in blocks, whether it was sent with a
+        Content-Length or with chunked transfer encoding. Raises
+        DroppedConnection if the client goes away before the whole body has
+        arrived.
+        """
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                line = self.rfile.readline()
+                if not line.strip():
+                    raise DroppedConnection()
+                length = int(line.split(b';')[0], 16)
+                if not length:
+                    self.rfile.readline()
+                    return
+                block = self.rfile.read(length)
+                if len(block) < length:
+                    raise DroppedConnection()
+                self.server.received(len(block))
+                yield block
+                self.rfile.readline()
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining:
+            block = self.rfile.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise DroppedConnection()
+            remaining -= len(block)
+            self.server.received(len(block))
+            yield block
+
+    def _receive(self, out):
+        """Copy the request body to out, returning the number of bytes, or
+        raise DroppedConnection if the body is cut short or this request is
+        chosen to fail.
+        """
+        drop_after = None
+        if random.random() < self.server.drop_rate:
+            self.server.count('dropped')
+            drop_after = random.randint(0, int(self.headers.get('Content-Length') or BLOCK_SIZE))
+        received = 0
+        for block in self._read_blocks():
+            received += len(block)
+            if drop_after is not None and received > drop_after:
+                raise DroppedConnection()
+            out.write(block)
+        if drop_after is not None:
+            raise DroppedConnection()
+        return received
+
+    def _fail(self):
+        """Decide whether to answer this upload with an error, and send it.
+        """
+        if random.random() >= self.server.error_rate:
+            return False
+        self.server.count('errors')
+        self._send_json(502, {'description': 'Bad Gateway'})
+        return True
+
+    def _genome(self, project_id, query, size):
+        self.server.count('genomes')
+        genome_id = self.server.next_id()
+        genome = {'id': genome_id,
+                'project_id': int(project_id),
+                'genome_label': query.get('genome_label', [''])[0],
+                'genome_sex': query.get('genome_sex', [''])[0],
+                'external_id': query.get('external_id', [''])[0],
+                'assembly_version': query.get('assembly_version', [''])[0],
+                'format': query.get('format', ['vcf'])[0],
+                'size': size,
+                'status': 'UPLOADED'}
+        self.server.add_genome(genome)
+        return genome
+
+    def do_GET(self):
+        match = GENOMES_PATH.match(urlparse(self.path).path)
+        if not match:
+            self._send_json(404, {'description': 'Not found'})
+            return
+        query = parse_qs(urlparse(self.path).query)
+        genomes = self.server.project_genomes(int(match.group(1)))
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', [str(len(genomes))])[0])
+        self._send_json(200, {'objects': genomes[offset:offset + limit]})
+
+    def do_PUT(self):
+        parsed = urlparse(self.path)
+        match = GENOMES_PATH.match(parsed.path)
+        if not match:
+            self._send_json(404, {'description': 'Not found'})
+            return
+        query = parse_qs(parsed.query, keep_blank_values=True)
+        self.server.count('requests')
+        try:
+            if 'Content-Range' in self.headers:
+                self._put_chunk(match.group(1), query)
+            else:
+                self._put_whole(match.group(1), query)
+        except DroppedConnection:
+            self.close_connection = True
+
+    def _put_whole(self, project_id, query):
+        path = None
+        if self.server.directory is None:
+            size = self._receive(NullFile())
+        else:
+            path = os.path.join(self.server.directory,
+                                'genome-{}'.format(self.server.next_id()))
+            try:
+                with open(path, 'wb') as out:
+                    size = self._receive(out)
+            except DroppedConnection:
+                os.remove(path)
+                raise
+        if self._fail():
+            if path is not None:
+                os.remove(path)
+        else:
+            self._send_json(200, self._genome(project_id, query, size))
+
+    def _put_chunk(self, project_id, query):
+        upload_id = query.get('upload_id', [''])[0]
+        content_range = CONTENT_RANGE.match(self.headers['Content-Range'])
+        if not re.match(r'^\w+$', upload_id) or not content_range:
+            self._send_json(400, {'description': 'Bad chunk request'})
+            return
+        start, end, total = content_range.groups()
+        total = int(total)
+        discard = self.server.directory is None
+        if not discard:
+            path = os.path.join(self.server.directory, 'upload-{}'.format(upload_id))
+        with self.server.lock_for(upload_id):
+            if discard:
+                stored = self.server.stored.get(upload_id, 0)
+            else:
+                stored = os.path.getsize(path) if os.path.exists(path) else 0
+            if start is not None and int(start) == stored:
+                # Keep a chunk only once all of it has arrived
+                with (NullFile() if discard else tempfile.TemporaryFile()) as chunk:
+                    size = self._receive(chunk)
+                    if self._fail():
+                        return
+                    chunk.seek(0)
+                    if discard:
+                        self.server.stored[upload_id] = stored + size
+                    else:
+                        with open(path, 'ab') as out:
+                            out.write(chunk.read())
+                stored += size
+            else:
+                # A status query, or a chunk the server is not expecting
+                for _ in self._read_blocks():
+                    pass
+            if stored >= total:
+                self._send_json(200, self._genome(project_id, query, stored))
+            else:
+                headers = {'Range': 'bytes=0-{}'.format(stored - 1)} if stored else {}
+                self._send_json(308, {'stored': stored}, headers)
+
+
+class UploadServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory=None, drop_rate=0.0, error_rate=0.0,
+                 bandwidth=None, latency=0.0, quiet=False):
+        HTTPServer.__init__(self, address, UploadHandler)
+        self.directory = directory
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.latency = latency
+        self.throttle = Throttle(bandwidth) if bandwidth else None
+        self.quiet = quiet
+        self.stored = {}
+        self.stats = {'requests': 0, 'genomes': 0, 'errors': 0, 'dropped': 0,
+                      'bytes_received': 0}
+        self._ids = 0
+        self._lock = threading.Lock()
+        self._upload_locks = {}
+        self._genomes = []
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def received(self, size):
+        self.count('bytes_received', size)
+        if self.throttle is not None:
+            self.throttle.consume(size)
+
+    def next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def add_genome(self, genome):
+        with self._lock:
+            self._genomes.append(genome)
+
+    def project_genomes(self, project_id):
+        with self._lock:
+            return [genome for genome in self._genomes if genome['project_id'] == project_id]
+
+    def lock_for(self, upload_id):
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def main():
+    """Main function. Serve the genome upload endpoint locally.
+    """
+    parser = argparse.ArgumentParser(description='Run a local stand-in for genome uploads.')
+    parser.add_argument('--port', metavar='port', type=int, default=8000)
+    parser.add_argument('--directory', metavar='directory',
+                        help='where to keep uploaded files (a new temporary directory by default)')
+    parser.add_argument('--discard', action='store_true',
+                        help='count uploaded bytes without keeping them')
+    parser.add_argument('--bandwidth', metavar='bandwidth', type=float,
+                        help='total upload bandwidth in MB/s')
+    parser.add_argument('--latency', metavar='latency', type=float, default=0.0,
+                        help='seconds to wait before each response')
+    parser.add_argument('--error_rate', metavar='error_rate', type=float, default=0.0,
+                        help='fraction of uploads answered with 502 Bad Gateway')
+    parser.add_argument('--drop_rate', metavar='drop_rate', type=float, default=0.0,
+                        help='fraction of requests whose connection is dropped')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    directory = None
+    if not args.discard:
+        directory = args.directory or tempfile.mkdtemp(prefix='omicia_uploads-')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    server = UploadServer(('127.0.0.1', args.port), directory,
+                          drop_rate=args.drop_rate, error_rate=args.error_rate,
+                          bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+                          latency=args.latency, quiet=args.quiet)
+    print('Serving genome uploads on http://127.0.0.1:{} into {}'.format(
+        args.port, directory or 'nowhere'))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Per-endpoint request metrics for the shared client.
+
+Every attempt sent through the client is recorded against its method and
+endpoint, the URL path with numeric ids replaced by {id}: total latency,
+time to first byte (until the response headers arrived), bytes sent and
+received, status codes, and retries. The metrics can be exported in the
+Prometheus text format or as a JSON summary, and are written at exit when
+the OMICIA_API_METRICS environment variable is set to 'prometheus' or
+'json' (to stderr, or to the file named by OMICIA_API_METRICS_FILE).
+
+Bytes received are counted from the body of responses that were read in
+full, or from Content-Length for streamed responses.
+"""
+
+import json
+import re
+import threading
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+# Upper bounds in seconds; long uploads land in the last few buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0, 300.0, 1800.0, float('inf'))
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_of(url):
+    """Return the path of url with numeric ids replaced by {id}.
+    """
+    return _ID_SEGMENT.sub('/{id}', urlparse(url).path) or '/'
+
+
+def bytes_sent(body, position):
+    """Return the size of a request body. File-like bodies are measured by
+    how far they were read from position.
+    """
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, type(u''))):
+        return len(body)
+    try:
+        return body.tell() - (position or 0)
+    except (AttributeError, IOError, OSError):
+        return 0
+
+
+def bytes_received(response):
+    if response is None:
+        return 0
+    if response._content_consumed and isinstance(response._content, bytes):
+        return len(response._content)
+    try:
+        return int(response.headers.get('Content-Length', 0))
+    except ValueError:
+        return 0
+
+
+class Histogram(object):
+    """A cumulative bucketed histogram of durations.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate the q quantile by interpolating within its bucket.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if seen + count >= rank and count:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {}
+        return {'mean': self.sum / self.count,
+                'p50': self.quantile(0.5),
+                'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99),
+                'max': self.max}
+
+
+class EndpointMetrics(object):
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.ttfb = Histogram()
+        self.statuses = {}
+        self.retries = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class Metrics(object):
+    """Thread-safe metrics keyed by (method, endpoint).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _get(self, method, url):
+        key = (method.upper(), endpoint_of(url))
+        metrics = self._endpoints.get(key)
+        if metrics is None:
+            metrics = self._endpoints[key] = EndpointMetrics()
+        return metrics
+
+    def observe(self, method, url, elapsed, response=None, body=None, position=None):
+        """Record one attempt that took elapsed seconds. response is None if
+        the attempt failed without one.
+        """
+        status = str(response.status_code) if response is not None else 'error'
+        with self._lock:
+            metrics = self._get(method, url)
+            metrics.latency.observe(elapsed)
+            if response is not None:
+                metrics.ttfb.observe(response.elapsed.total_seconds())
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.bytes_sent += bytes_sent(body, position)
+            metrics.bytes_received += bytes_received(response)
+
+    def observe_retry(self, method, url, reason):
+        with self._lock:
+            metrics = self._get(method, url)
+            metrics.retries[reason] = metrics.retries.get(reason, 0) + 1
+
+    def summary(self):
+        """Return the metrics as a JSON-serializable dict keyed by
+        "METHOD endpoint".
+        """
+        with self._lock:
+            summary = {}
+            for (method, endpoint), metrics in sorted(self._endpoints.items()):
+                summary['{} {}'.format(method, endpoint)] = {
+                    'requests': metrics.latency.count,
+                    'statuses': dict(metrics.statuses),
+                    'retries': dict(metrics.retries),
+                    'latency': metrics.latency.summary(),
+                    'time_to_first_byte': metrics.ttfb.summary(),
+                    'bytes_sent': metrics.bytes_sent,
+                    'bytes_received': metrics.bytes_received}
+            return summary
+
+    def prometheus_text(self):
+        """Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            for name, attribute, help_text in (
+                    ('omicia_api_request_duration_seconds', 'latency',
+                     'Time from sending a request until its response was read.'),
+                    ('omicia_api_time_to_first_byte_seconds', 'ttfb',
+                     'Time from sending a request until its response headers arrived.')):
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} histogram'.format(name))
+                for (method, endpoint), metrics in items:
+                    histogram = getattr(metrics, attribute)
+                    labels = 'method="{}",endpoint="{}"'.format(method, endpoint)
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, le, cumulative))
+                    lines.append('{}_sum{{{}}} {}'.format(name, labels, histogram.sum))
+                    lines.append('{}_count{{{}}} {}'.format(name, labels, histogram.count))
+
+            for name, attribute, label, help_text in (
+                    ('omicia_api_requests_total', 'statuses', 'status',
+                     'Requests sent, by response status.'),
+                    ('omicia_api_retries_total', 'retries', 'reason',
+                     'Requests sent again, by reason.')):
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} counter'.format(name))
+                for (method, endpoint), metrics in items:
+                    for value, count in sorted(getattr(metrics, attribute).items()):
+                        lines.append('{}{{method="{}",endpoint="{}",{}="{}"}} {}'.format(
+                            name, method, endpoint, label, value, count))
+
+            for name, attribute, help_text in (
+                    ('omicia_api_bytes_sent_total', 'bytes_sent', 'Request body bytes sent.'),
+                    ('omicia_api_bytes_received_total', 'bytes_received',
+                     'Response body bytes received.')):
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} counter'.format(name))
+                for (method, endpoint), metrics in items:
+                    lines.append('{}{{method="{}",endpoint="{}"}} {}'.format(
+                        name, method, endpoint, getattr(metrics, attribute)))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, fileobj, format='json'):
+        if format == 'prometheus':
+            fileobj.write(self.prometheus_text())
+        else:
+            fileobj.write(json.dumps(self.summary(), indent=4, sort_keys=True))
+            fileobj.write('\n')
@@ -0,0 +1,174 @@
+"""Walking every page of an offset/limit paginated list.
+
+iter_pages() yields the items of a list endpoint, such as a variant
+report's variants, one at a time, requesting the pages with offset and
+limit query parameters. While the caller works through one page, the next
+prefetch pages are already being fetched by background threads, so that a
+multi-million item list is read at the speed of the network rather than
+one round trip at a time.
+
+The page size adapts to how long pages take: it doubles while pages come
+back in well under target_seconds and halves when they take much longer,
+within min_page_size and max_page_size. Pages already requested keep their
+size; offsets are always exact.
+
+The list ends at the first page with fewer items than were asked for. A
+server that caps limit below the page size asked for also returns short
+pages, so a short page only ends the list if the page after it is empty;
+otherwise the page size is lowered to the server's cap and the missing
+items are fetched.
+"""
+
+import collections
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from . import session
+
+DEFAULT_PAGE_SIZE = 1000
+MIN_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 50000
+DEFAULT_PREFETCH = 4
+
+# Seconds a page should take to arrive
+TARGET_SECONDS = 2.0
+
+
+class _Page(object):
+
+    def __init__(self, offset, limit):
+        self.offset = offset
+        self.limit = limit
+        self.items = None
+        self.error = None
+        self.cancelled = False
+        self.ready = threading.Event()
+
+
+class _PageSize(object):
+    """The size of the next page to request, adapted to page latency.
+    """
+
+    def __init__(self, size, min_size, max_size, target_seconds):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.size = max(min_size, min(size, max_size))
+        self._lock = threading.Lock()
+
+    def observe(self, limit, seconds):
+        with self._lock:
+            if limit != self.size:
+                # A gap, or a page requested before the last change
+                return
+            if seconds < self.target_seconds / 2:
+                self.size = min(self.max_size, self.size * 2)
+            elif seconds > self.target_seconds * 2:
+                self.size = max(self.min_size, self.size // 2)
+
+    def cap(self, size):
+        with self._lock:
+            self.max_size = max(1, size)
+            self.min_size = min(self.min_size, self.max_size)
+            self.size = min(self.size, self.max_size)
+
+
+def _items(response, key, offset):
+    result = response.json()
+    if isinstance(result, list):
+        return result
+    if isinstance(result, dict) and isinstance(result.get(key), list):
+        return result[key]
+    raise ValueError('Unexpected response for the page at offset {}: {}'.format(
+        offset, result.get('description', result) if isinstance(result, dict) else result))
+
+
+def iter_pages(url, params=None, key='objects', offset=0, page_size=DEFAULT_PAGE_SIZE,
+               prefetch=DEFAULT_PREFETCH, min_page_size=MIN_PAGE_SIZE,
+               max_page_size=MAX_PAGE_SIZE, target_seconds=TARGET_SECONDS, **kwargs):
+    """Yield every item of the paginated list at url, starting at offset.
+
+    Each page is a GET of url with params plus offset and limit, whose JSON
+    holds the page's items under key (or is itself a list). Other keyword
+    arguments are passed to client.get(). An error fetching a page is
+    raised when the iteration reaches that page.
+    """
+    sizes = _PageSize(page_size, min_page_size, max_page_size, target_seconds)
+    work = queue.Queue()
+    stop = threading.Event()
+    kwargs.setdefault('coalesce', False)
+
+    def fetch():
+        while not stop.is_set():
+            page = work.get()
+            if page is None:
+                return
+            if page.cancelled:
+                page.ready.set()
+                continue
+            page_params = dict(params or {}, offset=page.offset, limit=page.limit)
+            started = time.time()
+            try:
+                response = session.get(url, params=page_params, **kwargs)
+                page.items = _items(response, key, page.offset)
+                sizes.observe(page.limit, time.time() - started)
+            except Exception as e:
+                page.error = e
+            page.ready.set()
+
+    threads = [threading.Thread(target=fetch) for _ in range(max(1, prefetch))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    scheduled = collections.deque()
+    next_offset = offset
+
+    def schedule(page_offset, limit, first=False):
+        page = _Page(page_offset, limit)
+        if first:
+            scheduled.appendleft(page)
+        else:
+            scheduled.append(page)
+        work.put(page)
+
+    def wait(page):
+        page.ready.wait()
+        if page.error is not None:
+            raise page.error
+        return page.items
+
+    try:
+        while True:
+            while len(scheduled) <= max(1, prefetch):
+                schedule(next_offset, sizes.size)
+                next_offset += scheduled[-1].limit
+            page = scheduled.popleft()
+            items = wait(page)
+            for item in items:
+                yield item
+            if len(items) >= page.limit:
+                continue
+            following = scheduled[0]
+            if items and following.offset == page.offset + page.limit and wait(following):
+                # The server returned fewer items than asked for although
+                # there are more: fetch the rest of this page, and ask for
+                # no more than it returned from now on
+                sizes.cap(len(items))
+                gap = list(range(page.offset + len(items), page.offset + page.limit, len(items)))
+                for gap_offset in reversed(gap):
+                    limit = min(len(items), page.offset + page.limit - gap_offset)
+                    schedule(gap_offset, limit, first=True)
+                continue
+            return
+    finally:
+        stop.set()
+        for later in scheduled:
+            later.cancelled = True
+        for _ in threads:
+            work.put(None)
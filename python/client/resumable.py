@@ -0,0 +1,156 @@
+"""Resumable, chunked uploads of large files.
+
+The file is sent as a series of PUT requests to the same upload URL, each
+carrying one chunk and a Content-Range header giving its place in the file:
+
+    Content-Range: bytes 0-8388607/15032385536
+
+The server answers 308 (Resume Incomplete) with a Range header naming the
+bytes it has stored so far, e.g. "Range: bytes=0-8388607", until the last
+chunk arrives, which it answers with the usual response for the whole
+upload. A PUT with an empty body and "Content-Range: bytes */<size>" asks
+for the stored range without sending anything. The upload is identified by
+an upload_id query parameter chosen by the client.
+
+Every acknowledged offset is recorded in a journal file, one per upload,
+under ~/.cache/omicia_api_uploads. Running the same upload again after a
+crash or a dropped connection finds the journal, asks the server how much
+it already has, and carries on from there. The journal is discarded when
+the upload completes, or when the file has changed since it was written.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+
+from . import session
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                                   'omicia_api_uploads')
+
+RESUME_INCOMPLETE = 308
+
+# 308 responses in a row that may leave the stored offset where it was
+MAX_STALLED_CHUNKS = 3
+
+
+def acknowledged(response):
+    """Return the number of bytes the server has stored, from the Range
+    header of a 308 response.
+    """
+    stored = response.headers.get('Range')
+    if not stored:
+        return 0
+    return int(stored.rpartition('-')[2]) + 1
+
+
+class UploadJournal(object):
+    """The on-disk record of one file's resumable upload to one URL.
+    """
+
+    def __init__(self, url, file_name, directory=None):
+        self.directory = directory or DEFAULT_JOURNAL_DIR
+        self.file_name = os.path.abspath(file_name)
+        identity = '{}\n{}'.format(url, self.file_name).encode('utf-8')
+        self.path = os.path.join(self.directory,
+                                 hashlib.sha1(identity).hexdigest() + '.json')
+
+    def _fingerprint(self):
+        stat = os.stat(self.file_name)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        """Return the recorded state of the upload, or a new state if there
+        is none or the file has changed since it was recorded.
+        """
+        fingerprint = self._fingerprint()
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            state = None
+        if (state is None or state.get('size') != fingerprint['size'] or
+                state.get('mtime') != fingerprint['mtime']):
+            state = dict(fingerprint, upload_id=uuid.uuid4().hex, offset=0)
+        return state
+
+    def save(self, state):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temp_path = '{}.tmp-{}'.format(self.path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.rename(temp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def upload(url, file_name, chunk_size=DEFAULT_CHUNK_SIZE, journal_dir=None,
+           progress=None, **kwargs):
+    """PUT file_name to url in chunks of chunk_size bytes, resuming an
+    earlier upload of the same file to the same url if one was interrupted.
+    progress, if given, is called with the number of bytes stored after
+    each chunk. Returns the response to the final chunk. Raises IOError if
+    the server keeps answering chunks without storing any more of the file.
+    """
+    journal = UploadJournal(url, file_name, journal_dir)
+    state = journal.load()
+    size = state['size']
+    if not size:
+        with open(file_name, 'rb') as file_handle:
+            return session.put(url, data=file_handle, **kwargs)
+
+    separator = '&' if '?' in url else '?'
+    upload_url = '{}{}upload_id={}'.format(url, separator, state['upload_id'])
+    headers = dict(kwargs.pop('headers', None) or {})
+    # The server keeps one upload per upload_id, so a chunk or status query
+    # sent twice is stored once
+    kwargs['idempotent'] = True
+
+    offset = 0
+    if state['offset']:
+        # The journal may lag the server by a chunk, so ask it where to resume
+        headers['Content-Range'] = 'bytes */{}'.format(size)
+        response = session.put(upload_url, data=b'', headers=headers, **kwargs)
+        if response.status_code != RESUME_INCOMPLETE:
+            if response.ok:
+                journal.remove()
+            return response
+        offset = acknowledged(response)
+
+    stalled = 0
+    with open(file_name, 'rb') as file_handle:
+        while True:
+            file_handle.seek(offset)
+            chunk = file_handle.read(chunk_size)
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(
+                offset, offset + len(chunk) - 1, size)
+            response = session.put(upload_url, data=chunk, headers=headers,
+                                   **kwargs)
+            if response.status_code != RESUME_INCOMPLETE:
+                break
+            stored = acknowledged(response)
+            if stored > offset:
+                stalled = 0
+            else:
+                stalled += 1
+                if stalled >= MAX_STALLED_CHUNKS:
+                    raise IOError('upload of {} stalled at {} of {} bytes: the server '
+                                  'stored none of the last {} chunks'.format(
+                                      file_name, stored, size, stalled))
+            offset = stored
+            state['offset'] = offset
+            journal.save(state)
+            if progress is not None:
+                progress(offset)
+
+    if response.ok:
+        journal.remove()
+    return response
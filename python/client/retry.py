@@ -0,0 +1,140 @@
+"""Retries for requests that fail in transit.
+
+A RetryPolicy retries connection errors, timeouts and 500/502/504 responses
+with jittered exponential backoff, until it runs out of attempts, its
+deadline passes or the shared RetryBudget is spent. The budget earns a
+fraction of a retry for every request sent, so a failing API sees a few
+extra requests rather than a multiple of its normal load.
+
+Only idempotent requests are retried by default. A POST, or a genome upload
+PUT, is retried only when the caller passes a recover callable, which is
+asked before each retry whether the previous attempt took effect after all.
+"""
+
+import random
+import re
+import threading
+import time
+
+import requests
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# A PUT of a genome creates a new genome each time it is sent
+CREATING_PUTS = re.compile(r'/projects/[^/]+/genomes/?$')
+
+# 503 and 429 are handled by the limiter, which honours Retry-After
+RETRYABLE_STATUSES = (500, 502, 504)
+
+RETRYABLE_EXCEPTIONS = (requests.exceptions.ConnectionError,
+                        requests.exceptions.Timeout,
+                        requests.exceptions.ChunkedEncodingError)
+
+
+class RetryBudget(object):
+    """Allow up to max_retries retries in a burst, refilled at ratio
+    retries for every request sent.
+    """
+
+    def __init__(self, ratio=0.2, max_retries=10):
+        self.ratio = ratio
+        self.max_retries = float(max_retries)
+        self._tokens = self.max_retries
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_retries, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Take one retry from the budget. Returns False if it is spent.
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """How often and how long to keep retrying a single request.
+
+    max_attempts counts the first attempt. deadline, in seconds, bounds the
+    whole call: no retry is started that would begin after it, and each
+    attempt's timeout is capped to the time remaining.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30.0,
+                 deadline=None, budget=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.budget = budget
+
+    def backoff(self, attempt):
+        """Return the delay before retry number attempt (starting at 1),
+        drawn uniformly up to the exponential backoff ("full jitter").
+        """
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** (attempt - 1)))
+
+    def is_retryable(self, response=None, error=None):
+        if error is not None:
+            return isinstance(error, RETRYABLE_EXCEPTIONS)
+        return response is not None and response.status_code in RETRYABLE_STATUSES
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+DEFAULT_POLICY = RetryPolicy(budget=RetryBudget())
+
+
+def is_idempotent(method, url=None):
+    """Whether sending a request twice has the same effect as sending it
+    once. Genome upload PUTs are not, although other PUTs are.
+    """
+    method = method.upper()
+    if method == 'PUT' and url is not None and CREATING_PUTS.search(urlparse(url).path):
+        return False
+    return method in IDEMPOTENT_METHODS
+
+
+def should_retry(method, idempotent=None, recover=None, url=None):
+    """Whether a request may be retried at all: idempotent methods always
+    may, other methods only when the caller can recover their result.
+    """
+    if idempotent is None:
+        idempotent = is_idempotent(method, url)
+    return idempotent or recover is not None
+
+
+def retry_delay(policy, attempt, started):
+    """Return the seconds to wait before retry number attempt of a call
+    that started at started, taking the retry from the budget, or None if
+    the retry is not allowed.
+    """
+    if attempt >= policy.max_attempts:
+        return None
+    delay = policy.backoff(attempt)
+    if policy.deadline is not None and time.time() + delay >= started + policy.deadline:
+        return None
+    if policy.budget is not None and not policy.budget.withdraw():
+        return None
+    return delay
+
+
+def sleep_until_retry(policy, attempt, started):
+    """Sleep before retry number attempt of a call that started at started.
+    Returns False without sleeping if the retry is not allowed.
+    """
+    delay = retry_delay(policy, attempt, started)
+    if delay is None:
+        return False
+    time.sleep(delay)
+    return True
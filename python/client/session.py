@@ -0,0 +1,358 @@
+"""A pooled, authenticated requests.Session shared by all workflow scripts.
+
+The pool can be sized with the OMICIA_API_POOL_CONNECTIONS and
+OMICIA_API_POOL_MAXSIZE environment variables, or by calling configure()
+before the first request is made.
+
+Every request also passes through a shared AdaptiveLimiter. Its request rate
+can be capped with OMICIA_API_RATE_LIMIT (requests per second) and its
+concurrency window with OMICIA_API_MAX_CONCURRENCY, or the limiter can be
+replaced with set_limiter(). Throttled requests (429 or 503) are sent again
+once the limiter allows it, up to MAX_THROTTLE_RETRIES times. Connection
+errors and server errors are retried with backoff as described in retry.
+
+GET requests made with cache=True are kept in an on-disk ResponseCache,
+located by OMICIA_API_CACHE_DIR and bounded by OMICIA_API_CACHE_SIZE bytes.
+Concurrent identical GETs from different threads share a single request.
+
+Every attempt is recorded in the shared Metrics instance returned by
+get_metrics(), which is written out at exit if OMICIA_API_METRICS is set.
+
+To speed up the first requests of short runs, OMICIA_API_DNS_CACHE_TTL keeps
+resolved API addresses on disk for that many seconds, OMICIA_API_TLS_RESUME=1
+resumes TLS sessions between connections, and OMICIA_API_PREWARM opens that
+many connections in the background as soon as the session is created.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+from .cache import ResponseCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from .compression import ACCEPT_ENCODING
+from .connections import DnsCache, TlsSessionCache, WarmHTTPAdapter, prewarm
+from .limiter import AdaptiveLimiter
+from .metrics import Metrics
+from .retry import DEFAULT_POLICY, NO_RETRY, should_retry, sleep_until_retry
+from .singleflight import SingleFlight
+
+# Load environment variables for request authentication parameters
+if "OMICIA_API_PASSWORD" not in os.environ:
+    sys.exit("OMICIA_API_PASSWORD environment variable missing")
+
+if "OMICIA_API_LOGIN" not in os.environ:
+    sys.exit("OMICIA_API_LOGIN environment variable missing")
+
+OMICIA_API_LOGIN = os.environ['OMICIA_API_LOGIN']
+OMICIA_API_PASSWORD = os.environ['OMICIA_API_PASSWORD']
+OMICIA_API_URL = os.environ.get('OMICIA_API_URL', 'https://api.omicia.com')
+auth = HTTPBasicAuth(OMICIA_API_LOGIN, OMICIA_API_PASSWORD)
+
+# Number of distinct hosts to keep pools for, and keep-alive connections per host
+POOL_CONNECTIONS = int(os.environ.get('OMICIA_API_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('OMICIA_API_POOL_MAXSIZE', 10))
+
+RATE_LIMIT = float(os.environ.get('OMICIA_API_RATE_LIMIT', 0))
+MAX_CONCURRENCY = int(os.environ.get('OMICIA_API_MAX_CONCURRENCY', POOL_MAXSIZE))
+MAX_THROTTLE_RETRIES = 5
+
+DNS_CACHE_TTL = float(os.environ.get('OMICIA_API_DNS_CACHE_TTL', 0))
+TLS_RESUME = os.environ.get('OMICIA_API_TLS_RESUME', '').lower() in ('1', 'true', 'yes')
+PREWARM = int(os.environ.get('OMICIA_API_PREWARM', 0))
+
+CACHE_DIR = os.environ.get('OMICIA_API_CACHE_DIR', DEFAULT_CACHE_DIR)
+CACHE_SIZE = int(os.environ.get('OMICIA_API_CACHE_SIZE', DEFAULT_MAX_BYTES))
+
+_session = None
+_cache = None
+_flights = SingleFlight()
+_metrics = Metrics()
+_limiter = AdaptiveLimiter(rate=RATE_LIMIT, max_window=MAX_CONCURRENCY)
+_session_lock = threading.Lock()
+_pool_options = {'pool_connections': POOL_CONNECTIONS,
+                 'pool_maxsize': POOL_MAXSIZE,
+                 'pool_block': False}
+
+
+def _build_session():
+    """Create an authenticated session whose adapters keep a pool of
+    keep-alive connections open for each host.
+    """
+    session = requests.Session()
+    session.auth = auth
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    adapter = WarmHTTPAdapter(
+        dns_cache=DnsCache(ttl=DNS_CACHE_TTL) if DNS_CACHE_TTL else None,
+        tls_sessions=TlsSessionCache() if TLS_RESUME else None,
+        **_pool_options)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if PREWARM:
+        # Almost every script sends its requests with verify=False
+        prewarm(session, OMICIA_API_URL, PREWARM, verify=False)
+    return session
+
+
+def configure(pool_connections=None, pool_maxsize=None, pool_block=None):
+    """Resize the shared connection pool. Any existing session is closed and
+    a new one is created on the next request.
+    """
+    global _session
+    with _session_lock:
+        if pool_connections is not None:
+            _pool_options['pool_connections'] = pool_connections
+        if pool_maxsize is not None:
+            _pool_options['pool_maxsize'] = pool_maxsize
+        if pool_block is not None:
+            _pool_options['pool_block'] = pool_block
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session():
+    """Return the shared session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def set_limiter(limiter):
+    """Replace the limiter that all requests pass through.
+    """
+    global _limiter
+    _limiter = limiter
+
+
+def get_limiter():
+    return _limiter
+
+
+def get_cache():
+    """Return the shared response cache, creating it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _session_lock:
+            if _cache is None:
+                _cache = ResponseCache(CACHE_DIR, CACHE_SIZE)
+    return _cache
+
+
+def get_metrics():
+    return _metrics
+
+
+def _body_position(data):
+    """Return the current offset of a file-like request body so that it can
+    be rewound before resending, or None if the body cannot be rewound.
+    Strings and form data can always be resent as they are.
+    """
+    if data is None or isinstance(data, (bytes, type(u''), dict, list, tuple)):
+        return 0
+    try:
+        return data.tell()
+    except (AttributeError, IOError, OSError):
+        return None
+
+
+def _json_response(url, json_object):
+    """Wrap a JSON object recovered by a guard in a response, so callers can
+    treat it like the response to the request that was not repeated.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers['Content-Type'] = 'application/json'
+    response._content = json.dumps(json_object).encode('utf-8')
+    return response
+
+
+def _send(session, limiter, method, url, data, position, kwargs):
+    """Send one attempt of a request, resending it while the limiter reports
+    that the server throttled it.
+    """
+    attempts = 0
+    while True:
+        started = limiter.acquire()
+        response = None
+        try:
+            response = session.request(method, url, **kwargs)
+        finally:
+            throttled = limiter.release(started, response)
+            _metrics.observe(method, url, time.time() - started, response, data, position)
+        if not throttled or attempts >= MAX_THROTTLE_RETRIES or position is None:
+            return response
+        attempts += 1
+        _metrics.observe_retry(method, url, 'throttled')
+        response.close()
+        if hasattr(data, 'seek'):
+            data.seek(position)
+
+
+def _cached_get(url, retry, kwargs):
+    """Send a GET revalidating any cached copy of the response, and serve
+    the cached body if the server answers 304 Not Modified.
+    """
+    cache = get_cache()
+    full_url = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+    key = cache.key(OMICIA_API_LOGIN, full_url)
+    entry = cache.load(key)
+    if entry is not None:
+        headers = dict(kwargs.get('headers') or {})
+        headers.update(entry.validators())
+        kwargs['headers'] = headers
+    response = _send_with_retries('GET', url, retry, None, None, kwargs)
+    if response.status_code == 304 and entry is not None:
+        response.close()
+        return entry.to_response()
+    cache.save(key, response)
+    return response
+
+
+def _send_with_retries(method, url, retry, idempotent, recover, kwargs):
+    """Send a request, retrying transient failures as allowed by retry.
+    """
+    session = get_session()
+    limiter = _limiter
+    policy = retry or DEFAULT_POLICY
+    if not should_retry(method, idempotent, recover, url):
+        policy = NO_RETRY
+    data = kwargs.get('data')
+    position = _body_position(data)
+    if position is None:
+        policy = NO_RETRY
+
+    started = time.time()
+    user_timeout = kwargs.get('timeout')
+    attempt = 0
+    while True:
+        if policy.budget is not None:
+            policy.budget.deposit()
+        if policy.deadline is not None and user_timeout is None:
+            kwargs['timeout'] = max(0.001, started + policy.deadline - time.time())
+        response = error = None
+        try:
+            response = _send(session, limiter, method, url, data, position, kwargs)
+        except Exception as e:
+            error = e
+        if not policy.is_retryable(response, error):
+            if error is not None:
+                raise error
+            return response
+
+        attempt += 1
+        if not sleep_until_retry(policy, attempt, started):
+            if error is not None:
+                raise error
+            return response
+        if response is not None:
+            response.close()
+        _metrics.observe_retry(method, url, str(response.status_code) if response is not None
+                              else type(error).__name__)
+        if recover is not None:
+            recovered = recover()
+            if recovered is not None:
+                return _json_response(url, recovered)
+        if hasattr(data, 'seek'):
+            data.seek(position)
+
+
+def _flight_key(url, kwargs):
+    full_url = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+    headers = tuple(sorted((kwargs.get('headers') or {}).items()))
+    return full_url, headers
+
+
+def _share(response):
+    """Prepare a response to be handed to several callers: read its body
+    now, and decode its JSON only once however many callers ask for it.
+    """
+    response.content
+    decode = response.json
+    decoded = []
+
+    def json_once(**kwargs):
+        if kwargs:
+            return decode(**kwargs)
+        if not decoded:
+            decoded.append(decode())
+        return decoded[0]
+
+    response.json = json_once
+    return response
+
+
+def request(method, url, retry=None, idempotent=None, recover=None,
+            cache=False, coalesce=True, **kwargs):
+    """Send a request through the shared session. Takes the same keyword
+    arguments as requests.request; authentication is added automatically.
+
+    If cache is True and method is GET, the response is stored in and
+    revalidated against the shared on-disk cache.
+
+    Unless coalesce is False, a GET that is identical to one already in
+    flight from another thread waits for that one and shares its response,
+    including its decoded JSON. Callers must not modify the shared JSON.
+
+    Transient failures are retried according to retry, a RetryPolicy that
+    defaults to retry.DEFAULT_POLICY. Methods other than GET, HEAD, OPTIONS,
+    PUT and DELETE, and genome upload PUTs, are only retried if idempotent
+    is True, or if recover is given: a callable that returns the JSON result
+    of an earlier attempt that took effect, or None if the request should be
+    sent again.
+    """
+    is_get = method.upper() == 'GET' and not kwargs.get('stream')
+
+    def send():
+        if cache and is_get:
+            return _cached_get(url, retry, kwargs)
+        return _send_with_retries(method, url, retry, idempotent, recover, kwargs)
+
+    if coalesce and is_get and kwargs.get('data') is None:
+        return _flights.do(_flight_key(url, kwargs), lambda: _share(send()))
+    return send()
+
+
+def _write_metrics():
+    format = os.environ.get('OMICIA_API_METRICS')
+    path = os.environ.get('OMICIA_API_METRICS_FILE')
+    if path:
+        with open(path, 'w') as f:
+            _metrics.write(f, format)
+    else:
+        _metrics.write(sys.stderr, format)
+
+
+if os.environ.get('OMICIA_API_METRICS'):
+    atexit.register(_write_metrics)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
@@ -0,0 +1,218 @@
+"""Fetching a report's variants in genomic shards and merging them back.
+
+A whole-genome report's variants can take minutes to produce as a single
+response. genome_shards() splits the genome into one range query per
+chromosome, or into windows of a fixed number of bases, and fetch_shards()
+runs the queries concurrently. Each shard's lines are sorted by position
+in runs of at most RUN_LINES lines, each spilled to a temporary file and
+then merged into one sorted file per shard, so memory use is bounded by the
+number of shards being fetched at the time, not by the size of the report
+or of any one shard. merge_shards() then k-way merges the shard files into
+coordinate order.
+
+Lines are sorted by a fixed-width text key prefixed to each one (see
+sort_key()), so that the merge compares plain strings.
+"""
+
+import heapq
+import tempfile
+import threading
+
+CHROMOSOMES = [str(n) for n in range(1, 23)] + ['X', 'Y', 'M']
+
+# Chromosome lengths of the hg19 assembly, which uploads use
+HG19_LENGTHS = {
+    '1': 249250621, '2': 243199373, '3': 198022430, '4': 191154276,
+    '5': 180915260, '6': 171115067, '7': 159138663, '8': 146364022,
+    '9': 141213431, '10': 135534747, '11': 135006516, '12': 133851895,
+    '13': 115169878, '14': 107349540, '15': 102531392, '16': 90354753,
+    '17': 81195210, '18': 78077248, '19': 59128983, '20': 63025520,
+    '21': 48129895, '22': 51304566, 'X': 155270560, 'Y': 59373566,
+    'M': 16571}
+
+DEFAULT_WORKERS = 8
+
+# Lines of a shard sorted in memory at a time before being spilled to disk
+RUN_LINES = 100000
+
+
+def chrom_rank(chrom):
+    """Return the place of a chromosome in coordinate order, accepting
+    names with or without a chr prefix. Unknown names sort last.
+    """
+    name = str(chrom)
+    if name.lower().startswith('chr'):
+        name = name[3:]
+    name = name.upper()
+    if name == 'MT':
+        name = 'M'
+    try:
+        return CHROMOSOMES.index(name)
+    except ValueError:
+        return len(CHROMOSOMES)
+
+
+class Shard(object):
+    """A range query: a chromosome, or the bases start to end of one.
+    """
+
+    def __init__(self, index, chrom, start=None, end=None):
+        self.index = index
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+
+    def contains(self, position):
+        """Return whether a variant starting at position belongs to this
+        shard, so that one overlapping two windows is only kept once.
+        """
+        if not position:
+            return True
+        return ((self.start is None or position >= self.start) and
+                (self.end is None or position <= self.end))
+
+    def __str__(self):
+        if self.start is None and self.end is None:
+            return 'chromosome {}'.format(self.chrom)
+        return '{}:{}-{}'.format(self.chrom, self.start or 1, self.end or '')
+
+
+def genome_shards(window=None, chroms=None, start=None, end=None, lengths=HG19_LENGTHS):
+    """Return the shards covering chroms (all chromosomes by default), one
+    per chromosome or, if window is given, one per window bases of each.
+    start and end, if given, limit every shard to those bases. lengths only
+    decides how many windows there are: the last window of a chromosome is
+    left open-ended unless end is given, so that no variant is missed on an
+    assembly whose chromosomes are longer.
+    """
+    shards = []
+    for chrom in chroms or CHROMOSOMES:
+        if not window or chrom not in lengths:
+            shards.append(Shard(len(shards), chrom, start, end))
+            continue
+        last = end or lengths[chrom]
+        if end is None and start is not None and start > last:
+            # Past the known end of the chromosome, which may be longer on
+            # another assembly
+            shards.append(Shard(len(shards), chrom, start, None))
+            continue
+        for first in range(start or 1, last + 1, window):
+            shard_end = first + window - 1
+            if shard_end >= last:
+                shard_end = end
+            shards.append(Shard(len(shards), chrom, first, shard_end))
+    return shards
+
+
+def sort_key(chrom, position, shard, sequence):
+    """Return a text key that sorts lines by chromosome and position, then
+    by shard and by their order in the shard's response.
+    """
+    return '{:03d}\t{:012d}\t{:06d}\t{:012d}\t'.format(
+        chrom_rank(chrom), position or 0, shard.index, sequence)
+
+
+def _spill(lines):
+    lines.sort()
+    run = tempfile.TemporaryFile(mode='w+')
+    run.writelines(lines)
+    run.seek(0)
+    return run
+
+
+def _spool(shard, fetch, run_lines=RUN_LINES):
+    """Return the header of a shard and a file of its lines in sorted
+    order, holding no more than run_lines of them in memory at a time.
+    """
+    header = []
+    lines = []
+    runs = []
+    try:
+        for item in fetch(shard, header):
+            lines.append(item)
+            if len(lines) >= run_lines:
+                runs.append(_spill(lines))
+                lines = []
+        if not runs:
+            return header, _spill(lines)
+        if lines:
+            runs.append(_spill(lines))
+        spool = tempfile.TemporaryFile(mode='w+')
+        spool.writelines(heapq.merge(*runs))
+        spool.seek(0)
+        return header, spool
+    finally:
+        for run in runs:
+            run.close()
+
+
+def map_shards(shards, function, workers=DEFAULT_WORKERS):
+    """Return [function(shard) for shard in shards], calling it for up to
+    workers shards at a time. An error in any shard is raised, as an
+    IOError naming the shard, once the others have finished.
+    """
+    results = [None] * len(shards)
+    errors = []
+    pending = iter(range(len(shards)))
+    pending_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with pending_lock:
+                index = next(pending, None)
+            if index is None or errors:
+                return
+            try:
+                results[index] = function(shards[index])
+            except Exception as e:
+                errors.append((shards[index], e))
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(max(1, min(workers, len(shards))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        shard, error = errors[0]
+        raise IOError('{}: {}'.format(shard, error))
+    return results
+
+
+def fetch_shards(shards, fetch, workers=DEFAULT_WORKERS):
+    """Run fetch(shard, header) for every shard, up to workers at a time.
+
+    fetch yields the shard's lines, each prefixed with its sort_key() and
+    ending with a newline, and may append lines that belong before all of
+    the variants (such as a VCF header) to the header list. Returns the
+    header of the first shard that has one and the sorted shard files.
+    Errors are raised as by map_shards().
+    """
+    spooled = []
+
+    def spool(shard):
+        result = _spool(shard, fetch)
+        spooled.append(result[1])
+        return result
+
+    try:
+        results = map_shards(shards, spool, workers)
+    except IOError:
+        for spool_file in spooled:
+            spool_file.close()
+        raise
+    header = next((header for header, _ in results if header), [])
+    return header, [spool_file for _, spool_file in results]
+
+
+def merge_shards(spools):
+    """Yield the lines of the sorted shard files in key order, without
+    their keys, closing the files at the end.
+    """
+    try:
+        for line in heapq.merge(*spools):
+            yield line.split('\t', 4)[4]
+    finally:
+        for spool in spools:
+            spool.close()
@@ -0,0 +1,149 @@
+"""A local snapshot of a report's variants, kept up to date shard by shard.
+
+VariantSnapshot holds the variants of a report as they were last fetched,
+grouped by the shard (see client.shards) they were fetched in, along with
+what is needed to tell whether a shard has changed: the ETag and
+Last-Modified headers of its response, for a conditional request that
+spares the download when the server answers 304 Not Modified, and a digest
+of its body. From servers that answer every request in full the digest
+saves no transfer; it only spares comparing an unchanged shard variant by
+variant.
+
+apply() takes a shard's new variants and returns the changes from the
+snapshot, one dict per variant that was added, changed or removed:
+
+    {"change": "added", "id": 12, "variant": {...}}
+    {"change": "changed", "id": 12, "fields": {"status": ["REVIEWED", "CONFIRMED"]},
+     "variant": {...}}
+    {"change": "removed", "id": 12, "variant": {...}}
+
+Variants are matched by their id field; combine_changes() turns the
+removal and addition of a variant that moved between shards into a change.
+The snapshot is a JSON file, by default under ~/.cache/omicia_api_sync,
+written to a temporary file and renamed into place, so an interrupted sync
+leaves the last complete one.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'omicia_api_sync')
+
+
+def variant_id(variant):
+    """Return the key a variant is matched by between syncs.
+    """
+    if variant.get('id') is not None:
+        return str(variant['id'])
+    return json.dumps(variant, sort_keys=True)
+
+
+def changed_fields(old, new):
+    """Return {field: [old value, new value]} for the fields that differ.
+    """
+    return dict((name, [old.get(name), new.get(name)])
+                for name in set(old) | set(new) if old.get(name) != new.get(name))
+
+
+def combine_changes(changes):
+    """Merge each pair of a removal and an addition of the same variant, as
+    happens when it moves to another shard, into one change.
+    """
+    removed = dict((variant_id(change['variant']), change) for change in changes
+                   if change['change'] == 'removed')
+    combined = []
+    for change in changes:
+        key = variant_id(change['variant'])
+        if change['change'] == 'added' and key in removed:
+            old = removed.pop(key)['variant']
+            if old != change['variant']:
+                combined.append({'change': 'changed', 'id': change['id'],
+                                 'fields': changed_fields(old, change['variant']),
+                                 'variant': change['variant']})
+        elif change['change'] != 'removed':
+            combined.append(change)
+    return combined + [change for change in changes
+                       if change['change'] == 'removed' and
+                       variant_id(change['variant']) in removed]
+
+
+class VariantSnapshot(object):
+    """The variants of one report, by shard, persisted to a JSON file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._shards = json.load(f)['shards']
+        except (IOError, OSError, ValueError, KeyError):
+            self._shards = {}
+
+    def validators(self, shard):
+        """Return the conditional request headers that revalidate a shard.
+        """
+        with self._lock:
+            entry = self._shards.get(str(shard), {})
+        validators = {}
+        if entry.get('etag'):
+            validators['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            validators['If-Modified-Since'] = entry['last_modified']
+        return validators
+
+    def digest(self, shard):
+        with self._lock:
+            return self._shards.get(str(shard), {}).get('digest')
+
+    def apply(self, shard, variants, headers=None, digest=None):
+        """Replace a shard's variants with new ones, remembering the response
+        headers and body digest they came with, and return the changes.
+        """
+        headers = headers or {}
+        new = dict((variant_id(variant), variant) for variant in variants)
+        with self._lock:
+            entry = self._shards.get(str(shard), {})
+            old = entry.get('variants', {})
+            self._shards[str(shard)] = {'index': shard.index,
+                                        'etag': headers.get('ETag'),
+                                        'last_modified': headers.get('Last-Modified'),
+                                        'digest': digest,
+                                        'variants': new}
+        changes = []
+        for key, variant in new.items():
+            if key not in old:
+                changes.append({'change': 'added', 'id': variant.get('id'), 'variant': variant})
+            elif old[key] != variant:
+                changes.append({'change': 'changed', 'id': variant.get('id'),
+                                'fields': changed_fields(old[key], variant), 'variant': variant})
+        for key, variant in old.items():
+            if key not in new:
+                changes.append({'change': 'removed', 'id': variant.get('id'), 'variant': variant})
+        return changes
+
+    def retain(self, shards):
+        """Drop the shards that are not among shards, returning the removal
+        of their variants as changes.
+        """
+        keep = set(str(shard) for shard in shards)
+        changes = []
+        with self._lock:
+            for key in list(self._shards):
+                if key not in keep:
+                    for variant in self._shards.pop(key)['variants'].values():
+                        changes.append({'change': 'removed', 'id': variant.get('id'),
+                                        'variant': variant})
+        return changes
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with self._lock:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'shards': self._shards}, f)
+        os.rename(temp_path, self.path)
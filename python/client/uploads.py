@@ -0,0 +1,259 @@
+"""Run many genome uploads at once, with progress reporting.
+
+upload_all() hands each job to a pool of worker threads, prints a progress
+line per file as its bytes are sent, and returns the results in the order
+the jobs were given, whatever order the uploads finished in. An upload that
+raises does not stop the others; its result is an error object instead.
+
+Given an UploadLedger and the project id, upload_all() first hashes the
+files and skips any whose contents were already uploaded to that project,
+returning the genome JSON recorded for them instead.
+
+With largest_first, the files are started in order of decreasing size:
+each worker takes the largest file left as soon as it is free, so the small
+files fill in around the large ones rather than a few large files being
+left to upload one per worker at the end. With bandwidth, the uploads
+together send no more than that many bytes per second (of the files as
+read, before any compression), to leave room on a shared link.
+
+put_genome() sends a single genome file with PUT, as every upload script
+does: straight from the page cache if it is sent as it is, or bgzipped on
+the way if compress is given.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from . import session
+from .compression import BgzipReader, is_compressed
+from .limiter import TokenBucket
+from .vcf import ValidatingReader, VcfValidator
+from .zerocopy import FileBody
+
+DEFAULT_WORKERS = 4
+
+# Report progress each time a file passes another multiple of this fraction
+PROGRESS_STEP = 0.1
+
+# Seconds' worth of bytes that a bandwidth cap lets through in one burst
+BANDWIDTH_BURST = 0.25
+
+
+def format_bytes(n):
+    return '{:.1f} MB'.format(n / (1024.0 * 1024))
+
+
+class ProgressReader(object):
+    """Wrap a binary file object and call callback(bytes_read) as it is
+    read. Seeking is passed through, so requests can still measure the file
+    and the client can rewind it for a retry.
+    """
+
+    def __init__(self, fileobj, callback, chunk_size=1024 * 1024):
+        self._file = fileobj
+        self._callback = callback
+        self.chunk_size = chunk_size
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self._callback(self._file.tell())
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+
+class Progress(object):
+    """Thread-safe progress and summary reporting for a batch of files.
+    """
+
+    def __init__(self, total_files, out=sys.stderr, bandwidth=None):
+        self.total_files = total_files
+        # Shared by all the files, so that together they keep to bandwidth
+        self.bucket = None
+        if bandwidth:
+            self.bucket = TokenBucket(bandwidth, bandwidth * BANDWIDTH_BURST)
+        self.out = out
+        self.started = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bytes_total = 0
+        self._lock = threading.Lock()
+
+    def _write(self, line):
+        with self._lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def tracker(self, name, size):
+        """Return a callback for ProgressReader that reports name's progress
+        every PROGRESS_STEP of size, and holds the upload back while the
+        bandwidth cap has been used up.
+        """
+        state = {'step': 0, 'position': 0}
+
+        def update(position):
+            if self.bucket is not None and position > state['position']:
+                self.bucket.take(position - state['position'])
+            state['position'] = position
+            if not size:
+                return
+            step = int(min(position, size) / float(size) / PROGRESS_STEP)
+            if step > state['step']:
+                state['step'] = step
+                self._write('  {}: {}% of {}'.format(
+                    name, int(step * PROGRESS_STEP * 100), format_bytes(size)))
+        return update
+
+    def finished(self, name, size, error=None, skipped=False):
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+            elif error is None:
+                self.completed += 1
+                self.bytes_total += size
+            else:
+                self.failed += 1
+            done = self.completed + self.failed + self.skipped
+        if skipped:
+            self._write('[{}/{}] Skipped {}, already uploaded'.format(
+                done, self.total_files, name))
+        elif error is None:
+            self._write('[{}/{}] Uploaded {}'.format(done, self.total_files, name))
+        else:
+            self._write('[{}/{}] Failed {}: {}'.format(done, self.total_files, name, error))
+
+    def summary(self):
+        elapsed = time.time() - self.started
+        rate = self.bytes_total / elapsed if elapsed else 0
+        return ('Uploaded {} of {} files ({} skipped, {} failed), {} in {:.1f}s ({}/s)'.format(
+            self.completed, self.total_files, self.skipped, self.failed,
+            format_bytes(self.bytes_total), elapsed, format_bytes(rate)))
+
+
+def genome_id(result):
+    """Return the id of the genome an upload created, or None if the result
+    is not a genome. The API names it genome_id in some responses and id in
+    others.
+    """
+    if not isinstance(result, dict):
+        return None
+    return result.get('genome_id', result.get('id'))
+
+
+def file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def put_genome(url, file_name, progress=None, compress=False, validate=False, **kwargs):
+    """PUT the genome file file_name to url, a genome upload URL, and return
+    the response. If compress is True and the file is not compressed
+    already, it is bgzipped while it is sent, and url is given
+    format=vcf.gz. If validate is True, the vcf is checked as it is sent and
+    a VcfError is raised as soon as it is found to be invalid. progress is
+    called as for ProgressReader; other keyword arguments (verify, recover)
+    are passed to client.put().
+    """
+    if not (compress and not is_compressed(file_name)):
+        # Sent straight from the page cache, without reading it into Python
+        validator = VcfValidator(file_name) if validate else None
+        with FileBody(file_name, progress=progress, validator=validator) as body:
+            return session.put(url, data=body, **kwargs)
+
+    url = "{}{}format=vcf.gz".format(url, '&' if '?' in url else '?')
+    with open(file_name, 'rb') as file_handle:
+        if validate:
+            file_handle = ValidatingReader(file_handle, file_name)
+        if progress is not None:
+            file_handle = ProgressReader(file_handle, progress)
+        body = BgzipReader(file_handle)
+        try:
+            return session.put(url, data=body, **kwargs)
+        finally:
+            body.close()
+
+
+def upload_all(jobs, upload, workers=DEFAULT_WORKERS, out=sys.stderr,
+               ledger=None, project_id=None, on_done=None, largest_first=False,
+               bandwidth=None):
+    """Upload every job with up to workers uploads in flight.
+
+    jobs is a list of (file_path, job) pairs, and upload(job, progress) is
+    called for each one; it should wrap the file it opens in
+    ProgressReader(file_handle, progress) and return the API's JSON result.
+    If a ledger is given, files already uploaded to project_id are skipped
+    and new uploads are recorded in it. If on_done is given, it is called
+    with each job's index and result as soon as that job finishes, from
+    the worker thread that ran it. If largest_first is True, the largest
+    files are started first, and if bandwidth is given, the uploads
+    together read no more than that many bytes per second.
+    Returns the results in the same order as jobs.
+    """
+    digests = {}
+    if ledger is not None:
+        digests = ledger.digests(file_path for file_path, _ in jobs)
+    progress = Progress(len(jobs), out, bandwidth)
+
+    def run(file_path, job):
+        name = os.path.basename(file_path)
+        sha256 = digests.get(file_path)
+        if sha256 is not None:
+            genome = ledger.lookup(sha256, project_id)
+            if genome is not None:
+                progress.finished(name, 0, skipped=True)
+                return genome
+        size = 0
+        try:
+            size = os.path.getsize(file_path)
+            result = upload(job, progress.tracker(name, size))
+        except Exception as e:
+            progress.finished(name, size, e)
+            return {'file': name, 'error': str(e)}
+        progress.finished(name, size)
+        if sha256 is not None and genome_id(result) is not None:
+            ledger.record(sha256, project_id, result)
+        return result
+
+    order = list(range(len(jobs)))
+    if largest_first:
+        sizes = [file_size(file_path) for file_path, _ in jobs]
+        order.sort(key=lambda index: sizes[index], reverse=True)
+    results = [None] * len(jobs)
+    pending = iter(order)
+    pending_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with pending_lock:
+                index = next(pending, None)
+            if index is None:
+                return
+            results[index] = run(*jobs[index])
+            if on_done is not None:
+                on_done(index, results[index])
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(max(1, min(workers, len(jobs))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    progress._write(progress.summary())
+    return results
@@ -0,0 +1,378 @@
+"""A local columnar store of report variants, keyed by report and version.
+
+Downstream analyses of a report read the same variants again and again.
+VariantStore keeps the variants of each report on disk, one file per
+field, under a directory named after the report id, its version (the
+version field of GET /reports/{id}/) and the query the variants were
+fetched with. Opening a stored report maps its column files with mmap, so a
+repeat analysis starts at once and only reads the pages of the columns it
+uses. A report is fetched again only when its version changes, and the
+directories of its older versions are removed then.
+
+Columns are stored as Arrow-like buffers, so that nothing needs installing.
+The files of the nth column listed in meta.json are:
+
+    c<n>.values     int64, float64 or int8 (bool) little-endian values; or
+                    the utf-8 bytes of every string (str and json columns)
+    c<n>.offsets    str and json columns: int64 start of each row's string,
+                    plus one for the end
+    c<n>.valid      one byte per row: 1 where the row has a value, 2 where
+                    it is null and 0 where the variant has no such field;
+                    only written for columns with null or missing values
+
+A column of strings is 'str', and one of lists, objects or of mixed types
+is 'json', each row stored as JSON text. A column of both ints and floats
+is 'json' too, so that every value reads back with the type it was stored
+with and iter_rows() returns the variants exactly as they were given.
+meta.json lists the columns and their types and is written last; a
+directory is renamed into place once complete, so readers never see a
+partial report. Column.array() returns a NumPy view of a numeric column's
+mapping, if NumPy is installed.
+"""
+
+import array
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_STORE_DIR = os.environ.get(
+    'OMICIA_API_VARIANT_STORE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'omicia_api_variants'))
+
+# Stores written in another layout are fetched again rather than read
+FORMAT = 2
+
+# States of a row in a column's .valid file
+MISSING, PRESENT, NULL = 0, 1, 2
+
+# array typecodes and NumPy dtypes of the numeric column types
+TYPECODES = {'int64': 'q', 'float64': 'd', 'bool': 'b'}
+DTYPES = {'int64': '<i8', 'float64': '<f8', 'bool': '<i1'}
+
+try:
+    STRING_TYPES = (str, unicode)
+except NameError:
+    STRING_TYPES = (str,)
+
+
+def _value_type(value):
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int) or type(value).__name__ == 'long':
+        return 'int64' if -2 ** 63 <= value < 2 ** 63 else 'json'
+    if isinstance(value, float):
+        return 'float64'
+    if isinstance(value, STRING_TYPES):
+        return 'str'
+    return 'json'
+
+
+def _combined_type(current, new):
+    if current is None or current == new:
+        return new
+    return 'json'
+
+
+def _to_little_endian(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class _ColumnWriter(object):
+    """Writes one column's files as rows are added, a block at a time.
+    """
+
+    BLOCK_ROWS = 65536
+
+    def __init__(self, path, column_type):
+        self.path = path
+        self.type = column_type
+        self._values_file = open(path + '.values', 'wb')
+        self._offsets_file = None
+        self._end = 0
+        if column_type in TYPECODES:
+            self._convert = float if column_type == 'float64' else int
+            self._block = array.array(TYPECODES[column_type])
+        else:
+            self._offsets_file = open(path + '.offsets', 'wb')
+            self._block = array.array('q', [0])
+        self._valid = bytearray()
+
+    def append(self, value, present=True):
+        if value is not None:
+            self._valid.append(PRESENT)
+        else:
+            self._valid.append(NULL if present else MISSING)
+        if self._offsets_file is None:
+            self._block.append(0 if value is None else self._convert(value))
+        else:
+            if value is not None:
+                if self.type == 'json':
+                    value = json.dumps(value)
+                data = value.encode('utf-8')
+                self._values_file.write(data)
+                self._end += len(data)
+            self._block.append(self._end)
+        if len(self._block) >= self.BLOCK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        _to_little_endian(self._block).tofile(self._offsets_file or self._values_file)
+        del self._block[:]
+
+    def close(self):
+        self._flush()
+        self._values_file.close()
+        if self._offsets_file is not None:
+            self._offsets_file.close()
+        if self._valid.count(PRESENT) != len(self._valid):
+            with open(self.path + '.valid', 'wb') as f:
+                f.write(bytes(self._valid))
+
+
+def _map(path):
+    """Map a file read-only, or return an empty buffer for an empty one.
+    """
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _typed(buffer, typecode):
+    """Return the values of a little-endian buffer indexed as typecode,
+    without copying where possible.
+    """
+    if sys.byteorder == 'little':
+        try:
+            return memoryview(buffer).cast(typecode)
+        except (AttributeError, TypeError):
+            pass
+    values = array.array(typecode)
+    getattr(values, 'frombytes', getattr(values, 'fromstring', None))(buffer[:])
+    return _to_little_endian(values)
+
+
+class Column(object):
+    """One column of a stored report: a sequence of its rows' values, with
+    None where a row's value is null or missing.
+    """
+
+    def __init__(self, path, name, column_type, rows):
+        self.name = name
+        self.type = column_type
+        self.rows = rows
+        self._values = _map(path + '.values')
+        self._valid = _map(path + '.valid') if os.path.exists(path + '.valid') else None
+        if column_type in TYPECODES:
+            self._items = _typed(self._values, TYPECODES[column_type])
+            self._offsets = None
+        else:
+            self._items = None
+            self._offsets = _typed(_map(path + '.offsets'), 'q')
+
+    def __len__(self):
+        return self.rows
+
+    def state(self, row):
+        """Return PRESENT, NULL or MISSING for a row.
+        """
+        if self._valid is None:
+            return PRESENT
+        return bytearray(self._valid[row:row + 1])[0]
+
+    def is_valid(self, row):
+        return self.state(row) == PRESENT
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError(row)
+        if not self.is_valid(row):
+            return None
+        if self.type == 'bool':
+            return bool(self._items[row])
+        if self._items is not None:
+            return self._items[row]
+        value = self._values[self._offsets[row]:self._offsets[row + 1]].decode('utf-8')
+        return json.loads(value) if self.type == 'json' else value
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+    def array(self):
+        """Return a read-only NumPy array over the mapped values of a numeric
+        column (missing values read as 0). Raises ValueError for str and
+        json columns, or if NumPy is not installed.
+        """
+        if numpy is None:
+            raise ValueError('NumPy is not installed')
+        if self.type not in DTYPES:
+            raise ValueError('{} is a {} column'.format(self.name, self.type))
+        if not self.rows:
+            return numpy.zeros(0, dtype=DTYPES[self.type])
+        return numpy.frombuffer(self._values, dtype=DTYPES[self.type], count=self.rows)
+
+
+class VariantTable(object):
+    """The stored variants of one report version.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.version = self.meta['version']
+        self.rows = self.meta['rows']
+        self.names = [name for name, _ in self.meta['columns']]
+        # Column files are named by position, since field names need not
+        # be valid file names
+        self._types = dict((name, (index, column_type)) for index, (name, column_type)
+                           in enumerate(self.meta['columns']))
+        self._columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """Return the named Column, mapping its files the first time.
+        """
+        if name not in self._columns:
+            if name not in self._types:
+                raise KeyError(name)
+            index, column_type = self._types[name]
+            path = os.path.join(self.directory, 'c{}'.format(index))
+            self._columns[name] = Column(path, name, column_type, self.rows)
+        return self._columns[name]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def iter_rows(self, names=None):
+        """Yield each variant as a dict of the named fields (all by default),
+        with the fields that were null as None, leaving out the fields the
+        variant did not have.
+        """
+        columns = [self.column(name) for name in names or self.names]
+        for row in range(self.rows):
+            variant = {}
+            for column in columns:
+                if column.state(row) != MISSING:
+                    variant[column.name] = column[row]
+            yield variant
+
+
+def _safe(name):
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(name))
+
+
+class VariantStore(object):
+    """Stored report variants in a directory, one subdirectory per report,
+    version and query.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR):
+        self.directory = directory
+
+    @staticmethod
+    def query_key(params):
+        """Return a short key for the query parameters variants are fetched
+        with, so that differently filtered fetches are stored apart.
+        """
+        text = json.dumps(sorted([list(pair) for pair in params or []]))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+    def _prefix(self, cr_id, query):
+        return '{}-{}-'.format(_safe(cr_id), query)
+
+    def path(self, cr_id, version, query=''):
+        return os.path.join(self.directory, self._prefix(cr_id, query) + _safe(version))
+
+    def open(self, cr_id, version, query=''):
+        """Return the stored VariantTable of this report version, or None.
+        """
+        path = self.path(cr_id, version, query)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        try:
+            table = VariantTable(path)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        return table if table.meta.get('format') == FORMAT else None
+
+    def write(self, cr_id, version, variants, query=''):
+        """Store variants (an iterable of dicts) as this report version,
+        replacing the stored older versions, and return its VariantTable.
+
+        The variants are spooled to a file as JSON lines while the column
+        types are worked out, then written a column block at a time, so
+        that storing a large report does not hold it in memory.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temp_path = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            types = {}
+            names = []
+            rows = 0
+            with tempfile.TemporaryFile(mode='w+', dir=temp_path) as spool:
+                for variant in variants:
+                    for name, value in variant.items():
+                        if name not in types:
+                            types[name] = None
+                            names.append(name)
+                        if value is not None:
+                            types[name] = _combined_type(types[name], _value_type(value))
+                    spool.write(json.dumps(variant) + '\n')
+                    rows += 1
+                spool.seek(0)
+                columns = [(name, types[name] or 'json') for name in names]
+                writers = [_ColumnWriter(os.path.join(temp_path, 'c{}'.format(index)), column_type)
+                           for index, (_, column_type) in enumerate(columns)]
+                for line in spool:
+                    variant = json.loads(line)
+                    for name, writer in zip(names, writers):
+                        writer.append(variant.get(name), name in variant)
+                for writer in writers:
+                    writer.close()
+            meta = {'format': FORMAT, 'cr_id': cr_id, 'version': version, 'query': query,
+                    'rows': rows, 'columns': columns}
+            with open(os.path.join(temp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            path = self.path(cr_id, version, query)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.rename(temp_path, path)
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+        self._remove_other_versions(cr_id, version, query)
+        return VariantTable(path)
+
+    def _remove_other_versions(self, cr_id, version, query):
+        prefix = self._prefix(cr_id, query)
+        keep = os.path.basename(self.path(cr_id, version, query))
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name != keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def get(self, cr_id, version, fetch, query=''):
+        """Return the stored VariantTable of this report version, storing
+        the variants yielded by fetch() first if it is not stored yet.
+        """
+        table = self.open(cr_id, version, query)
+        if table is None:
+            table = self.write(cr_id, version, fetch(), query)
+        return table
@@ -0,0 +1,269 @@
+"""Streaming validation of VCF files, so that a genome the API would reject
+is caught before hours are spent uploading it.
+
+VcfValidator is fed a file's bytes in pieces, as they are read, and checks
+them in one pass with bounded memory: the ##fileformat line, the #CHROM
+header and its sample count, that every record has the header's number of
+columns, a numeric POS, a REF of bases and an ALT, that each contig's
+records are together and sorted by position. Plain, gzip (including bgzip)
+and bzip2 compressed files are told apart by their first bytes.
+
+ValidatingReader tees the validation off the reads of an upload: wrapped
+around the file handle given to client.put, it raises VcfError from read()
+at the first fatal problem, which aborts the PUT partway through.
+"""
+
+import bz2
+import re
+import sys
+import zlib
+
+FIXED_COLUMNS = [b'#CHROM', b'POS', b'ID', b'REF', b'ALT', b'QUAL', b'FILTER', b'INFO']
+
+# Longest line accepted, so that a file without newlines cannot use up memory
+MAX_LINE_LENGTH = 64 * 1024 * 1024
+
+MAX_WARNINGS = 10
+
+BASES = re.compile(b'^[ACGTNacgtn]+$')
+
+CONTIG_ID = re.compile(b'^##contig=<ID=([^,>]+)')
+
+
+class VcfError(ValueError):
+    """A VCF file the API would reject.
+    """
+
+
+class _MultiStream(object):
+    """Decompress a series of concatenated gzip or bzip2 streams, as bgzip
+    and parallel compressors write them.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._decompressor = factory()
+
+    def decompress(self, data):
+        parts = []
+        while data:
+            if self.finished(False):
+                self._decompressor = self._factory()
+            parts.append(self._decompressor.decompress(data))
+            data = self._decompressor.unused_data
+            if data:
+                self._decompressor = self._factory()
+        return b''.join(parts)
+
+    def finished(self, default=True):
+        return getattr(self._decompressor, 'eof', default)
+
+
+def _gzip():
+    # wbits of 16 + MAX_WBITS reads the gzip container
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class VcfValidator(object):
+    """Check a VCF file fed to it a piece at a time. feed() and close()
+    raise VcfError on the first fatal problem; warnings are written to out.
+    """
+
+    def __init__(self, name='VCF', expected_samples=None, out=sys.stderr):
+        self.name = name
+        self.expected_samples = expected_samples
+        self.out = out
+        self.reset()
+
+    def reset(self):
+        self._start = b''
+        self._decompressor = None
+        self._partial = b''
+        self._chrom = None
+        self._pos = 0
+        self._seen = set()
+        self._warned_contigs = set()
+        self.contigs = []
+        self.columns = None
+        self.samples = None
+        self.line_number = 0
+        self.records = 0
+        self.warnings = 0
+
+    def _fail(self, message):
+        raise VcfError('{}: line {}: {}'.format(self.name, self.line_number, message))
+
+    def _warn(self, message):
+        self.warnings += 1
+        if self.warnings <= MAX_WARNINGS:
+            self.out.write('{}: line {}: warning: {}\n'.format(
+                self.name, self.line_number, message))
+        elif self.warnings == MAX_WARNINGS + 1:
+            self.out.write('{}: further warnings not shown\n'.format(self.name))
+
+    def feed(self, data, final=False):
+        if self._decompressor is None:
+            # Wait for enough of the file to recognise its compression
+            self._start += data
+            if len(self._start) < 3 and not final:
+                return
+            data, self._start = self._start, b''
+            if data.startswith(b'\x1f\x8b'):
+                self._decompressor = _MultiStream(_gzip)
+            elif data.startswith(b'BZh'):
+                self._decompressor = _MultiStream(bz2.BZ2Decompressor)
+            else:
+                self._decompressor = False
+        if self._decompressor:
+            try:
+                data = self._decompressor.decompress(data)
+            except (zlib.error, IOError, OSError, EOFError) as e:
+                self._fail('cannot be decompressed ({})'.format(e))
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        if len(self._partial) > MAX_LINE_LENGTH:
+            self._fail('line is longer than {} bytes'.format(MAX_LINE_LENGTH))
+        for line in lines:
+            self._check_line(line)
+
+    def close(self):
+        """Check the end of the file, once all of it has been fed.
+        """
+        if self._decompressor is None:
+            self.feed(b'', final=True)
+        if self._decompressor and not self._decompressor.finished():
+            self._fail('compressed data ends early, the file is truncated')
+        if self._partial:
+            self._check_line(self._partial)
+            self._partial = b''
+        if self.columns is None:
+            self._fail('no #CHROM header line')
+        if not self.records:
+            self._warn('no variant records')
+
+    def _check_line(self, line):
+        self.line_number += 1
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        if self.line_number == 1 and not line.startswith(b'##fileformat=VCF'):
+            self._fail('does not start with a ##fileformat=VCF line')
+        if line.startswith(b'##'):
+            if self.columns is not None:
+                self._fail('meta-information line after the #CHROM header')
+            contig = CONTIG_ID.match(line)
+            if contig:
+                self.contigs.append(contig.group(1))
+        elif line.startswith(b'#'):
+            self._check_header(line)
+        elif line:
+            self._check_record(line)
+
+    def _check_header(self, line):
+        if self.columns is not None:
+            self._fail('second #CHROM header line')
+        columns = line.split(b'\t')
+        if columns[:8] != FIXED_COLUMNS:
+            self._fail('header columns must start with {}'.format(
+                ' '.join(c.decode('ascii') for c in FIXED_COLUMNS)))
+        if len(columns) > 8 and columns[8] != b'FORMAT':
+            self._fail('ninth header column must be FORMAT')
+        self.columns = len(columns)
+        self.samples = max(0, len(columns) - 9)
+        if not self.samples:
+            self._fail('no sample columns, so it has no genotypes')
+        if self.expected_samples is not None and self.samples != self.expected_samples:
+            self._fail('{} samples, expected {}'.format(self.samples, self.expected_samples))
+
+    def _check_record(self, line):
+        if self.columns is None:
+            self._fail('record before the #CHROM header line')
+        columns = line.count(b'\t') + 1
+        if columns != self.columns:
+            self._fail('{} columns, the header has {}'.format(columns, self.columns))
+        chrom, pos, _, ref, alt, qual = line.split(b'\t', 6)[:6]
+        try:
+            pos = int(pos)
+        except ValueError:
+            pos = -1
+        if pos < 0:
+            self._fail('POS is not a position')
+        if not BASES.match(ref):
+            self._fail('REF is not a sequence of bases')
+        if not alt:
+            self._fail('ALT is empty')
+        if qual != b'.':
+            try:
+                float(qual)
+            except ValueError:
+                self._fail('QUAL is not a number')
+        if chrom != self._chrom:
+            if chrom in self._seen:
+                self._fail('records for contig {} are not together'.format(
+                    chrom.decode('latin-1')))
+            if (self.contigs and chrom not in self._warned_contigs and
+                    chrom not in self.contigs):
+                self._warned_contigs.add(chrom)
+                self._warn('contig {} is not declared in the header'.format(
+                    chrom.decode('latin-1')))
+            self._seen.add(chrom)
+            self._chrom = chrom
+        elif pos < self._pos:
+            self._fail('records are not sorted by position')
+        self._pos = pos
+        self.records += 1
+
+
+class ValidatingReader(object):
+    """Wrap a binary file object, validating the VCF in it as it is read.
+    Seeking back to where it started, as a retried upload does, starts the
+    validation over.
+    """
+
+    def __init__(self, fileobj, name='VCF', expected_samples=None,
+                 chunk_size=1024 * 1024):
+        self._file = fileobj
+        self._start = fileobj.tell()
+        self._closed = False
+        self.validator = VcfValidator(name, expected_samples)
+        self.chunk_size = chunk_size
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        if data:
+            self.validator.feed(data)
+        elif size != 0 and not self._closed:
+            self._closed = True
+            self.validator.close()
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=0):
+        position = self._file.seek(offset, whence)
+        if self._file.tell() == self._start:
+            self._closed = False
+            self.validator.reset()
+        return position
+
+
+def validate_file(file_name, expected_samples=None, chunk_size=1024 * 1024):
+    """Validate a whole VCF file, raising VcfError if it is invalid. Returns
+    the validator, with the sample and record counts.
+    """
+    validator = VcfValidator(file_name, expected_samples)
+    with open(file_name, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            validator.feed(data)
+    validator.close()
+    return validator
@@ -0,0 +1,233 @@
+"""Watching a folder for genome files that have finished being written.
+
+FolderWatcher keeps track of the files in a folder and reports a file as
+stable once its size and modification time have not changed for settle
+seconds, so that a VCF the sequencer is still writing is never picked up.
+
+On Linux it is told about new files straight away by inotify (called
+through ctypes, so nothing needs installing): a file closed after writing
+or moved into the folder is looked at as soon as that happens. inotify
+does not see files written to a network filesystem by other machines, so
+the folder is also listed again every rescan seconds, which is all that is
+done where inotify is not available.
+
+ProcessedFiles is the record, kept in a JSON file, of which files have
+been dealt with, so that a restarted watcher does not upload them again.
+A file that is rewritten (its size or mtime changes) counts as new.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import os
+import select
+import struct
+import tempfile
+import threading
+import time
+
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'omicia_api_watch')
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify(object):
+    """An inotify instance watching one directory. Raises OSError if inotify
+    is not available.
+    """
+
+    def __init__(self, directory, mask=WATCH_MASK):
+        name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        path = os.path.abspath(directory).encode('utf-8')
+        if libc.inotify_add_watch(self.fd, path, mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, 'cannot watch {}'.format(directory))
+
+    def read(self, timeout):
+        """Wait up to timeout seconds for events, and return a list of
+        (mask, name) pairs, or None if the kernel's queue overflowed and
+        events were lost.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            events.append((mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher(object):
+    """Track the files of a folder that accept(name) is True for, and report
+    those that have stopped changing.
+    """
+
+    def __init__(self, folder, accept=None, settle=60, rescan=300, use_inotify=True):
+        self.folder = folder
+        self.accept = accept or (lambda name: True)
+        self.settle = settle
+        self.rescan = rescan
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify(folder)
+            except OSError:
+                pass
+        # name -> (size, mtime, time the file was last seen to change)
+        self._files = {}
+        # name -> (size, mtime) of files that no longer need watching
+        self._forgotten = {}
+        self._scanned = 0
+
+    def _look_at(self, name, now):
+        if name.startswith('.') or not self.accept(name):
+            return
+        try:
+            stat = os.stat(os.path.join(self.folder, name))
+        except OSError:
+            self._files.pop(name, None)
+            return
+        fingerprint = (stat.st_size, stat.st_mtime)
+        if self._forgotten.get(name) == fingerprint:
+            return
+        self._forgotten.pop(name, None)
+        known = self._files.get(name)
+        if known is None or known[:2] != fingerprint:
+            self._files[name] = fingerprint + (now,)
+
+    def scan(self):
+        """List the folder again, noticing new, changed and removed files.
+        """
+        now = time.time()
+        names = set(os.listdir(self.folder))
+        for tracked in (self._files, self._forgotten):
+            for name in list(tracked):
+                if name not in names:
+                    del tracked[name]
+        for name in names:
+            self._look_at(name, now)
+        self._scanned = now
+
+    def wait(self, timeout):
+        """Watch for changes for up to timeout seconds.
+        """
+        if time.time() - self._scanned >= self.rescan:
+            self.scan()
+        if self.inotify is None:
+            time.sleep(timeout)
+            return
+        events = self.inotify.read(timeout)
+        if events is None:
+            self.scan()
+            return
+        now = time.time()
+        for _, name in events:
+            self._look_at(name, now)
+
+    def stable(self):
+        """Return the names of the files that have not changed for settle
+        seconds, oldest first. Each is looked at again first, since changes
+        on a network filesystem are only seen by looking.
+        """
+        now = time.time()
+        for name in list(self._files):
+            self._look_at(name, now)
+        ready = [(since, name) for name, (size, _, since) in self._files.items()
+                 if size and now - since >= self.settle]
+        return [name for _, name in sorted(ready)]
+
+    def fingerprint(self, name):
+        """Return the (size, mtime) last seen for a file.
+        """
+        return self._files[name][:2]
+
+    def forget(self, name):
+        """Stop reporting a file, until it is changed.
+        """
+        known = self._files.pop(name, None)
+        if known is not None:
+            self._forgotten[name] = known[:2]
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+class ProcessedFiles(object):
+    """The files of a folder that have been dealt with, persisted to a JSON
+    file. By default the file is named after the folder and project under
+    ~/.cache/omicia_api_watch.
+    """
+
+    def __init__(self, folder, project_id, path=None):
+        if path is None:
+            identity = '{}\n{}'.format(os.path.abspath(folder), project_id).encode('utf-8')
+            path = os.path.join(DEFAULT_STATE_DIR, hashlib.sha1(identity).hexdigest() + '.json')
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            self._entries = {}
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._entries, f, indent=1)
+        os.rename(temp_path, self.path)
+
+    def done(self, name, fingerprint):
+        """Return whether a file with this (size, mtime) has been processed.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+        return (entry is not None and
+                (entry['size'], entry['mtime']) == tuple(fingerprint))
+
+    def record(self, name, fingerprint, genome_id):
+        with self._lock:
+            self._entries[name] = {'size': fingerprint[0],
+                                   'mtime': fingerprint[1],
+                                   'genome_id': genome_id,
+                                   'processed': time.time()}
+            self._save()
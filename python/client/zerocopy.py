@@ -0,0 +1,191 @@
+"""Sending files as request bodies without copying them through Python.
+
+A file object handed to requests is read in 16 KB blocks, each one a new
+bytes object copied out of the page cache, which shows up as CPU time when
+multi-GB genomes are read from a network filesystem. FileBody instead maps
+the file with mmap and is sent in large memoryview slices of the mapping,
+so the bytes go from the page cache to the socket without being copied by
+Python, over TLS as well as plain HTTP.
+
+Over a plain HTTP connection that goes through connections.WarmHTTPAdapter
+the file is sent with socket.sendfile() (os.sendfile), so that its pages
+never enter the process's buffers on their way out. A validator still gets
+to see every byte: it reads each chunk from the mapping just before that
+chunk is handed to sendfile(). TLS connections, whose encryption happens in
+userspace, fall back to the memoryview slices. Setting OMICIA_API_SENDFILE=0
+turns sendfile off altogether.
+
+Pages of the mapping are released once they have been sent, so uploading a
+large file does not grow the resident size of the process.
+"""
+
+import mmap
+import os
+import socket
+import ssl
+
+SENDFILE = os.environ.get('OMICIA_API_SENDFILE', '1').lower() not in ('0', 'false', 'no')
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# A validator is fed smaller pieces, which it splits into lines with less memory
+VALIDATE_SIZE = 64 * 1024
+
+
+class FileBody(object):
+    """A file to be sent as a request body. It is iterable, in chunk_size
+    memoryview slices of the mapped file, and has a length, so requests
+    sends it with a Content-Length; tell() and seek() let the client rewind
+    it to retry a request.
+
+    progress, if given, is called with the number of bytes sent so far, and
+    validator, if given, is fed every chunk and closed at the end of the
+    file, as with vcf.ValidatingReader.
+    """
+
+    def __init__(self, file_name, chunk_size=DEFAULT_CHUNK_SIZE, progress=None,
+                 validator=None):
+        self.name = file_name
+        # Chunks start on page boundaries, so that sent pages can be released
+        self.chunk_size = max(mmap.PAGESIZE, chunk_size - chunk_size % mmap.PAGESIZE)
+        self.progress = progress
+        self.validator = validator
+        self._file = open(file_name, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._map = None
+        if self.size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._advise('MADV_SEQUENTIAL', 0, self.size)
+        self._position = 0
+        # The end of the bytes fed to the validator so far
+        self._checked = 0
+        self._validated = False
+
+    def __len__(self):
+        return self.size
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._position
+        elif whence == 2:
+            offset += self.size
+        self._position = min(max(0, offset), self.size)
+        if self._position == 0 and self.validator is not None:
+            self.validator.reset()
+            self._checked = 0
+            self._validated = False
+        return self._position
+
+    def _advise(self, name, start, length):
+        # madvise() is only available from Python 3.8
+        if hasattr(self._map, 'madvise') and hasattr(mmap, name):
+            self._map.madvise(getattr(mmap, name), start, length)
+
+    def _sent(self, start, end):
+        """Move past bytes start to end once they have been sent.
+        """
+        self._position = end
+        if self._map is not None:
+            start -= start % mmap.PAGESIZE
+            self._advise('MADV_DONTNEED', start, end - start)
+        if self.progress is not None:
+            self.progress(end)
+
+    def _validate(self, chunk, start, end):
+        """Feed the validator the bytes of chunk, which holds start to end of
+        the file, that it has not seen yet.
+        """
+        if self.validator is None or end <= self._checked:
+            return
+        for i in range(max(0, self._checked - start), end - start, VALIDATE_SIZE):
+            self.validator.feed(chunk[i:min(i + VALIDATE_SIZE, end - start)])
+        self._checked = end
+
+    def _slice(self, start, end):
+        try:
+            return memoryview(self._map)[start:end]
+        except TypeError:
+            # Python 2 cannot take a memoryview of an mmap
+            return self._map[start:end]
+
+    def _finish(self):
+        if self.validator is not None and not self._validated:
+            self._validated = True
+            self.validator.close()
+
+    def __iter__(self):
+        while self._position < self.size:
+            start = self._position
+            end = min(start + self.chunk_size, self.size)
+            chunk = self._slice(start, end)
+            self._validate(chunk, start, end)
+            yield chunk
+            if isinstance(chunk, memoryview):
+                chunk.release()
+            self._sent(start, end)
+        self._finish()
+
+    def can_sendfile(self, sock):
+        return (SENDFILE and self._map is not None and
+                hasattr(sock, 'sendfile') and isinstance(sock, socket.socket) and
+                not isinstance(sock, ssl.SSLSocket))
+
+    def sendfile(self, sock):
+        """Send the rest of the file over sock with os.sendfile(), a chunk
+        at a time so that progress can be reported and each chunk can be
+        validated before it is sent.
+        """
+        while self._position < self.size:
+            start = self._position
+            count = min(self.chunk_size, self.size - start)
+            if self.validator is not None and start + count > self._checked:
+                chunk = self._slice(start, start + count)
+                try:
+                    self._validate(chunk, start, start + count)
+                finally:
+                    if isinstance(chunk, memoryview):
+                        chunk.release()
+            sent = sock.sendfile(self._file, start, count)
+            if not sent:
+                raise IOError('{} ended after {} of {} bytes'.format(
+                    self.name, start, self.size))
+            self._sent(start, start + sent)
+        self._finish()
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A chunk from an interrupted send is still referenced; the
+                # mapping is closed when that is garbage collected
+                pass
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SendfileMixin(object):
+    """For urllib3 connection classes: send a FileBody with sendfile()
+    when the connection allows it, and any other body as usual.
+    """
+
+    def request(self, method, url, body=None, headers=None, **kwargs):
+        has_length = any(name.lower() == 'content-length' for name in (headers or {}))
+        if not isinstance(body, FileBody) or not has_length:
+            return super(SendfileMixin, self).request(method, url, body, headers, **kwargs)
+        # Send the request line and headers with an empty body, then the file
+        super(SendfileMixin, self).request(method, url, (), headers, **kwargs)
+        if body.can_sendfile(self.sock):
+            body.sendfile(self.sock)
+        else:
+            for chunk in body:
+                self.sock.sendall(chunk)
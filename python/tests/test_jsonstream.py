@@ -0,0 +1,84 @@
+"""Tests of the incremental JSON array reader in client/jsonstream.py.
+
+Run from the python directory with: python -m unittest discover tests
+"""
+
+import io
+import json
+import os
+import sys
+import unittest
+
+# The client package wants API credentials before it can be imported
+os.environ.setdefault('OMICIA_API_LOGIN', 'test')
+os.environ.setdefault('OMICIA_API_PASSWORD', 'test')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from client.jsonstream import iter_objects, write_json_objects, write_ndjson
+
+OBJECTS = [
+    {'id': 1, 'gene': u'BRCA1', 'score': -0.25, 'big': 12345678901234567890,
+     'exp': 1.5e-8, 'flags': [True, False, None], 'nested': {'a': [1, [2, {}]]}},
+    {'id': 2, 'gene': u'naïve ☃ \U0001f9ec', 'quote': u'say "hi"\\\n',
+     'empty': [], 'escaped': u'é'},
+    {'id': 3},
+]
+
+DOCUMENT = json.dumps({'meta': {'total': 3, 'objects': 'not these'},
+                       'objects': OBJECTS}, ensure_ascii=False).encode('utf-8')
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class IterObjectsTest(unittest.TestCase):
+
+    def test_every_chunk_size_gives_the_same_objects(self):
+        for size in (1, 2, 3, 5, 7, 64, len(DOCUMENT)):
+            self.assertEqual(list(iter_objects(chunked(DOCUMENT, size))), OBJECTS, size)
+
+    def test_numbers_split_across_chunks(self):
+        data = b'{"objects": [12345, -6.75e+2, 0.5]}'
+        split = data.index(b'123') + 2
+        chunks = [data[:split], data[split:split + 4], data[split + 4:]]
+        self.assertEqual(list(iter_objects(chunks)), [12345, -675.0, 0.5])
+
+    def test_multibyte_characters_split_across_chunks(self):
+        data = json.dumps({'objects': [u'☃\U0001f9ec']},
+                          ensure_ascii=False).encode('utf-8')
+        start = data.index(u'☃'.encode('utf-8'))
+        for split in range(start + 1, start + 7):
+            self.assertEqual(list(iter_objects([data[:split], data[split:]])),
+                             [u'☃\U0001f9ec'], split)
+
+    def test_top_level_array(self):
+        data = json.dumps(OBJECTS).encode('utf-8')
+        self.assertEqual(list(iter_objects(chunked(data, 3))), OBJECTS)
+
+    def test_error_response_is_yielded_whole(self):
+        error = {'description': 'Report not found', 'status': 404}
+        data = json.dumps(error).encode('utf-8')
+        self.assertEqual(list(iter_objects(chunked(data, 4))), [error])
+
+    def test_truncated_response_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_objects([DOCUMENT[:-20]]))
+
+
+class WriteTest(unittest.TestCase):
+
+    def test_json_objects_round_trip(self):
+        out = io.StringIO()
+        write_json_objects(iter(OBJECTS), out, 'objects')
+        self.assertEqual(json.loads(out.getvalue()), {'objects': OBJECTS})
+
+    def test_ndjson_writes_one_object_per_line(self):
+        out = io.StringIO()
+        write_ndjson(iter(OBJECTS), out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], OBJECTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
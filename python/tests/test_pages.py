@@ -0,0 +1,110 @@
+"""Tests of walking paginated lists with client/pages.py, against a fake
+list endpoint.
+
+Run from the python directory with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+# The client package wants API credentials before it can be imported
+os.environ.setdefault('OMICIA_API_LOGIN', 'test')
+os.environ.setdefault('OMICIA_API_PASSWORD', 'test')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from client import pages
+
+URL = 'https://api.example.com/reports/1/variants'
+
+
+class FakeResponse(object):
+
+    def __init__(self, result):
+        self.result = result
+
+    def json(self):
+        return self.result
+
+
+class FakeList(object):
+    """A list endpoint of total items, returning no more than cap per page.
+    """
+
+    def __init__(self, total, cap=None, error=None):
+        self.total = total
+        self.cap = cap
+        self.error = error
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        offset, limit = params['offset'], params['limit']
+        with self._lock:
+            self.requests.append((offset, limit))
+        if self.error:
+            return FakeResponse(self.error)
+        if self.cap:
+            limit = min(limit, self.cap)
+        end = min(self.total, offset + limit)
+        return FakeResponse({'objects': list(range(offset, end)), 'offset': offset})
+
+
+class IterPagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self._get = pages.session.get
+
+    def tearDown(self):
+        pages.session.get = self._get
+
+    def iter_pages(self, endpoint, **kwargs):
+        pages.session.get = endpoint.get
+        kwargs.setdefault('min_page_size', 1)
+        return list(pages.iter_pages(URL, **kwargs))
+
+    def test_every_item_once_in_order(self):
+        for total in (0, 1, 99, 250, 1001):
+            items = self.iter_pages(FakeList(total), page_size=100, prefetch=2)
+            self.assertEqual(items, list(range(total)), total)
+
+    def test_list_ending_at_a_page_boundary(self):
+        endpoint = FakeList(300)
+        items = self.iter_pages(endpoint, page_size=100, max_page_size=100)
+        self.assertEqual(items, list(range(300)))
+        self.assertIn((300, 100), endpoint.requests)
+
+    def test_server_cap_below_the_page_size(self):
+        endpoint = FakeList(1000, cap=70)
+        items = self.iter_pages(endpoint, page_size=100, max_page_size=100)
+        self.assertEqual(items, list(range(1000)))
+        # Once the cap is seen, pages are asked for at the cap
+        self.assertEqual(max(limit for _, limit in endpoint.requests[-3:]), 70)
+
+    def test_server_cap_and_list_end_on_the_same_page(self):
+        endpoint = FakeList(140, cap=70)
+        items = self.iter_pages(endpoint, page_size=100, max_page_size=100, prefetch=1)
+        self.assertEqual(items, list(range(140)))
+
+    def test_starting_offset(self):
+        items = self.iter_pages(FakeList(500), offset=123, page_size=100)
+        self.assertEqual(items, list(range(123, 500)))
+
+    def test_error_response_raises(self):
+        endpoint = FakeList(500, error={'description': 'Report not found'})
+        with self.assertRaises(ValueError) as raised:
+            self.iter_pages(endpoint)
+        self.assertIn('Report not found', str(raised.exception))
+
+    def test_stopping_early_stops_fetching(self):
+        endpoint = FakeList(10 ** 9)
+        pages.session.get = endpoint.get
+        walk = pages.iter_pages(URL, page_size=100, max_page_size=100, prefetch=2)
+        self.assertEqual([next(walk) for _ in range(150)], list(range(150)))
+        walk.close()
+        self.assertLessEqual(len(endpoint.requests), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
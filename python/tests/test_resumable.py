@@ -0,0 +1,149 @@
+"""Tests of resuming chunked uploads in client/resumable.py, against a fake
+server that speaks the 308 (Resume Incomplete) protocol.
+
+Run from the python directory with: python -m unittest discover tests
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+
+import requests
+
+# The client package wants API credentials before it can be imported
+os.environ.setdefault('OMICIA_API_LOGIN', 'test')
+os.environ.setdefault('OMICIA_API_PASSWORD', 'test')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from client import resumable
+
+URL = 'https://api.example.com/projects/1/genomes?genome_label=g'
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.ok = status_code < 400
+
+
+class FakeServer(object):
+    """Store the chunks PUT to it, answering 308 until the file is whole.
+    drop_after names a request, counting from 1, whose connection drops:
+    before the chunk is stored, or after it if stored_when_dropped is set.
+    """
+
+    def __init__(self, drop_after=None, stored_when_dropped=False, stall=False):
+        self.stored = b''
+        self.requests = []
+        self.drop_after = drop_after
+        self.stored_when_dropped = stored_when_dropped
+        self.stall = stall
+
+    def put(self, url, data=None, headers=None, **kwargs):
+        content_range = headers['Content-Range']
+        self.requests.append(content_range)
+        dropped = len(self.requests) == self.drop_after
+        if dropped and not self.stored_when_dropped:
+            raise requests.exceptions.ConnectionError('connection reset')
+        match = re.match(r'bytes (\d+)-(\d+)/(\d+)$', content_range)
+        if match and not self.stall:
+            first, size = int(match.group(1)), int(match.group(3))
+            if first == len(self.stored):
+                self.stored += data
+        else:
+            size = int(content_range.rpartition('/')[2])
+        if dropped:
+            raise requests.exceptions.ConnectionError('connection reset')
+        if len(self.stored) == size:
+            return FakeResponse(200)
+        headers = {'Range': 'bytes=0-{}'.format(len(self.stored) - 1)} if self.stored else {}
+        return FakeResponse(resumable.RESUME_INCOMPLETE, headers)
+
+
+class ResumableUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal_dir = os.path.join(self.directory, 'journal')
+        self.file_name = os.path.join(self.directory, 'genome.vcf')
+        self.data = bytes(bytearray(range(256))) * 40
+        with open(self.file_name, 'wb') as f:
+            f.write(self.data)
+        self._put = resumable.session.put
+
+    def tearDown(self):
+        resumable.session.put = self._put
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def upload(self, server):
+        resumable.session.put = server.put
+        return resumable.upload(URL, self.file_name, chunk_size=1000,
+                                journal_dir=self.journal_dir)
+
+    def journal_offset(self):
+        return resumable.UploadJournal(URL, self.file_name, self.journal_dir).load()['offset']
+
+    def test_whole_upload(self):
+        server = FakeServer()
+        self.assertEqual(self.upload(server).status_code, 200)
+        self.assertEqual(server.stored, self.data)
+        self.assertEqual(server.requests[0], 'bytes 0-999/10240')
+        self.assertEqual(server.requests[-1], 'bytes 10000-10239/10240')
+        self.assertFalse(os.listdir(self.journal_dir))
+
+    def test_resumes_from_the_journal_after_a_dropped_connection(self):
+        server = FakeServer(drop_after=4)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.upload(server)
+        self.assertEqual(self.journal_offset(), 3000)
+
+        server.drop_after = None
+        server.requests = []
+        self.assertEqual(self.upload(server).status_code, 200)
+        self.assertEqual(server.stored, self.data)
+        self.assertEqual(server.requests[:2], ['bytes */10240', 'bytes 3000-3999/10240'])
+
+    def test_resumes_from_the_server_when_the_journal_lags(self):
+        # The fourth chunk is stored but its response is lost
+        server = FakeServer(drop_after=4, stored_when_dropped=True)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.upload(server)
+        self.assertEqual(self.journal_offset(), 3000)
+
+        server.drop_after = None
+        server.requests = []
+        self.upload(server)
+        self.assertEqual(server.stored, self.data)
+        self.assertEqual(server.requests[:2], ['bytes */10240', 'bytes 4000-4999/10240'])
+
+    def test_changed_file_starts_over(self):
+        server = FakeServer(drop_after=3)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.upload(server)
+        with open(self.file_name, 'ab') as f:
+            f.write(b'more')
+
+        server = FakeServer()
+        self.upload(server)
+        self.assertEqual(server.requests[0], 'bytes 0-999/10244')
+        self.assertEqual(server.stored, self.data + b'more')
+
+    def test_stalled_upload_raises(self):
+        server = FakeServer(stall=True)
+        with self.assertRaises(IOError):
+            self.upload(server)
+        self.assertEqual(len(server.requests), resumable.MAX_STALLED_CHUNKS)
+
+    def test_acknowledged(self):
+        self.assertEqual(resumable.acknowledged(FakeResponse(308)), 0)
+        self.assertEqual(resumable.acknowledged(
+            FakeResponse(308, {'Range': 'bytes=0-8388607'})), 8388608)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Tests of retry timing in client/retry.py and of how client/limiter.py
+honours Retry-After.
+
+Run from the python directory with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import time
+import unittest
+from email.utils import formatdate
+
+import requests
+
+# The client package wants API credentials before it can be imported
+os.environ.setdefault('OMICIA_API_LOGIN', 'test')
+os.environ.setdefault('OMICIA_API_PASSWORD', 'test')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from client.limiter import AdaptiveLimiter, parse_retry_after
+from client.retry import RetryBudget, RetryPolicy, retry_delay, should_retry
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertEqual(parse_retry_after(' 0 '), 0.0)
+
+    def test_http_date(self):
+        delay = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+        self.assertTrue(28 <= delay <= 30, delay)
+
+    def test_date_in_the_past(self):
+        self.assertEqual(parse_retry_after(formatdate(time.time() - 60, usegmt=True)), 0.0)
+
+    def test_missing_or_malformed(self):
+        for value in (None, '', '-5', '1.5', 'soon'):
+            self.assertIsNone(parse_retry_after(value), value)
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_retryable(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.is_retryable(FakeResponse(502)))
+        self.assertFalse(policy.is_retryable(FakeResponse(404)))
+        # Throttled responses are left to the limiter
+        self.assertFalse(policy.is_retryable(FakeResponse(429)))
+        self.assertTrue(policy.is_retryable(error=requests.exceptions.ConnectionError()))
+        self.assertFalse(policy.is_retryable(error=ValueError()))
+
+    def test_backoff_is_capped(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        for attempt in range(1, 10):
+            delay = policy.backoff(attempt)
+            self.assertTrue(0 <= delay <= min(5, 2 ** (attempt - 1)), (attempt, delay))
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=3, base_delay=0)
+        started = time.time()
+        self.assertEqual([retry_delay(policy, attempt, started) is not None
+                          for attempt in (1, 2, 3)], [True, True, False])
+
+    def test_deadline(self):
+        policy = RetryPolicy(base_delay=0, deadline=10)
+        self.assertIsNotNone(retry_delay(policy, 1, time.time()))
+        self.assertIsNone(retry_delay(policy, 1, time.time() - 11))
+
+    def test_spent_budget(self):
+        budget = RetryBudget(ratio=0.5, max_retries=2)
+        policy = RetryPolicy(max_attempts=10, base_delay=0, budget=budget)
+        started = time.time()
+        self.assertIsNotNone(retry_delay(policy, 1, started))
+        self.assertIsNotNone(retry_delay(policy, 2, started))
+        self.assertIsNone(retry_delay(policy, 3, started))
+        # Two requests sent earn one more retry
+        budget.deposit()
+        budget.deposit()
+        self.assertIsNotNone(retry_delay(policy, 3, started))
+
+    def test_creating_puts_need_recover(self):
+        url = 'https://api.example.com/projects/1/genomes'
+        self.assertFalse(should_retry('PUT', url=url))
+        self.assertTrue(should_retry('PUT', url=url, recover=lambda: None))
+        self.assertTrue(should_retry('PUT', url=url + '/2'))
+        self.assertFalse(should_retry('POST'))
+
+
+class LimiterRetryAfterTest(unittest.TestCase):
+
+    def test_throttled_response_holds_back_requests(self):
+        limiter = AdaptiveLimiter(max_window=4)
+        started, delay = limiter.try_acquire()
+        self.assertEqual(delay, 0)
+        self.assertTrue(limiter.release(started, FakeResponse(429, {'Retry-After': '5'})))
+        self.assertEqual(limiter.window, 2)
+        started, delay = limiter.try_acquire()
+        self.assertIsNone(started)
+        self.assertTrue(4 < delay <= 5, delay)
+
+    def test_throttle_without_retry_after_uses_the_default_delay(self):
+        limiter = AdaptiveLimiter(max_window=4)
+        started, _ = limiter.try_acquire()
+        limiter.release(started, FakeResponse(503))
+        self.assertIsNone(limiter.try_acquire()[0])
+
+    def test_window_halves_once_per_round(self):
+        limiter = AdaptiveLimiter(max_window=8)
+        admitted = [limiter.try_acquire()[0] for _ in range(4)]
+        time.sleep(0.01)
+        for started in admitted:
+            limiter.release(started, FakeResponse(429, {'Retry-After': '0'}))
+        self.assertEqual(limiter.window, 4)
+
+    def test_full_window(self):
+        limiter = AdaptiveLimiter(max_window=2)
+        first, _ = limiter.try_acquire()
+        limiter.try_acquire()
+        self.assertEqual(limiter.try_acquire(), (None, None))
+        limiter.release(first, FakeResponse(200))
+        self.assertIsNotNone(limiter.try_acquire()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
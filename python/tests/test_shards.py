@@ -0,0 +1,110 @@
+"""Tests of splitting the genome into shards and merging their lines back
+into coordinate order, in client/shards.py.
+
+Run from the python directory with: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+# The client package wants API credentials before it can be imported
+os.environ.setdefault('OMICIA_API_LOGIN', 'test')
+os.environ.setdefault('OMICIA_API_PASSWORD', 'test')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from client import shards
+from client.shards import Shard, chrom_rank, genome_shards, sort_key
+
+
+def keyed(shard, chrom, position, sequence):
+    return sort_key(chrom, position, shard, sequence) + '{}:{}\n'.format(chrom, position)
+
+
+class GenomeShardsTest(unittest.TestCase):
+
+    def test_one_shard_per_chromosome(self):
+        found = genome_shards()
+        self.assertEqual([shard.chrom for shard in found], shards.CHROMOSOMES)
+        self.assertEqual([shard.index for shard in found], list(range(25)))
+
+    def test_windows_cover_the_chromosome_and_leave_the_last_open(self):
+        found = genome_shards(window=5000, chroms=['M'])
+        self.assertEqual([(s.start, s.end) for s in found],
+                         [(1, 5000), (5001, 10000), (10001, 15000), (15001, None)])
+
+    def test_start_past_the_known_length_gives_an_open_shard(self):
+        found = genome_shards(window=10 ** 6, chroms=['M', '1'], start=20000)
+        self.assertEqual([(s.chrom, s.start, s.end) for s in found][:2],
+                         [('M', 20000, None), ('1', 20000, 1019999)])
+
+    def test_windows_within_start_and_end(self):
+        found = genome_shards(window=100, chroms=['1'], start=1001, end=1250)
+        self.assertEqual([(s.start, s.end) for s in found],
+                         [(1001, 1100), (1101, 1200), (1201, 1250)])
+
+    def test_contains_keeps_a_boundary_variant_once(self):
+        first, second = genome_shards(window=100, chroms=['1'], end=200)
+        self.assertEqual([first.contains(100), second.contains(100)], [True, False])
+        self.assertEqual([first.contains(101), second.contains(101)], [False, True])
+
+    def test_chrom_rank_accepts_prefixes(self):
+        self.assertEqual(chrom_rank('chr2'), chrom_rank('2'))
+        self.assertEqual(chrom_rank('MT'), chrom_rank('chrM'))
+        self.assertLess(chrom_rank('9'), chrom_rank('10'))
+        self.assertLess(chrom_rank('X'), chrom_rank('GL000192.1'))
+
+
+class MergeShardsTest(unittest.TestCase):
+
+    def test_spool_sorts_across_spilled_runs(self):
+        shard = Shard(0, '1')
+        positions = list(range(1, 1001))
+        random.Random(1).shuffle(positions)
+
+        def fetch(shard, header):
+            header.append('##header\n')
+            for sequence, position in enumerate(positions):
+                yield keyed(shard, '1', position, sequence)
+
+        header, spool = shards._spool(shard, fetch, run_lines=64)
+        lines = list(shards.merge_shards([spool]))
+        self.assertEqual(header, ['##header\n'])
+        self.assertEqual(lines, ['1:{}\n'.format(p) for p in range(1, 1001)])
+
+    def test_merge_order_across_shards(self):
+        # Windows of chromosome 1 fetched out of order, a variant at the
+        # same position from two shards, and a chr-prefixed chromosome
+        found = [Shard(0, '1', 1, 100), Shard(1, '1', 101, None),
+                 Shard(2, 'chr2'), Shard(3, 'X')]
+        lines = {0: [('1', 50), ('1', 7), ('1', 100)],
+                 1: [('1', 100), ('1', 5000), ('1', 101)],
+                 2: [('chr2', 3), ('chr2', 1)],
+                 3: [('X', 9), ('X', 2)]}
+
+        def fetch(shard, header):
+            if shard.index == 3:
+                header.append('#CHROM\n')
+            for sequence, (chrom, position) in enumerate(lines[shard.index]):
+                yield keyed(shard, chrom, position, sequence)
+
+        header, spools = shards.fetch_shards(list(reversed(found)), fetch, workers=3)
+        self.assertEqual(header, ['#CHROM\n'])
+        self.assertEqual(list(shards.merge_shards(spools)),
+                         ['1:7\n', '1:50\n', '1:100\n', '1:100\n', '1:101\n', '1:5000\n',
+                          'chr2:1\n', 'chr2:3\n', 'X:2\n', 'X:9\n'])
+
+    def test_shard_error_names_the_shard(self):
+        def fetch(shard, header):
+            if shard.chrom == 'Y':
+                raise ValueError('Report not found')
+            yield keyed(shard, shard.chrom, 1, 0)
+
+        with self.assertRaises(IOError) as raised:
+            shards.fetch_shards(genome_shards(chroms=['X', 'Y']), fetch)
+        self.assertIn('chromosome Y', str(raised.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
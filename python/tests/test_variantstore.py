@@ -0,0 +1,73 @@
+"""Round-trip tests of the local variant store in client/variantstore.py.
+
+Run from the python directory with: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Imported on its own, since the client package wants API credentials
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'client'))
+from variantstore import VariantStore
+
+VARIANTS = [
+    {'id': 1, 'chrom': '1', 'position': 12345, 'status': 'REVIEWED',
+     'to_report': True, 'score': 0.5, 'quality': 30, 'notes': None,
+     'genes': ['BRCA1', 'NBR2'], 'zygosity': {'proband': 'het'}},
+    {'id': 2, 'chrom': 'X', 'position': 67890, 'status': None,
+     'to_report': False, 'score': 1, 'quality': 45.5,
+     'genes': [], 'big': 2 ** 70},
+    {'id': 3, 'chrom': '22', 'position': 1, 'to_report': None,
+     'score': 2.0, 'quality': 12, 'notes': 'see report', 'mixed': 'text'},
+    {'id': 4, 'chrom': 'M', 'position': 16000, 'mixed': 7, 'name': u'é'},
+]
+
+
+class VariantStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = VariantStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_rows_read_back_as_written(self):
+        table = self.store.write(1542, 'v1', iter(VARIANTS), 'q')
+        self.assertEqual(list(table.iter_rows()), VARIANTS)
+
+        reopened = self.store.open(1542, 'v1', 'q')
+        rows = list(reopened.iter_rows())
+        self.assertEqual(rows, VARIANTS)
+        for row, variant in zip(rows, VARIANTS):
+            for name, value in variant.items():
+                self.assertIs(type(row[name]), type(value), name)
+
+    def test_null_and_missing_fields_are_told_apart(self):
+        table = self.store.write(1542, 'v1', iter(VARIANTS))
+        rows = list(table.iter_rows())
+        self.assertIn('notes', rows[0])
+        self.assertIsNone(rows[0]['notes'])
+        self.assertNotIn('notes', rows[1])
+        self.assertIsNone(table['notes'][1])
+
+    def test_ints_and_floats_keep_their_type(self):
+        table = self.store.write(1542, 'v1', iter(VARIANTS))
+        self.assertEqual([type(value) for value in table['score']],
+                         [float, int, float, type(None)])
+        self.assertEqual(table['position'].type, 'int64')
+        self.assertEqual(list(table['position']), [12345, 67890, 1, 16000])
+
+    def test_new_version_replaces_old(self):
+        self.store.write(1542, 'v1', iter(VARIANTS))
+        self.store.write(1542, 'v2', iter(VARIANTS[:1]))
+        self.assertIsNone(self.store.open(1542, 'v1'))
+        self.assertEqual(list(self.store.open(1542, 'v2').iter_rows()), VARIANTS[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()
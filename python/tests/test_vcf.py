@@ -0,0 +1,135 @@
+"""Tests of the streaming VCF validator in client/vcf.py and of the BGZF
+compression in client/compression.py.
+
+Run from the python directory with: python -m unittest discover tests
+"""
+
+import gzip
+import io
+import os
+import sys
+import unittest
+
+# The client package wants API credentials before it can be imported
+os.environ.setdefault('OMICIA_API_LOGIN', 'test')
+os.environ.setdefault('OMICIA_API_PASSWORD', 'test')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from client.compression import BGZF_EOF, BgzipReader
+from client.vcf import ValidatingReader, VcfError, VcfValidator
+
+HEADER = (b'##fileformat=VCFv4.1\n'
+          b'##contig=<ID=1>\n'
+          b'##contig=<ID=2>\n'
+          b'#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tproband\n')
+
+
+def record(chrom, pos):
+    return '{}\t{}\t.\tA\tG\t50\tPASS\t.\tGT\t0/1\n'.format(chrom, pos).encode('ascii')
+
+
+def vcf(records):
+    return HEADER + b''.join(record(chrom, pos) for chrom, pos in records)
+
+
+def gzip_compress(data):
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode='wb') as f:
+        f.write(data)
+    return out.getvalue()
+
+
+def validate(data, chunk_size, expected_samples=None):
+    validator = VcfValidator('test.vcf', expected_samples, out=io.StringIO())
+    for i in range(0, len(data), chunk_size):
+        validator.feed(data[i:i + chunk_size])
+    validator.close()
+    return validator
+
+
+class VcfValidatorTest(unittest.TestCase):
+
+    def test_valid_file_at_any_chunk_boundary(self):
+        data = vcf([('1', 100), ('1', 100), ('1', 2000), ('2', 5)])
+        for size in (1, 2, 3, 7, 50, len(data)):
+            validator = validate(data, size, expected_samples=1)
+            self.assertEqual((validator.samples, validator.records), (1, 4), size)
+
+    def test_unsorted_positions_are_rejected_at_any_chunk_boundary(self):
+        data = vcf([('1', 100), ('1', 2000), ('1', 1999)])
+        for size in (1, 5, len(data)):
+            with self.assertRaises(VcfError) as raised:
+                validate(data, size)
+            self.assertIn('line 7', str(raised.exception))
+            self.assertIn('not sorted', str(raised.exception))
+
+    def test_split_contig_is_rejected(self):
+        with self.assertRaises(VcfError):
+            validate(vcf([('1', 100), ('2', 5), ('1', 200)]), 4)
+
+    def test_truncated_last_line_is_checked(self):
+        data = vcf([('1', 100), ('1', 200)])
+        with self.assertRaises(VcfError):
+            validate(data[:-9], 8)
+
+    def test_missing_header_is_rejected(self):
+        with self.assertRaises(VcfError):
+            validate(HEADER.split(b'#CHROM')[0], 10)
+
+    def test_gzip_compressed_input(self):
+        data = vcf([('1', 100), ('2', 5)])
+        validator = validate(gzip_compress(data), 3)
+        self.assertEqual(validator.records, 2)
+
+    def test_truncated_compressed_input_is_rejected(self):
+        compressed = BgzipReader(io.BytesIO(vcf([('1', 100)]))).read()
+        with self.assertRaises(VcfError):
+            validate(compressed[:len(compressed) // 2], 5)
+
+    def test_reader_starts_over_when_rewound(self):
+        reader = ValidatingReader(io.BytesIO(vcf([('1', 100), ('1', 200)])),
+                                  chunk_size=10)
+        first = b''.join(reader)
+        reader.seek(0)
+        self.assertEqual(b''.join(reader), first)
+        self.assertEqual(reader.validator.records, 2)
+
+
+class BgzipReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        # Several BGZF blocks' worth, so that blocks are compressed out of order
+        self.data = vcf([('1', pos) for pos in range(1, 12000)])
+
+    def read_all(self, reader, size):
+        parts = []
+        while True:
+            part = reader.read(size)
+            if not part:
+                return b''.join(parts)
+            parts.append(part)
+
+    def test_output_decompresses_to_the_input(self):
+        reader = BgzipReader(io.BytesIO(self.data), threads=3)
+        compressed = self.read_all(reader, 1000)
+        reader.close()
+        self.assertTrue(compressed.endswith(BGZF_EOF))
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(compressed)).read(), self.data)
+
+    def test_output_is_valid_compressed_vcf(self):
+        reader = BgzipReader(io.BytesIO(self.data), threads=2)
+        validator = validate(self.read_all(reader, 4096), 777)
+        reader.close()
+        self.assertEqual(validator.records, 11999)
+
+    def test_rewound_reader_gives_the_same_bytes(self):
+        reader = BgzipReader(io.BytesIO(self.data), threads=2)
+        first = self.read_all(reader, 5000)
+        self.assertEqual(reader.seek(0), 0)
+        self.assertEqual(reader.tell(), 0)
+        self.assertEqual(self.read_all(reader, 300), first)
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()